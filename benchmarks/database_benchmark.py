@@ -0,0 +1,220 @@
+# This script benchmarks the write and read paths of `DatabaseManager` against a throwaway database.
+#
+# Functionality:
+# - For every `--scales` value N, seeds one video with N bounding boxes (`--boxes_per_detection` boxes
+#   per detection, anomalies and logits for every detection) with bulk inserts, so the tables and
+#   indexes have a realistic size; the seeding itself is not part of the results.
+# - Times `--ops` single calls of insert_detection, insert_bounding_box, insert_anomaly_recognition_data
+#   and insert_detection_anomalies, and of the per-detection fetch methods on random detections.
+# - Times `--video_fetches` calls of the per-video fetch methods on the seeded video.
+# - Reports ops/sec, p50/p99 latencies and database round-trips per call as JSON.
+# - Deletes the seeded data afterwards (the database itself is kept).
+#
+# The database is created if it does not exist. Never point it at the application database.
+#
+# Usage:
+#   python benchmarks/database_benchmark.py --db_name diploma_thesis_benchmark_db
+#   python benchmarks/database_benchmark.py --db_name diploma_thesis_benchmark_db --scales 1000 100000 1000000 --ops 2000
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(ROOT_DIR)
+
+from backend.app.core.database_manager import DatabaseManager
+from backend.app.models.experiment_models import UBNORMAL_CATEGORIES
+
+APPLICATION_DB_NAME = "diploma_thesis_prototype_db"
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def timed_calls(db_manager, calls):
+    """Runs the zero-argument callables one by one and summarizes their latencies."""
+    latencies = []
+    round_trips = db_manager.db_round_trips
+    start = time.perf_counter()
+    for call in calls:
+        call_start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - call_start)
+    total = time.perf_counter() - start
+    return {
+        "ops": len(latencies),
+        "ops_per_second": round(len(latencies) / total, 1) if total > 0 else None,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "round_trips_per_op": round((db_manager.db_round_trips - round_trips) / len(latencies), 2)
+    }
+
+def insert_video(db_manager, name):
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO videos (video_path, duration, fps, name_of_analysis) VALUES ('benchmark', 60, 25, %s) RETURNING id;", (name,))
+    video_id = cursor.fetchone()[0]
+    conn.commit()
+    db_manager.release_connection(conn)
+    return video_id
+
+def seed(db_manager, num_boxes, boxes_per_detection, generator):
+    """Bulk-inserts a video with `num_boxes` bounding boxes. Returns the video id and its detection ids."""
+    video_id = insert_video(db_manager, "benchmark seed")
+    num_detections = max(1, num_boxes // boxes_per_detection)
+
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+
+    detection_rows = [
+        (video_id, i * 5, i * 5 + boxes_per_detection * 5, 0, float(generator.uniform(0.25, 1.0)), i,
+         f"data/output/{video_id}/anomaly_recognition_preprocessor/{video_id}_{i}.mp4")
+        for i in range(num_detections)
+    ]
+    detection_ids = [row[0] for row in execute_values(
+        cursor,
+        "INSERT INTO detections (video_id, start_frame, end_frame, class_id, confidence, track_id, video_object_detection_path) VALUES %s RETURNING id;",
+        detection_rows, page_size=10000, fetch=True
+    )]
+
+    box_rows = []
+    for index in range(num_boxes):
+        detection_id = detection_ids[index % num_detections]
+        x, y = generator.uniform(0, 1000, size=2)
+        box_rows.append((detection_id, index, json.dumps([x, y, x + 50.0, y + 120.0])))
+        if len(box_rows) == 100000:
+            execute_values(cursor, "INSERT INTO bounding_boxes (detection_id, frame_id, bbox) VALUES %s;", box_rows, page_size=10000)
+            box_rows = []
+    if box_rows:
+        execute_values(cursor, "INSERT INTO bounding_boxes (detection_id, frame_id, bbox) VALUES %s;", box_rows, page_size=10000)
+
+    logits = generator.normal(20.0, 3.0, size=(num_detections, len(UBNORMAL_CATEGORIES))).astype(np.float32)
+    execute_values(
+        cursor,
+        "INSERT INTO anomaly_recognition_data (video_id, detection_id, logits_per_video) VALUES %s;",
+        [(video_id, detection_id, row.tobytes()) for detection_id, row in zip(detection_ids, logits)],
+        page_size=10000
+    )
+    execute_values(
+        cursor,
+        "INSERT INTO detection_anomalies (detection_id, anomaly_label, anomaly_score) VALUES %s;",
+        [(detection_id, UBNORMAL_CATEGORIES[k], float(logits[i, k])) for i, detection_id in enumerate(detection_ids) for k in range(3)],
+        page_size=10000
+    )
+
+    conn.commit()
+    cursor.execute("ANALYZE;")
+    conn.commit()
+    db_manager.release_connection(conn)
+    return video_id, detection_ids
+
+def benchmark_scale(db_manager, num_boxes, boxes_per_detection, ops, video_fetches, generator):
+    seed_start = time.perf_counter()
+    video_id, detection_ids = seed(db_manager, num_boxes, boxes_per_detection, generator)
+    seed_seconds = time.perf_counter() - seed_start
+
+    # Writes go to a separate video, so the read timings below see only the seeded data
+    write_video_id = insert_video(db_manager, "benchmark writes")
+    random_detection_ids = [random.choice(detection_ids) for _ in range(ops)]
+    anomalies = [{"label": label, "score": 22.5} for label in UBNORMAL_CATEGORIES[:3]]
+    logits_bytes = generator.normal(20.0, 3.0, size=len(UBNORMAL_CATEGORIES)).astype(np.float32).tobytes()
+
+    try:
+        write_detection_ids = []
+        writes = {
+            "insert_detection": timed_calls(db_manager, [
+                lambda i=i: write_detection_ids.append(db_manager.insert_detection(write_video_id, i, i + 50, 0, 0.9, i))
+                for i in range(ops)
+            ])
+        }
+        writes["insert_bounding_box"] = timed_calls(db_manager, [
+            lambda i=i: db_manager.insert_bounding_box(write_detection_ids[i % len(write_detection_ids)], i, [1.0, 2.0, 51.0, 122.0])
+            for i in range(ops)
+        ])
+        writes["insert_anomaly_recognition_data"] = timed_calls(db_manager, [
+            lambda detection_id=detection_id: db_manager.insert_anomaly_recognition_data(write_video_id, detection_id, logits_bytes)
+            for detection_id in write_detection_ids
+        ])
+        writes["insert_detection_anomalies"] = timed_calls(db_manager, [
+            lambda detection_id=detection_id: db_manager.insert_detection_anomalies(detection_id, anomalies)
+            for detection_id in write_detection_ids
+        ])
+
+        reads = {
+            "fetch_bounding_boxes_by_detection_id": timed_calls(db_manager, [
+                lambda detection_id=detection_id: db_manager.fetch_bounding_boxes_by_detection_id(detection_id)
+                for detection_id in random_detection_ids
+            ]),
+            "fetch_detection_by_id": timed_calls(db_manager, [
+                lambda detection_id=detection_id: db_manager.fetch_detection_by_id(detection_id)
+                for detection_id in random_detection_ids
+            ]),
+            "fetch_detection_anomalies": timed_calls(db_manager, [
+                lambda detection_id=detection_id: db_manager.fetch_detection_anomalies(detection_id)
+                for detection_id in random_detection_ids
+            ])
+        }
+        for method in ("fetch_detections_by_video_id", "get_anomaly_recognition_data_by_video_id",
+                       "fetch_anomalies_by_video_id", "fetch_all_anomalies_by_video_id"):
+            reads[method] = timed_calls(db_manager, [lambda method=method: getattr(db_manager, method)(video_id)] * video_fetches)
+    finally:
+        db_manager.delete_video_by_id(write_video_id)
+        db_manager.delete_video_by_id(video_id)
+
+    return {
+        "bounding_boxes": num_boxes,
+        "detections": len(detection_ids),
+        "seed_seconds": round(seed_seconds, 2),
+        "writes": writes,
+        "reads": reads
+    }
+
+def main(db_name, scales, boxes_per_detection, ops, video_fetches, seed_value):
+    random.seed(seed_value)
+    generator = np.random.default_rng(seed_value)
+
+    db_manager = DatabaseManager(db_name=db_name, user="postgres", password="postgres")
+    db_manager.connect()
+    db_manager.create_tables()
+    try:
+        results = [benchmark_scale(db_manager, scale, boxes_per_detection, ops, video_fetches, generator) for scale in scales]
+    finally:
+        db_manager.close()
+
+    return {
+        "benchmark": "database",
+        "boxes_per_detection": boxes_per_detection,
+        "ops": ops,
+        "video_fetches": video_fetches,
+        "scales": results
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the DatabaseManager write and read paths.")
+    parser.add_argument("--db_name", type=str, required=True, help="Throwaway database (created if it does not exist).")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000], help="Numbers of seeded bounding boxes.")
+    parser.add_argument("--boxes_per_detection", type=int, default=50, help="Seeded bounding boxes per detection.")
+    parser.add_argument("--ops", type=int, default=1000, help="Timed calls per write and per-detection read method.")
+    parser.add_argument("--video_fetches", type=int, default=20, help="Timed calls per per-video read method.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data.")
+    parser.add_argument("--output", type=str, default=None, help="Also write the JSON result to this file.")
+
+    args = parser.parse_args()
+    if args.db_name == APPLICATION_DB_NAME:
+        sys.exit("The benchmark deletes the data it seeds, use a throwaway database instead of the application database.")
+
+    output = json.dumps(main(args.db_name, args.scales, args.boxes_per_detection, args.ops, args.video_fetches, args.seed), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    print(output)
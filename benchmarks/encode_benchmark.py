@@ -0,0 +1,123 @@
+# This script benchmarks the video profiles of `video_writer.py`: encode time, file size and read-back time.
+#
+# Functionality:
+# - Generates a synthetic video (`synthetic_video.py`) and decodes it into memory once, so only the encoding is timed.
+# - Writes the frames with every `--profiles` profile, as full frames ("visualization" case) and as a fixed
+#   crop of `--crop_width`x`--crop_height` pixels ("crop" case, like the per-detection crops of the preprocessor).
+# - Reads every written file back the way its consumer does (OpenCV for videos, NumPy for .npy) and times that too.
+# - Every measurement is the median of `--repeats` runs. Reports seconds, frames per second and bytes as JSON.
+#
+# Usage:
+#   python benchmarks/encode_benchmark.py
+#   python benchmarks/encode_benchmark.py --width 1280 --height 720 --frames 500 --profiles temporary browser --output encode.json
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BENCHMARKS_DIR, "../src"))
+sys.path.append(ROOT_DIR)
+
+import cv2
+import numpy as np
+
+from synthetic_video import generate_video
+from backend.app.core.video_writer import VIDEO_PROFILES, open_video_writer, profile_extension
+
+def load_frames(video_path):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def encode(frames, path, fps, profile):
+    height, width = frames[0].shape[:2]
+    out = open_video_writer(path, fps, (width, height), profile)
+    for frame in frames:
+        out.write(frame)
+    out.release()
+
+def read_back(path):
+    if path.endswith(".npy"):
+        return len(np.load(path))
+    return len(load_frames(path))
+
+def benchmark_profile(frames, fps, profile, work_dir, name, repeats):
+    path = os.path.join(work_dir, f"{name}_{profile}.{profile_extension(profile)}")
+
+    encode_durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        encode(frames, path, fps, profile)
+        encode_durations.append(time.perf_counter() - start)
+
+    read_durations = []
+    frames_read = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        frames_read = read_back(path)
+        read_durations.append(time.perf_counter() - start)
+
+    encode_seconds = statistics.median(encode_durations)
+    read_seconds = statistics.median(read_durations)
+    size = os.path.getsize(path)
+    return {
+        "encode_seconds": round(encode_seconds, 4),
+        "encode_frames_per_second": round(len(frames) / encode_seconds, 1) if encode_seconds > 0 else None,
+        "read_seconds": round(read_seconds, 4),
+        "frames_read": frames_read,
+        "bytes": size,
+        "bytes_per_frame": round(size / len(frames))
+    }
+
+def main(args):
+    work_dir = tempfile.mkdtemp(prefix="encode_benchmark_")
+    try:
+        video_path = os.path.join(work_dir, "synthetic.mp4")
+        generate_video(video_path, args.objects, args.width, args.height, args.frames, args.fps, "person", args.seed)
+        frames = load_frames(video_path)
+        crop_frames = [frame[:args.crop_height, :args.crop_width].copy() for frame in frames]
+
+        cases = {"visualization": frames, "crop": crop_frames}
+        return {
+            "benchmark": "encode",
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "results": {
+                name: {profile: benchmark_profile(case_frames, args.fps, profile, work_dir, name, args.repeats) for profile in args.profiles}
+                for name, case_frames in cases.items()
+            }
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the video writer profiles (encode time and file size).")
+    parser.add_argument("--objects", type=int, default=4, help="Number of moving objects in the video.")
+    parser.add_argument("--width", type=int, default=640, help="Width of the video.")
+    parser.add_argument("--height", type=int, default=360, help="Height of the video.")
+    parser.add_argument("--frames", type=int, default=300, help="Number of frames of the video.")
+    parser.add_argument("--fps", type=int, default=25, help="Frame rate of the video.")
+    parser.add_argument("--crop_width", type=int, default=160, help="Width of the crop case.")
+    parser.add_argument("--crop_height", type=int, default=320, help="Height of the crop case.")
+    parser.add_argument("--profiles", type=str, nargs="+", choices=list(VIDEO_PROFILES), default=list(VIDEO_PROFILES), help="Profiles to benchmark.")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per measurement, the median is reported.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic video.")
+    parser.add_argument("--output", type=str, default=None, help="Also write the JSON result to this file.")
+
+    args = parser.parse_args()
+    output = json.dumps(main(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    print(output)
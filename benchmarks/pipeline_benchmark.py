@@ -0,0 +1,339 @@
+# This script benchmarks the analysis pipeline on a synthetic video, stage by stage and end to end.
+#
+# Functionality:
+# - Generates a synthetic video (`synthetic_video.py`) with `--objects` moving rectangles or person
+#   sprites of the given resolution and length, so no dataset is needed.
+# - Times every stage in isolation with the pipeline's own functions:
+#   decode (OpenCV read), detect and track (YOLO on every `--num_of_skip_frames`-th frame),
+#   persist (detection/bounding box inserts, only with `--db_name`), crop (per-track crops),
+#   recognize (XCLIP per crop), interpret (top-k/threshold) and visualize (anomaly overlay video,
+#   in `--render_processes` parallel chunks).
+#   Stages after detection use the ground-truth tracks of the synthetic objects, so their cost does
+#   not depend on what the detector finds.
+# - Times the stages chained in one process ("pipeline") and, with `--full_pipeline`, the real
+#   `run_full_analysis` against the application database (needs the real models).
+# - Every measurement is the median of `--repeats` runs. The JSON result contains the git commit,
+#   the environment and the configuration, so results of different commits can be compared
+#   (see `regression_runner.py`).
+# - `--tiny_models` uses randomly initialized tiny YOLO/XCLIP models, for machines without weights.
+#
+# Usage:
+#   python benchmarks/pipeline_benchmark.py --tiny_models
+#   python benchmarks/pipeline_benchmark.py --objects 8 --width 1280 --height 720 --frames 500 --output bench.json
+#   python benchmarks/pipeline_benchmark.py --db_name diploma_thesis_benchmark_db --stages decode persist
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from threading import Event
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BENCHMARKS_DIR, "../src"))
+sys.path.append(ROOT_DIR)
+
+import cv2
+import numpy as np
+import torch
+
+from synthetic_video import generate_video
+from tiny_models import TINY_YOLO_MODEL, TinyXCLIPHandler
+from backend.app.core.object_detection_processor import process_segment, store_detections
+from backend.app.core.anomaly_recognition_preprocessor import crop_video_for_detection, find_max_bounding_box
+from backend.app.core.result_interpreter import interpret_logits
+from backend.app.core.video_visualizer import render_anomaly_video
+from backend.app.core.video_writer import CROP_VIDEO_PROFILE, profile_extension
+from backend.app.core.video_processor import load_keyframe_index
+from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.yolo_handler import YOLOHandler
+from backend.app.core.xclip_handler import XCLIPHandler
+from backend.app.models.experiment_models import UBNORMAL_CATEGORIES
+
+STAGES = ["decode", "detect", "track", "persist", "crop", "recognize", "interpret", "visualize"]
+
+# Crop offsets as passed by `anomaly_service.run_anomaly_preprocessing` (max_frames, target_width, target_height)
+CROP_OFFSET_X = 50
+CROP_OFFSET_Y = 200
+CROP_SIZE_THRESHOLD = 200
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "opencv": cv2.__version__
+    }
+
+def measure(func, repeats, setup=None):
+    """Runs `func(setup())` `repeats` times. Returns the last result and the durations (setup excluded)."""
+    durations = []
+    result = None
+    for _ in range(repeats):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        result = func(argument)
+        durations.append(time.perf_counter() - start)
+    return result, durations
+
+def summarize(durations, items, unit):
+    seconds = statistics.median(durations)
+    return {
+        "seconds": round(seconds, 4),
+        "min_seconds": round(min(durations), 4),
+        "max_seconds": round(max(durations), 4),
+        "runs": len(durations),
+        unit: items,
+        f"{unit}_per_second": round(items / seconds, 2) if seconds > 0 else None
+    }
+
+def ground_truth_detections(tracks, num_of_skip_frames):
+    # The same shape as the detections returned by `process_segment`
+    return [
+        {"class_id": 0, "frame_id": frame_id, "bbox": bbox, "confidence": 1.0, "track_id": track_id}
+        for track_id, frames in tracks.items()
+        for frame_id, bbox in sorted(frames.items())
+        if frame_id % num_of_skip_frames == 0
+    ]
+
+def crop_tasks(video_path, tracks, num_of_skip_frames, output_dir):
+    keyframes = load_keyframe_index(video_path)
+    tasks = []
+    for track_id, frames in tracks.items():
+        sampled = {frame_id: bbox for frame_id, bbox in frames.items() if frame_id % num_of_skip_frames == 0}
+        detection = {"id": track_id, "start_frame": min(sampled), "end_frame": max(sampled)}
+        max_bb = find_max_bounding_box(CROP_SIZE_THRESHOLD, sampled)
+        tasks.append((video_path, detection, max_bb, output_dir, "benchmark", CROP_OFFSET_X, CROP_OFFSET_Y, CROP_SIZE_THRESHOLD, keyframes))
+    return tasks
+
+def decode(video_path):
+    cap = cv2.VideoCapture(video_path)
+    frames = 0
+    while True:
+        ret, _ = cap.read()
+        if not ret:
+            break
+        frames += 1
+    cap.release()
+    return frames
+
+def run_crops(tasks):
+    results = [crop_video_for_detection(task) for task in tasks]
+    errors = [result for result in results if not isinstance(result, dict)]
+    if errors:
+        raise RuntimeError(errors[0])
+    return [os.path.join(task[3], f"benchmark_{task[1]['id']}.{profile_extension(CROP_VIDEO_PROFILE)}") for task in tasks]
+
+def recognize(handler, crop_paths, batch_size, frame_sample_rate):
+    return torch.cat([
+        handler.analyze_video(crop_path, batch_size=batch_size, frame_sample_rate=frame_sample_rate)
+        for crop_path in crop_paths
+    ])
+
+def run_stages(args, video_path, tracks, work_dir):
+    stages = {}
+    num_frames = args.frames
+    detections = ground_truth_detections(tracks, args.num_of_skip_frames)
+    model_calls = len(range(0, num_frames, args.num_of_skip_frames))
+    yolo_model = TINY_YOLO_MODEL if args.tiny_models else args.model_path
+
+    def yolo_handler():
+        return YOLOHandler(yolo_model, classes_to_detect=[0])
+
+    def xclip_handler():
+        return TinyXCLIPHandler(UBNORMAL_CATEGORIES) if args.tiny_models else XCLIPHandler(UBNORMAL_CATEGORIES)
+
+    if "decode" in args.stages:
+        _, durations = measure(lambda _: decode(video_path), args.repeats)
+        stages["decode"] = summarize(durations, num_frames, "frames")
+
+    for stage, tracking in (("detect", False), ("track", True)):
+        if stage in args.stages:
+            # A new handler per run, so the tracker state does not carry over; model loading is not timed
+            _, durations = measure(
+                lambda handler: process_segment(video_path, 0, num_frames, handler, Event(), True, args.num_of_skip_frames, tracking, args.confidence_threshold),
+                args.repeats,
+                setup=yolo_handler
+            )
+            stages[stage] = summarize(durations, model_calls, "model_calls")
+
+    if "persist" in args.stages:
+        if args.db_name:
+            db_manager = DatabaseManager(db_name=args.db_name, user="postgres", password="postgres")
+            db_manager.connect()
+            db_manager.create_tables()
+            video_ids = []
+            try:
+                def new_video():
+                    video_ids.append(db_manager.insert_video(video_path, "benchmark"))
+                    return video_ids[-1]
+                _, durations = measure(lambda video_id: store_detections(db_manager, video_id, detections), args.repeats, setup=new_video)
+            finally:
+                for video_id in video_ids:
+                    db_manager.delete_video_by_id(video_id)
+                db_manager.close()
+            stages["persist"] = summarize(durations, len(detections), "bounding_boxes")
+        else:
+            stages["persist"] = {"skipped": "no --db_name"}
+
+    crop_dir = os.path.join(work_dir, "crops")
+    os.makedirs(crop_dir, exist_ok=True)
+    tasks = crop_tasks(video_path, tracks, args.num_of_skip_frames, crop_dir)
+    crop_paths = None
+    if "crop" in args.stages:
+        crop_paths, durations = measure(lambda _: run_crops(tasks), args.repeats)
+        stages["crop"] = summarize(durations, len(tasks), "crops")
+
+    logits = None
+    if "recognize" in args.stages:
+        crop_paths = crop_paths or run_crops(tasks)
+        handler = xclip_handler()
+        logits, durations = measure(lambda _: recognize(handler, crop_paths, args.batch_size, args.frame_sample_rate), args.repeats)
+        stages["recognize"] = summarize(durations, len(crop_paths), "clips")
+
+    if "interpret" in args.stages:
+        if logits is None:
+            # Scores in the range of raw XCLIP logits
+            logits = torch.from_numpy(np.random.default_rng(args.seed).normal(20.0, 3.0, size=(len(tasks), len(UBNORMAL_CATEGORIES))).astype(np.float32))
+        detection_ids = np.arange(logits.shape[0], dtype=np.int64)
+        threshold = args.threshold if args.threshold is not None else float(logits.median())
+        rows, durations = measure(lambda _: interpret_logits(logits, detection_ids, UBNORMAL_CATEGORIES, threshold, args.top_k), args.repeats)
+        stages["interpret"] = {**summarize(durations, logits.shape[0], "detections"), "anomaly_rows": len(rows)}
+
+    if "visualize" in args.stages:
+        anomaly_frame_ranges = [(min(frames), max(frames)) for frames in tracks.values()]
+        output_path = os.path.join(work_dir, "final_output.mp4")
+        _, durations = measure(lambda _: render_anomaly_video(video_path, anomaly_frame_ranges, output_path, args.render_processes or None), args.repeats)
+        stages["visualize"] = {**summarize(durations, num_frames, "frames"), "render_processes": args.render_processes or os.cpu_count()}
+
+    return stages
+
+def run_chained(args, video_path, tracks, work_dir):
+    # Track -> crop -> recognize -> interpret -> visualize, as one analysis in one process
+    yolo_model = TINY_YOLO_MODEL if args.tiny_models else args.model_path
+    xclip_handler = TinyXCLIPHandler(UBNORMAL_CATEGORIES) if args.tiny_models else XCLIPHandler(UBNORMAL_CATEGORIES)
+    crop_dir = os.path.join(work_dir, "pipeline_crops")
+    os.makedirs(crop_dir, exist_ok=True)
+
+    def analysis(yolo_handler):
+        process_segment(video_path, 0, args.frames, yolo_handler, Event(), True, args.num_of_skip_frames, True, args.confidence_threshold)
+        crop_paths = run_crops(crop_tasks(video_path, tracks, args.num_of_skip_frames, crop_dir))
+        logits = recognize(xclip_handler, crop_paths, args.batch_size, args.frame_sample_rate)
+        threshold = args.threshold if args.threshold is not None else float(logits.median())
+        interpret_logits(logits, np.arange(logits.shape[0]), UBNORMAL_CATEGORIES, threshold, args.top_k)
+        render_anomaly_video(video_path, [(min(frames), max(frames)) for frames in tracks.values()], os.path.join(work_dir, "pipeline_output.mp4"))
+
+    _, durations = measure(analysis, args.repeats, setup=lambda: YOLOHandler(yolo_model, classes_to_detect=[0]))
+    return summarize(durations, args.frames, "frames")
+
+def run_full_pipeline(args, video_path):
+    # Every run must execute all stages, and the pipeline resolves its paths relative to src/
+    os.environ["STAGE_CACHE_ENABLED"] = "0"
+    os.chdir(ROOT_DIR)
+    from backend.app.services.experiment_service import run_full_analysis
+
+    video_ids = []
+    def analysis(_):
+        response = run_full_analysis(
+            video_path=video_path,
+            model_path=args.model_path,
+            num_segments=8,
+            processing_mode="parallel",
+            classes_to_detect=[0],
+            name_of_analysis="benchmark",
+            categories=UBNORMAL_CATEGORIES,
+            threshold=args.threshold if args.threshold is not None else 21,
+            skip_frames=True,
+            num_of_skip_frames=args.num_of_skip_frames,
+            confidence_threshold=args.confidence_threshold,
+            top_k=args.top_k,
+            batch_size=args.batch_size,
+            frame_sample_rate=args.frame_sample_rate
+        )
+        video_ids.append(response["video_id"])
+
+    try:
+        _, durations = measure(analysis, args.repeats)
+    finally:
+        db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
+        db_manager.connect()
+        for video_id in video_ids:
+            db_manager.delete_video_by_id(video_id)
+            shutil.rmtree(os.path.join(ROOT_DIR, "..", "data", "output", str(video_id)), ignore_errors=True)
+        db_manager.close()
+    return summarize(durations, args.frames, "frames")
+
+def main(args):
+    work_dir = tempfile.mkdtemp(prefix="pipeline_benchmark_")
+    try:
+        video_path = os.path.join(work_dir, "synthetic.mp4")
+        tracks = generate_video(video_path, args.objects, args.width, args.height, args.frames, args.fps, args.sprite, args.seed)
+
+        result = {
+            "benchmark": "pipeline",
+            "git_commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "environment": environment(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output",)},
+            "stages": run_stages(args, video_path, tracks, work_dir)
+        }
+        if not args.skip_pipeline:
+            result["pipeline"] = run_chained(args, video_path, tracks, work_dir)
+        if args.full_pipeline:
+            result["full_pipeline"] = run_full_pipeline(args, video_path)
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark of the analysis pipeline on a synthetic video.")
+    parser.add_argument("--objects", type=int, default=4, help="Number of moving objects in the video.")
+    parser.add_argument("--width", type=int, default=640, help="Width of the video.")
+    parser.add_argument("--height", type=int, default=360, help="Height of the video.")
+    parser.add_argument("--frames", type=int, default=300, help="Number of frames of the video.")
+    parser.add_argument("--fps", type=int, default=25, help="Frame rate of the video.")
+    parser.add_argument("--sprite", type=str, choices=["person", "rectangle"], default="person", help="Shape of the moving objects.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic video.")
+    parser.add_argument("--stages", type=str, nargs="+", choices=STAGES, default=STAGES, help="Stages timed in isolation.")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per measurement, the median is reported.")
+    parser.add_argument("--tiny_models", action="store_true", help="Use tiny randomly initialized YOLO/XCLIP models.")
+    parser.add_argument("--model_path", type=str, default=os.path.join(ROOT_DIR, "..", "data", "models", "yolo11n.pt"), help="YOLO weights.")
+    parser.add_argument("--num_of_skip_frames", type=int, default=5, help="Every n-th frame is passed to YOLO.")
+    parser.add_argument("--confidence_threshold", type=float, default=0.25, help="Minimum confidence of a detection.")
+    parser.add_argument("--batch_size", type=int, default=32, help="XCLIP batch size.")
+    parser.add_argument("--frame_sample_rate", type=int, default=4, help="XCLIP frame sample rate.")
+    parser.add_argument("--threshold", type=float, default=None, help="Anomaly score threshold (default: median of the logits).")
+    parser.add_argument("--top_k", type=int, default=5, help="Number of top categories considered per detection.")
+    parser.add_argument("--render_processes", type=int, default=1, help="Processes of the visualize stage (0 = all cores, chunked rendering).")
+    parser.add_argument("--db_name", type=str, default=None, help="Throwaway database for the persist stage (skipped if not set).")
+    parser.add_argument("--skip_pipeline", action="store_true", help="Do not time the chained in-process pipeline.")
+    parser.add_argument("--full_pipeline", action="store_true", help="Also time run_full_analysis against the application database (real models only).")
+    parser.add_argument("--output", type=str, default=None, help="Also write the JSON result to this file.")
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    if args.full_pipeline and args.tiny_models:
+        sys.exit("--full_pipeline loads the pretrained XCLIP model and cannot be combined with --tiny_models.")
+
+    result = main(args)
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    print(output)
@@ -0,0 +1,162 @@
+# This script guards the pipeline throughput against performance regressions.
+#
+# Functionality:
+# - Runs a fixed scenario of `pipeline_benchmark.py`: a small synthetic video through tracking,
+#   cropping, recognition and interpretation, and the chained pipeline, with tiny random models
+#   (or the real ones with `--real_models`).
+# - Compares the median stage times with a stored baseline JSON. A stage regresses when it is slower
+#   than the baseline by more than its relative tolerance and by more than `--min_delta_seconds`
+#   (timings of tiny stages are noisy).
+# - Prints a table of all stages and exits with 1 if any stage regressed, 2 if there is no usable baseline.
+# - `--update-baseline` stores the current result as the new baseline instead of comparing.
+#
+# Baselines depend on the machine, record one per machine (or CI runner) and keep it next to the results.
+# Per-stage tolerances can be set in the baseline file, e.g. "tolerances": {"recognize": 0.4}.
+#
+# Usage:
+#   python benchmarks/regression_runner.py --update-baseline
+#   python benchmarks/regression_runner.py
+#   python benchmarks/regression_runner.py --baseline benchmarks/baselines/ci.json --tolerance 0.15
+
+import argparse
+import json
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BENCHMARKS_DIR)
+
+import pipeline_benchmark
+
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "baselines", "pipeline_regression.json")
+
+# Fixed scenario, changing it requires recording a new baseline
+SCENARIO = [
+    "--objects", "2",
+    "--width", "320",
+    "--height", "180",
+    "--frames", "150",
+    "--sprite", "person",
+    "--seed", "0",
+    "--repeats", "5",
+    "--stages", "track", "crop", "recognize", "interpret"
+]
+
+# Configuration keys that must match between the baseline and the current run
+SCENARIO_KEYS = ["objects", "width", "height", "frames", "fps", "sprite", "seed", "stages", "tiny_models",
+                 "num_of_skip_frames", "confidence_threshold", "batch_size", "frame_sample_rate", "top_k"]
+
+def run_scenario(real_models):
+    args = pipeline_benchmark.build_parser().parse_args(SCENARIO + ([] if real_models else ["--tiny_models"]))
+    return pipeline_benchmark.main(args)
+
+def stage_seconds(result):
+    seconds = {stage: values["seconds"] for stage, values in result["stages"].items() if "seconds" in values}
+    if "pipeline" in result:
+        seconds["pipeline"] = result["pipeline"]["seconds"]
+    return seconds
+
+def compare(baseline, current, tolerance, min_delta_seconds):
+    """Returns one row per stage of the baseline: (stage, baseline, current, change, tolerance, status)."""
+    tolerances = baseline.get("tolerances", {})
+    baseline_seconds = stage_seconds(baseline)
+    current_seconds = stage_seconds(current)
+
+    rows = []
+    for stage, before in baseline_seconds.items():
+        stage_tolerance = tolerances.get(stage, tolerance)
+        after = current_seconds.get(stage)
+        if after is None:
+            rows.append((stage, before, None, None, stage_tolerance, "MISSING"))
+            continue
+
+        change = (after - before) / before if before > 0 else 0.0
+        if change > stage_tolerance and after - before > min_delta_seconds:
+            status = "REGRESSED"
+        elif change < -stage_tolerance and before - after > min_delta_seconds:
+            status = "IMPROVED"
+        else:
+            status = "ok"
+        rows.append((stage, before, after, change, stage_tolerance, status))
+    return rows
+
+def format_table(rows):
+    lines = [f"{'stage':<12} {'baseline':>10} {'current':>10} {'change':>9} {'tolerance':>10}  status"]
+    for stage, before, after, change, stage_tolerance, status in rows:
+        current = f"{after:.3f} s" if after is not None else "-"
+        change_text = f"{change * 100:+.1f}%" if change is not None else "-"
+        lines.append(f"{stage:<12} {before:>8.3f} s {current:>10} {change_text:>9} {stage_tolerance * 100:>9.0f}%  {status}")
+    return "\n".join(lines)
+
+def scenario_differences(baseline, current):
+    return [
+        f"{key}: baseline {baseline['config'].get(key)!r}, current {current['config'].get(key)!r}"
+        for key in SCENARIO_KEYS
+        if baseline["config"].get(key) != current["config"].get(key)
+    ]
+
+def main(args):
+    if not args.update_baseline and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}. Record one on this machine with --update-baseline.")
+        return 2
+
+    current = run_scenario(args.real_models)
+
+    if args.update_baseline:
+        # Tolerances tuned by hand in the previous baseline are kept
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                previous = json.load(file)
+            if "tolerances" in previous:
+                current["tolerances"] = previous["tolerances"]
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as file:
+            json.dump(current, file, indent=2)
+        print(f"Baseline for commit {current['git_commit']} written to {args.baseline}.")
+        print(format_table(compare(current, current, args.tolerance, args.min_delta_seconds)))
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+
+    differences = scenario_differences(baseline, current)
+    if differences:
+        print("The baseline was recorded with a different scenario, record it again with --update-baseline:")
+        print("\n".join(f"  {difference}" for difference in differences))
+        return 2
+
+    if baseline["environment"] != current["environment"]:
+        print("⚠️  The baseline was recorded in a different environment, the comparison may be meaningless:")
+        for key in sorted(set(baseline["environment"]) | set(current["environment"])):
+            if baseline["environment"].get(key) != current["environment"].get(key):
+                print(f"  {key}: baseline {baseline['environment'].get(key)!r}, current {current['environment'].get(key)!r}")
+
+    rows = compare(baseline, current, args.tolerance, args.min_delta_seconds)
+    print(f"Baseline commit: {baseline.get('git_commit')}, current commit: {current.get('git_commit')}")
+    print(format_table(rows))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(current, file, indent=2)
+
+    regressed = [row for row in rows if row[5] in ("REGRESSED", "MISSING")]
+    if regressed:
+        print(f"\n❌ {len(regressed)} stage(s) regressed: " + ", ".join(
+            f"{stage} ({change * 100:+.1f}%)" if change is not None else f"{stage} (missing)"
+            for stage, _, _, change, _, _ in regressed
+        ))
+        return 1
+
+    print("\n✅ No stage regressed.")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Performance regression check of the pipeline against a stored baseline.")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE, help="Baseline JSON file.")
+    parser.add_argument("--update-baseline", dest="update_baseline", action="store_true", help="Store the current result as the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown per stage (0.25 = 25%%).")
+    parser.add_argument("--min_delta_seconds", type=float, default=0.05, help="Slowdowns smaller than this are never reported.")
+    parser.add_argument("--real_models", action="store_true", help="Use the real YOLO/XCLIP models instead of the tiny random ones.")
+    parser.add_argument("--output", type=str, default=None, help="Also write the current result to this file.")
+
+    sys.exit(main(parser.parse_args()))
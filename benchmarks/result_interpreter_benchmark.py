@@ -0,0 +1,130 @@
+# This script benchmarks the result interpretation step on synthetic logits.
+#
+# Functionality:
+# - Generates random XCLIP-like logits for `--detections` detections and `--categories` categories.
+# - Interprets them with the previous per-detection loop (topk + `.item()` per score) and with the
+#   vectorized `interpret_logits` from `result_interpreter.py`, and checks both give the same rows.
+# - Optionally (`--db_name`) writes the rows to a throwaway PostgreSQL database, once with one
+#   `insert_detection_anomalies` call per detection and once with the single bulk replace.
+# - Prints the timings as JSON.
+#
+# Usage:
+#   python benchmarks/result_interpreter_benchmark.py --detections 10000
+#   python benchmarks/result_interpreter_benchmark.py --detections 10000 --db_name diploma_thesis_benchmark_db
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(ROOT_DIR)
+
+from backend.app.core.result_interpreter import interpret_logits
+from backend.app.core.database_manager import DatabaseManager
+
+def interpret_per_detection(logits_matrix, detection_ids, list_of_categories, threshold, topk_a):
+    # The interpretation loop used before vectorization
+    result = []
+    for detection_id, logits_tensor in zip(detection_ids, logits_matrix):
+        topk = min(topk_a, logits_tensor.shape[0])
+        top_scores, top_indices = logits_tensor.topk(topk)
+
+        anomalies = []
+        for score, index in zip(top_scores, top_indices):
+            if score.item() >= threshold:
+                anomalies.append({
+                    "label": list_of_categories[index.item()],
+                    "score": score.item()
+                })
+        result.append((int(detection_id), anomalies))
+    return result
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def benchmark_database(db_name, detection_ids_count, categories, per_detection, vectorized):
+    db_manager = DatabaseManager(db_name=db_name, user="postgres", password="postgres")
+    db_manager.connect()
+    db_manager.create_tables()
+
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO videos (video_path, name_of_analysis) VALUES ('benchmark', 'benchmark') RETURNING id;")
+    video_id = cursor.fetchone()[0]
+    cursor.execute(
+        "INSERT INTO detections (video_id, start_frame, end_frame) SELECT %s, 0, 0 FROM generate_series(1, %s) RETURNING id;",
+        (video_id, detection_ids_count)
+    )
+    detection_ids = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    db_manager.release_connection(conn)
+
+    try:
+        start = time.perf_counter()
+        for (_, anomalies), detection_id in zip(per_detection, detection_ids):
+            if anomalies:
+                db_manager.insert_detection_anomalies(detection_id, anomalies)
+        per_detection_seconds = time.perf_counter() - start
+
+        id_map = dict(zip(range(detection_ids_count), detection_ids))
+        rows = [(id_map[detection_id], label, score) for detection_id, label, score in vectorized]
+        start = time.perf_counter()
+        db_manager.replace_detection_anomalies_for_videos([video_id], rows)
+        bulk_seconds = time.perf_counter() - start
+    finally:
+        db_manager.delete_video_by_id(video_id)
+        db_manager.close()
+
+    return {
+        "per_detection_insert_seconds": round(per_detection_seconds, 4),
+        "bulk_insert_seconds": round(bulk_seconds, 4),
+        "speedup": round(per_detection_seconds / bulk_seconds, 1) if bulk_seconds > 0 else None
+    }
+
+def main(num_detections, num_categories, threshold, top_k, db_name, seed):
+    generator = np.random.default_rng(seed)
+    # Raw XCLIP logits are roughly in the 15-30 range
+    logits_matrix = torch.from_numpy(generator.normal(20.0, 3.0, size=(num_detections, num_categories)).astype(np.float32))
+    detection_ids = np.arange(num_detections, dtype=np.int64)
+    categories = [f"category {i}" for i in range(num_categories)]
+
+    per_detection, per_detection_seconds = timed(interpret_per_detection, logits_matrix, detection_ids, categories, threshold, top_k)
+    vectorized, vectorized_seconds = timed(interpret_logits, logits_matrix, detection_ids, categories, threshold, top_k)
+
+    expected = [(d, a["label"], a["score"]) for d, anomalies in per_detection for a in anomalies]
+    result = {
+        "detections": num_detections,
+        "categories": num_categories,
+        "threshold": threshold,
+        "top_k": top_k,
+        "anomaly_rows": len(vectorized),
+        "results_match": expected == vectorized,
+        "per_detection_seconds": round(per_detection_seconds, 4),
+        "vectorized_seconds": round(vectorized_seconds, 4),
+        "speedup": round(per_detection_seconds / vectorized_seconds, 1) if vectorized_seconds > 0 else None
+    }
+
+    if db_name:
+        result["database"] = benchmark_database(db_name, num_detections, categories, per_detection, vectorized)
+
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the result interpreter.")
+    parser.add_argument("--detections", type=int, default=10000, help="Number of synthetic detections.")
+    parser.add_argument("--categories", type=int, default=12, help="Number of categories per detection.")
+    parser.add_argument("--threshold", type=float, default=21, help="Score threshold of an anomaly.")
+    parser.add_argument("--top_k", type=int, default=5, help="Number of top categories considered per detection.")
+    parser.add_argument("--db_name", type=str, default=None, help="Throwaway database for the insert benchmark (skipped if not set).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic logits.")
+
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.detections, args.categories, args.threshold, args.top_k, args.db_name, args.seed), indent=2))
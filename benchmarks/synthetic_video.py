@@ -0,0 +1,67 @@
+# This module generates synthetic videos for the benchmarks, so they run offline without a dataset.
+#
+# Functionality:
+# - Renders `num_objects` objects (plain rectangles or simple person sprites) moving across a noisy
+#   background and bouncing off the borders, with a fixed seed, so the same arguments always give
+#   the same video.
+# - Returns the ground-truth track of every object (frame id -> bounding box), which the benchmarks
+#   use as detections, so the timings of the later stages do not depend on the detector weights.
+#
+# Usage (from other benchmarks):
+#   from synthetic_video import generate_video
+#   tracks = generate_video("/tmp/video.mp4", num_objects=4, width=640, height=360, num_frames=300)
+
+import cv2
+import numpy as np
+
+def _draw_person(frame, x1, y1, x2, y2, color):
+    # Head, body and legs, roughly in the proportions of a standing person
+    width = x2 - x1
+    height = y2 - y1
+    center_x = x1 + width // 2
+    head_radius = max(2, min(width, height) // 6)
+    cv2.circle(frame, (center_x, y1 + head_radius), head_radius, color, -1)
+    cv2.rectangle(frame, (x1 + width // 4, y1 + 2 * head_radius), (x2 - width // 4, y1 + height * 2 // 3), color, -1)
+    cv2.line(frame, (center_x, y1 + height * 2 // 3), (x1 + width // 4, y2), color, max(1, width // 8))
+    cv2.line(frame, (center_x, y1 + height * 2 // 3), (x2 - width // 4, y2), color, max(1, width // 8))
+
+def generate_video(output_path, num_objects=4, width=640, height=360, num_frames=300, fps=25, sprite="person", seed=0):
+    """Writes the video and returns {track_id: {frame_id: [x1, y1, x2, y2]}}."""
+    generator = np.random.default_rng(seed)
+
+    object_height = max(8, height // 4)
+    object_width = max(4, object_height // 2) if sprite == "person" else object_height
+    positions = generator.uniform([0, 0], [width - object_width, height - object_height], size=(num_objects, 2))
+    velocities = generator.uniform(-4, 4, size=(num_objects, 2))
+    colors = generator.integers(64, 256, size=(num_objects, 3))
+    background = generator.integers(0, 64, size=(height, width, 3), dtype=np.uint8)
+
+    tracks = {track_id: {} for track_id in range(1, num_objects + 1)}
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+
+    for frame_id in range(num_frames):
+        frame = background.copy()
+        # A little noise per frame, so the encoder cannot skip the static background entirely
+        frame[generator.integers(0, height, 64), generator.integers(0, width, 64)] = 255
+
+        for index in range(num_objects):
+            positions[index] += velocities[index]
+            for axis, limit in ((0, width - object_width), (1, height - object_height)):
+                if positions[index, axis] < 0 or positions[index, axis] > limit:
+                    velocities[index, axis] *= -1
+                    positions[index, axis] = np.clip(positions[index, axis], 0, limit)
+
+            x1, y1 = int(positions[index, 0]), int(positions[index, 1])
+            x2, y2 = x1 + object_width, y1 + object_height
+            color = tuple(int(channel) for channel in colors[index])
+            if sprite == "person":
+                _draw_person(frame, x1, y1, x2, y2, color)
+            else:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, -1)
+
+            tracks[index + 1][frame_id] = [x1, y1, x2, y2]
+
+        out.write(frame)
+
+    out.release()
+    return tracks
@@ -0,0 +1,97 @@
+# This module provides tiny, randomly initialized models for the benchmarks, so the pipeline can be
+# timed without downloaded weights (and much faster than with the real models).
+#
+# Functionality:
+# - TINY_YOLO_MODEL: an ultralytics model definition; YOLO builds it with random weights.
+# - TinyXCLIPHandler: an `XCLIPHandler` with a small random XCLIP model. The pretrained processor is
+#   not available offline, so frames are resized/normalized and descriptions are tokenized here.
+#
+# The outputs of these models are meaningless, only their cost (and its changes) is of interest.
+
+import zlib
+
+import cv2
+import numpy as np
+import torch
+from transformers import XCLIPConfig, XCLIPModel
+
+from backend.app.core.xclip_handler import XCLIPHandler
+
+TINY_YOLO_MODEL = "yolo11n.yaml"
+
+TINY_XCLIP_IMAGE_SIZE = 64
+TINY_XCLIP_NUM_FRAMES = 32  # the handler samples 32 frames per clip, as the real model expects
+TINY_XCLIP_VOCAB_SIZE = 1000
+TINY_XCLIP_MAX_TOKENS = 32
+
+def tiny_xclip_config():
+    return XCLIPConfig(
+        text_config={
+            "vocab_size": TINY_XCLIP_VOCAB_SIZE,
+            "hidden_size": 64,
+            "intermediate_size": 128,
+            "num_hidden_layers": 2,
+            "num_attention_heads": 4,
+            "max_position_embeddings": TINY_XCLIP_MAX_TOKENS
+        },
+        vision_config={
+            "hidden_size": 64,
+            "intermediate_size": 128,
+            "num_hidden_layers": 2,
+            "num_attention_heads": 4,
+            "image_size": TINY_XCLIP_IMAGE_SIZE,
+            "patch_size": 16,
+            "num_frames": TINY_XCLIP_NUM_FRAMES,
+            # The integration transformer works on the projected frame embeddings
+            "mit_hidden_size": 64,
+            "mit_intermediate_size": 128,
+            "mit_num_hidden_layers": 1,
+            "mit_num_attention_heads": 4
+        },
+        projection_dim=64,
+        prompt_layers=1,
+        prompt_num_attention_heads=4
+    )
+
+
+class TinyXCLIPHandler(XCLIPHandler):
+    def __init__(self, list_of_categories=None, seed=0):
+        # The pretrained model and processor of the parent are intentionally not loaded
+        torch.manual_seed(seed)
+        self.model_name = "tiny-random-xclip"
+        self.processor = None
+        self.model = XCLIPModel(tiny_xclip_config()).eval()
+        self.list_of_categories = list_of_categories
+        self.frames_decoded = 0
+
+    @staticmethod
+    def _tokenize(descriptions):
+        # Stable word hashes instead of the CLIP tokenizer
+        token_ids = [
+            [zlib.crc32(word.encode("utf-8")) % (TINY_XCLIP_VOCAB_SIZE - 1) + 1 for word in description.lower().split()][:TINY_XCLIP_MAX_TOKENS]
+            for description in descriptions
+        ]
+        length = max(len(ids) for ids in token_ids)
+        input_ids = torch.zeros((len(token_ids), length), dtype=torch.long)
+        attention_mask = torch.zeros((len(token_ids), length), dtype=torch.long)
+        for row, ids in enumerate(token_ids):
+            input_ids[row, :len(ids)] = torch.tensor(ids)
+            attention_mask[row, :len(ids)] = 1
+        return input_ids, attention_mask
+
+    @staticmethod
+    def _pixel_values(frames):
+        # Short clips are stretched to the number of frames the model was built for
+        indices = np.linspace(0, len(frames) - 1, num=TINY_XCLIP_NUM_FRAMES).astype(np.int64)
+        resized = np.stack([
+            cv2.resize(frames[index], (TINY_XCLIP_IMAGE_SIZE, TINY_XCLIP_IMAGE_SIZE), interpolation=cv2.INTER_AREA)
+            for index in indices
+        ]).astype(np.float32) / 255.0
+        # (frames, height, width, channels) -> (1, frames, channels, height, width)
+        return torch.from_numpy(resized).permute(0, 3, 1, 2).unsqueeze(0)
+
+    def classify_batch(self, frames, descriptions):
+        input_ids, attention_mask = self._tokenize(descriptions)
+        with torch.no_grad():
+            outputs = self.model(input_ids=input_ids, attention_mask=attention_mask, pixel_values=self._pixel_values(frames))
+        return outputs.logits_per_video
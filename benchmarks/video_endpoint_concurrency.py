@@ -0,0 +1,78 @@
+# This script benchmarks how the backend handles many parallel reads of a single endpoint.
+#
+# Functionality:
+# - Sends `--requests` GET requests to `/api/video/{video_id}` with at most `--concurrency` in flight.
+# - Measures latency of every request and the total wall-clock time.
+# - Reports throughput (requests/s), error count and p50/p95/p99 latencies as JSON.
+#
+# The backend must already be running (e.g. `./run_prototype_ui.sh --backend`) and the video must exist.
+#
+# Usage:
+#   python benchmarks/video_endpoint_concurrency.py --video_id 1 --concurrency 100 --requests 2000
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_benchmark(base_url, video_id, concurrency, total_requests):
+    url = f"{base_url}/api/video/{video_id}"
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        async def single_request():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(single_request() for _ in range(total_requests)))
+        elapsed = time.perf_counter() - start_time
+
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "total_seconds": round(elapsed, 3),
+        "requests_per_second": round(total_requests / elapsed, 2) if elapsed > 0 else None,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 2) if latencies else None,
+            "p50": round(percentile(latencies, 50), 2) if latencies else None,
+            "p95": round(percentile(latencies, 95), 2) if latencies else None,
+            "p99": round(percentile(latencies, 99), 2) if latencies else None,
+            "max": round(max(latencies), 2) if latencies else None,
+        }
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency benchmark for GET /api/video/{video_id}.")
+    parser.add_argument("--base_url", type=str, default="http://127.0.0.1:8000", help="Base URL of the running backend.")
+    parser.add_argument("--video_id", type=int, required=True, help="ID of an existing video in the database.")
+    parser.add_argument("--concurrency", type=int, default=100, help="Maximum number of requests in flight.")
+    parser.add_argument("--requests", type=int, default=2000, help="Total number of requests to send.")
+
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args.base_url, args.video_id, args.concurrency, args.requests))
+    print(json.dumps(result, indent=2))
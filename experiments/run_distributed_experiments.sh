@@ -0,0 +1,87 @@
+#!/bin/bash
+
+# This script runs experiments with several local workers sharing the PostgreSQL task table.
+#
+# Functionality:
+# - Enqueues every payload of the given JSON file as an experiment with one task per video.
+# - Starts the requested number of worker processes in the background (one log file per worker).
+# - Waits until the workers have processed all tasks.
+# - Saves the aggregated result of every experiment as JSON.
+#
+# The local workers share the stage cache and the database: the cache index is locked, detection runs are leased,
+# and workers analyzing the same video file write their recognition and interpretation results to their own video
+# row (a cached detection run is copied, see experiment_service.py). Every worker gets an equal share of the CPUs
+# for its detection workers and process pools.
+#
+# Workers on other hosts can join by running (from their `src` directory):
+#   python -m backend.app.core.experiment_worker work
+#
+# Usage:
+#   ./run_distributed_experiments.sh <payload_file.json> [number_of_workers] [processes_per_worker]
+
+# === SETTINGS ===
+ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+SRC_DIR="$ROOT_DIR/src"
+RESULTS_DIR="$ROOT_DIR/experiments/results"
+LOG_DIR="$ROOT_DIR/logs"
+CONDA_ENV="diploma-thesis-prototype"
+
+if [ -z "$1" ]; then
+  echo "❌ Please provide the payload file name located in experiments/ folder."
+  echo "Usage: ./run_distributed_experiments.sh experiment_payloads.json [number_of_workers] [processes_per_worker]"
+  exit 1
+fi
+
+PAYLOADS_FILE="$ROOT_DIR/experiments/$1"
+NUM_WORKERS="${2:-2}"
+PROCESSES_PER_WORKER="${3:-$(( $(nproc) / NUM_WORKERS > 0 ? $(nproc) / NUM_WORKERS : 1 ))}"
+
+if [ ! -f "$PAYLOADS_FILE" ]; then
+  echo "❌ File not found: $PAYLOADS_FILE"
+  exit 1
+fi
+
+mkdir -p "$LOG_DIR"
+mkdir -p "$RESULTS_DIR"
+cd "$SRC_DIR" || exit 1
+
+# === 1. Enqueue payloads ===
+echo "🗂️ Enqueueing payloads from $PAYLOADS_FILE..."
+EXPERIMENT_IDS=$(conda run --no-capture-output -n "$CONDA_ENV" \
+  python -m backend.app.core.experiment_worker enqueue --payloads "$PAYLOADS_FILE" | tail -n 1 | jq -r '.experiment_ids[]')
+
+if [ -z "$EXPERIMENT_IDS" ]; then
+  echo "❌ No experiments were enqueued."
+  exit 1
+fi
+echo "✅ Enqueued experiments: $(echo $EXPERIMENT_IDS)"
+
+# === 2. Start workers ===
+WORKER_PIDS=()
+trap 'echo "🛑 Caught termination signal. Stopping workers..."; kill "${WORKER_PIDS[@]}" 2>/dev/null; exit 1' SIGINT SIGTERM
+
+START_EPOCH=$(date +%s)
+for i in $(seq 1 "$NUM_WORKERS"); do
+  conda run --no-capture-output -n "$CONDA_ENV" \
+    python -m backend.app.core.experiment_worker work --exit_when_idle \
+      --worker_id "$(hostname)-worker-$i" --num_processes "$PROCESSES_PER_WORKER" \
+    > "$LOG_DIR/experiment_worker_$i.log" 2>&1 &
+  WORKER_PIDS+=($!)
+  echo "👷 Started worker $i (PID $!, $PROCESSES_PER_WORKER processes)"
+done
+
+# === 3. Wait for workers ===
+wait "${WORKER_PIDS[@]}"
+DURATION=$(( $(date +%s) - START_EPOCH ))
+echo "🏁 All workers finished in ${DURATION} seconds."
+
+# === 4. Save results ===
+for EXPERIMENT_ID in $EXPERIMENT_IDS; do
+  OUT_FILE="$RESULTS_DIR/distributed_experiment_${EXPERIMENT_ID}_$(date +%Y%m%d_%H%M%S).json"
+  STATUS_FILE="$(mktemp)"
+  conda run --no-capture-output -n "$CONDA_ENV" \
+    python -m backend.app.core.experiment_worker status --experiment_id "$EXPERIMENT_ID" --output "$STATUS_FILE" > /dev/null
+  jq '{ request_data: .request, result_data: .result, tasks: .tasks }' "$STATUS_FILE" > "$OUT_FILE"
+  rm -f "$STATUS_FILE"
+  echo "✅ Saved result of experiment $EXPERIMENT_ID to $OUT_FILE"
+done
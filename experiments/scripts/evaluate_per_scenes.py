@@ -3,7 +3,7 @@
 # Functionality:
 # - Parses command-line arguments to configure threshold, confidence threshold, and top_k values.
 # - Loads ground-truth annotations from the UBnormal dataset.
-# - Fetches detections and anomaly logits from a PostgreSQL database.
+# - Fetches detections from PostgreSQL and the per-video logits matrices from the logits store.
 # - Matches detections against ground-truth activities for each video.
 # - Computes evaluation metrics (precision, recall, F1-score) per scene.
 # - Outputs results as a JSON summary.
@@ -32,6 +32,7 @@ DATASET_PATH = "../../UBnormal"
 
 import psycopg2
 from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.logits_store import load_video_logits
 
 DB_CONFIG = {
     'host': 'localhost',
@@ -92,12 +93,16 @@ def interpret_result(video_id: int, threshold: float, list_of_categories: List[s
         cur.close()
         conn.close()
 
-        all_logits = db_manager.get_anomaly_recognition_data_by_video_id(video_id)
-        logits_per_video_binary_map = [entry for entry in all_logits if entry['detection_id'] in valid_detection_ids]
+        video_logits = load_video_logits(db_manager, video_id)
+        if video_logits is None:
+            return result
 
-        for data in logits_per_video_binary_map:
-            detection_id = int(data['detection_id'])
-            logits_tensor = torch.tensor(np.frombuffer(data['logits_per_video'], dtype=np.float32))
+        valid_rows = np.isin(video_logits['detection_ids'], list(valid_detection_ids))
+        detection_ids = video_logits['detection_ids'][valid_rows]
+        logits_matrix = torch.from_numpy(np.array(video_logits['logits'][valid_rows], dtype=np.float32))
+
+        for detection_id, logits_tensor in zip(detection_ids, logits_matrix):
+            detection_id = int(detection_id)
             topk = min(topk_a, logits_tensor.shape[0])
             top_scores, top_indices = logits_tensor.topk(topk)
 
@@ -10,13 +10,14 @@ Endpoints:
 from fastapi import APIRouter
 from backend.app.models.anomaly_models import AnomalyPreprocessRequest, AnomalyRecognitionRequest
 from backend.app.services.anomaly_service import run_anomaly_preprocessing, run_anomaly_recognition
+from backend.app.utils.executor_utils import run_in_pipeline_executor
 
 router = APIRouter()
 
 @router.post("/anomaly/preprocess")
-def preprocess_anomaly(request: AnomalyPreprocessRequest):
-    return run_anomaly_preprocessing(request)
+async def preprocess_anomaly(request: AnomalyPreprocessRequest):
+    return await run_in_pipeline_executor(run_anomaly_preprocessing, request)
 
 @router.post("/anomaly/recognition")
-def anomaly_recognition(request: AnomalyRecognitionRequest):
-    return run_anomaly_recognition(request)
+async def anomaly_recognition(request: AnomalyRecognitionRequest):
+    return await run_in_pipeline_executor(run_anomaly_recognition, request)
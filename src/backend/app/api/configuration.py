@@ -14,8 +14,8 @@ Endpoints:
 
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List
-from backend.app.core.database_manager import DatabaseManager
 from backend.app.models.configuration_models import AnalysisConfigIn, AnalysisConfigOut, UpdateAnalysisConfigRequest, LinkIn
 from backend.app.services.configuration_service import (
     save_analysis_config,
@@ -40,36 +40,37 @@ def create_analysis_config(config: AnalysisConfigIn):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/configuration", response_model=List[AnalysisConfigOut], status_code=200)
-def list_analysis_configs():
+async def list_analysis_configs():
     try:
-        db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    
-        db_manager.connect()
-        db_manager.create_tables()
-        return get_all_analysis_configs()
+        return await get_all_analysis_configs()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/configuration/{config_id}", response_model=AnalysisConfigOut, status_code=200)
-def get_config_by_id(config_id: int):
+async def get_config_by_id(config_id: int):
     try:
-        config = get_analysis_config_by_id(config_id)
+        config = await get_analysis_config_by_id(config_id)
         if config is None:
             raise HTTPException(status_code=404, detail="Configuration not found")
         return config
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/configuration/{config_id}", status_code=200)
 async def delete_configuration(config_id: int):
     try:
-        config = delete_configuration_by_id(config_id)
+        # Writes go through the blocking DatabaseManager, so keep them off the event loop
+        config = await run_in_threadpool(delete_configuration_by_id, config_id)
         if config is None:
             raise HTTPException(status_code=404, detail="Configuration not found")
         return {
             "status": "success",
             "message": f"Configuration '{config['name']}' deleted"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -77,13 +78,15 @@ async def delete_configuration(config_id: int):
 @router.put("/configuration/{config_id}")
 async def update_configuration(config_id: int, update: UpdateAnalysisConfigRequest):
     try:
-        updated = update_analysis_config(config_id, update)
+        updated = await run_in_threadpool(update_analysis_config, config_id, update)
         if not updated:
             raise HTTPException(status_code=404, detail="Configuration not found")
         return {
             "status": "success",
             "message": f"Configuration '{update.name}' updated"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
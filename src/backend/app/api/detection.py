@@ -6,11 +6,16 @@ This API router handles object detection functionality.
 Endpoints:
 - POST /object-detection: runs the object detection pipeline with provided parameters.
 - GET /detections/{video_id}: retrieves detections for a given video ID.
+- GET /detections/{video_id}/page: streams one keyset-paginated page of detections,
+  optionally filtered by minimal confidence, anomaly label or presence of anomalies.
 """
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from backend.app.models.detection_models import DetectionRequest, DetectionResponse
 from backend.app.services.detection_service import run_object_detection
-from backend.app.services.detection_service import get_detections_by_video_id
+from backend.app.services.detection_service import get_detections_by_video_id, stream_detections_page
+from backend.app.utils.executor_utils import run_in_pipeline_executor
 from pathlib import Path
 
 # Base directory = root of the project (assuming this script is in diploma-thesis-prototype/src/backend/app/api/)
@@ -20,12 +25,27 @@ BASE_DIR = Path(__file__).resolve().parents[4]
 router = APIRouter()
 
 @router.post("/object-detection", response_model=DetectionResponse)
-def detect_objects(request: DetectionRequest):
+async def detect_objects(request: DetectionRequest):
     absolute_model_path = str(BASE_DIR / request.model_path)
     updated_request = request.model_copy(update={"model_path": absolute_model_path})
-    return run_object_detection(updated_request)
+    return await run_in_pipeline_executor(run_object_detection, updated_request)
 
 @router.get("/detections/{video_id}")
-def get_detections(video_id: int):
-    detections = get_detections_by_video_id(video_id)
-    return {"detections": detections}
\ No newline at end of file
+async def get_detections(video_id: int):
+    detections = await get_detections_by_video_id(video_id)
+    return {"detections": detections}
+
+@router.get("/detections/{video_id}/page")
+async def get_detections_page(
+    video_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    label: Optional[str] = None,
+    has_anomalies: Optional[bool] = None
+):
+    try:
+        page = stream_detections_page(video_id, limit, cursor, min_confidence, label, has_anomalies)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(page, media_type="application/json")
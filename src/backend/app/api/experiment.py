@@ -2,12 +2,17 @@
 experiment.py
 
 This API router provides an endpoint for executing the full analysis pipeline over the UBnormal dataset.
-It loads scenes and annotations, runs detection and anomaly recognition on each video,
-evaluates the results, and returns performance metrics.
+It loads scenes and annotations, runs detection and anomaly recognition on each video (several videos
+concurrently, with per-video checkpoints), evaluates the results, and returns performance metrics.
 
-Endpoint:
+Endpoints:
 - POST /experiments/ubnormal/run: launches the evaluation over all scenes (normal and abnormal),
   then returns TP, FP, FN, TN, and derived metrics such as precision, recall, and F1-score.
+- POST /experiments/ubnormal/sweep: re-evaluates the stored results over a grid of threshold, top_k
+  and confidence_threshold values without re-running detection or recognition.
+- POST /experiments/distributed: enqueues experiment payloads as per-video tasks for the workers
+  (`python -m backend.app.core.experiment_worker work`).
+- GET /experiments/distributed/{experiment_id}: returns the progress and, once finished, the result of an experiment.
 """
 
 import os
@@ -15,16 +20,25 @@ import time
 from typing import List
 from pathlib import Path
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from fastapi.responses import JSONResponse
 
+from backend.app.models.experiment_models import UBnormalExperimentRequest, UBnormalSweepRequest, DistributedExperimentRequest
 from backend.app.services.ubnormal_experiment_service import (
     load_analyzed_filenames_with_objects_and_anomalies_from_annotations,
-    evaluate_results as evaluate_results_ubnormal,
-    get_activities_for_scene
+    evaluate_results as evaluate_results_ubnormal
 )
 from backend.app.services.experiment_service import run_full_analysis
+from backend.app.services.experiment_scheduler_service import (
+    build_experiment_tasks,
+    experiment_checkpoint_path,
+    run_videos_concurrently
+)
+from backend.app.services.distributed_experiment_service import enqueue_experiment, get_experiment_status
+from backend.app.core.threshold_sweep import run_sweep
+from backend.app.utils.executor_utils import run_in_pipeline_executor
 
 router = APIRouter()
 
@@ -33,36 +47,44 @@ router = APIRouter()
 BASE_DIR = Path(__file__).resolve().parents[4]
 
 
-class UBnormalExperimentRequest(BaseModel):
-    dataset_path: str = "experiments/UBnormal"
-    model_path: str = "data/models/yolo11n.pt"
-    num_segments: int = 8
-    categories: List[str] = [
-        "a person wearing a helmet and an orange vest is walking",
-        "a person wearing a helmet and an orange vest is dancing",
-        "a person wearing a helmet and an orange vest is standing in place",
-        "a person wearing a helmet and an orange vest is jumping",
-        "a person wearing a helmet and an orange vest is running",
-        "a person wearing a helmet and an orange vest is fighting",
-        "a person wearing a helmet and an orange vest have something in hand",
-        "a person wearing a helmet and an orange vest is lying in the ground",
-        "a person wearing a helmet and an orange vest is limping",
-        "a person wearing a helmet and an orange vest fell to the ground",
-        "a person wearing a helmet and an orange vest is sitting",
-        "a person wearing a helmet and an orange vest is riding motocycle"
-    ]
-    threshold: int = 21
-    skip_frames: bool = True
-    num_of_skip_frames: int = 5
-    confidence_threshold: float = 0.25
-    top_k: int = 5
-    batch_size: int = 32
-    frame_sample_rate: int = 4
-    processing_mode: str = "sequential"
+@router.post("/experiments/ubnormal/run")
+async def run_experiment_pipeline(request: UBnormalExperimentRequest):
+    # The whole experiment is blocking and may take hours, run it on the pipeline executor
+    return await run_in_pipeline_executor(run_ubnormal_experiment, request)
+
+
+@router.post("/experiments/ubnormal/sweep")
+async def run_experiment_sweep(request: UBnormalSweepRequest):
+    # Only stored logits are re-interpreted, detection and XCLIP are not run again
+    return await run_in_pipeline_executor(
+        run_sweep,
+        str(BASE_DIR / request.dataset_path),
+        request.categories,
+        request.thresholds,
+        request.top_ks,
+        request.confidence_thresholds,
+        request.video_ids
+    )
 
 
-@router.post("/experiments/ubnormal/run")
-def run_experiment_pipeline(request: UBnormalExperimentRequest):
+@router.post("/experiments/distributed")
+async def enqueue_distributed_experiments(request: DistributedExperimentRequest):
+    experiment_ids = []
+    for index, payload in enumerate(request.payloads):
+        name = f"{request.name}#{index}" if request.name else None
+        experiment_ids.append(await run_in_threadpool(enqueue_experiment, payload, name, request.max_attempts))
+    return {"experiment_ids": experiment_ids}
+
+
+@router.get("/experiments/distributed/{experiment_id}")
+async def distributed_experiment_status(experiment_id: int):
+    experiment = await run_in_threadpool(get_experiment_status, experiment_id)
+    if experiment is None:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    return experiment
+
+
+def run_ubnormal_experiment(request: UBnormalExperimentRequest):
     start_time = time.time()
 
     dataset_path = str(BASE_DIR / request.dataset_path)
@@ -72,60 +94,24 @@ def run_experiment_pipeline(request: UBnormalExperimentRequest):
         dataset_path
     )
 
-    normal_video_analysis_results = []
-    abnormal_video_analysis_results = []
-
-    categories_for_scenes = get_activities_for_scene(scenes, request.categories)
-
-    # Optional: limit number of scenes to process (disabled by default)
-    # counter = 0
-    # scenes_to_process = 1
-
-    for scene_name, scene_data in scenes.items():
-        # if counter >= scenes_to_process:
-            # break
-
-        normals = scene_data["normal"]
-        for normal_entry in normals:
-            normal_full_analysis_response = run_full_analysis(
-                video_path=normal_entry["path"],
-                model_path=model_path,
-                num_segments=request.num_segments,
-                processing_mode=request.processing_mode,
-                classes_to_detect=[0],
-                name_of_analysis=f"{normal_entry['path']}_analysis",
-                categories=categories_for_scenes[scene_name],
-                threshold=request.threshold,
-                skip_frames=request.skip_frames,
-                num_of_skip_frames=request.num_of_skip_frames,
-                confidence_threshold=request.confidence_threshold,
-                top_k=request.top_k,
-                batch_size=request.batch_size,
-                frame_sample_rate=request.frame_sample_rate
-            )
-            normal_video_analysis_results.append(normal_full_analysis_response)
-
-        abnormals = scene_data["abnormal"]
-        for abnormal_entry in abnormals:
-            abnormal_full_analysis_response = run_full_analysis(
-                video_path=abnormal_entry["path"],
-                model_path=model_path,
-                num_segments=request.num_segments,
-                processing_mode=request.processing_mode,
-                classes_to_detect=[0],
-                name_of_analysis=f"{abnormal_entry['path']}_analysis",
-                categories=categories_for_scenes[scene_name],
-                threshold=request.threshold,
-                skip_frames=request.skip_frames,
-                num_of_skip_frames=request.num_of_skip_frames,
-                confidence_threshold=request.confidence_threshold,
-                top_k=request.top_k,
-                batch_size=request.batch_size,
-                frame_sample_rate=request.frame_sample_rate
-            )
-            abnormal_video_analysis_results.append(abnormal_full_analysis_response)
-
-        # counter += 1
+    tasks = build_experiment_tasks(request, scenes, model_path)
+
+    checkpoint_path = None
+    if request.resume:
+        checkpoint_path = experiment_checkpoint_path(
+            request.model_dump(exclude={"max_concurrent_videos", "cpu_budget", "resume"})
+        )
+
+    schedule = run_videos_concurrently(
+        tasks,
+        run_full_analysis,
+        max_concurrent_videos=request.max_concurrent_videos,
+        cpu_budget=request.cpu_budget,
+        checkpoint_path=checkpoint_path
+    )
+
+    normal_video_analysis_results = [record["response"] for record in schedule["records"] if record["label"] == "normal"]
+    abnormal_video_analysis_results = [record["response"] for record in schedule["records"] if record["label"] == "abnormal"]
 
     end_time = time.time()
     total_duration = round(end_time - start_time, 2)
@@ -135,6 +121,12 @@ def run_experiment_pipeline(request: UBnormalExperimentRequest):
         "normal_results": normal_video_analysis_results
     }
 
+    # Number of videos per pipeline stage that were served from the stage cache
+    cache_hits = {}
+    for video_result in normal_video_analysis_results + abnormal_video_analysis_results:
+        for stage, hit in video_result.get("cache_hits", {}).items():
+            cache_hits[stage] = cache_hits.get(stage, 0) + int(hit)
+
     tp, fp, fn, tn = evaluate_results_ubnormal(all_results, scenes, request.categories)
 
     precision = tp / (tp + fp) if (tp + fp) > 0 else 0
@@ -145,6 +137,8 @@ def run_experiment_pipeline(request: UBnormalExperimentRequest):
         # **all_results,
         "total_videos_analyzed": len(normal_video_analysis_results) + len(abnormal_video_analysis_results),
         "total_duration_seconds": total_duration,
+        "cache_hits": cache_hits,
+        "scheduling": {key: value for key, value in schedule.items() if key != "records"},
         "statistics": {
             "true_positives": tp,
             "false_positives": fp,
@@ -0,0 +1,61 @@
+"""
+metrics.py
+
+This API router exposes runtime metrics of the backend.
+
+Endpoints:
+- GET /metrics/cache: returns hit/miss counters and occupancy of the result cache.
+- GET /metrics/stage-cache: returns the number of entries and the size of the pipeline stage cache.
+- GET /metrics/stages/{video_id}: returns the recorded per-stage timing and resource usage of a video's analysis runs.
+- GET /metrics/profiles/{video_id}: lists the profiling artifacts of a video's profiled stages.
+- GET /metrics/profiles/artifacts/{artifact_id}: downloads a profiling artifact (cProfile dump, torch trace or summary).
+"""
+import os
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from backend.app.core.result_cache import result_cache
+from backend.app.core.stage_cache import stage_cache
+from backend.app.core.async_database_manager import get_async_db
+
+router = APIRouter()
+
+# Base directory = root of the project (assuming this script is in diploma-thesis-prototype/src/backend/app/api/)
+BASE_DIR = Path(__file__).resolve().parents[4]
+
+@router.get("/metrics/cache")
+async def cache_metrics():
+    return result_cache.stats()
+
+@router.get("/metrics/stage-cache")
+def stage_cache_metrics():
+    return stage_cache.stats()
+
+
+@router.get("/metrics/stages/{video_id}")
+async def stage_metrics(video_id: int):
+    db = await get_async_db()
+    rows = await db.fetch_stage_metrics(video_id)
+    runs = {}
+    for row in rows:
+        runs.setdefault(row["run_id"], []).append(row)
+    return {"video_id": video_id, "runs": [{"run_id": run_id, "stages": stages} for run_id, stages in runs.items()]}
+
+
+@router.get("/metrics/profiles/{video_id}")
+async def profile_artifacts(video_id: int):
+    db = await get_async_db()
+    return {"video_id": video_id, "artifacts": await db.fetch_profile_artifacts(video_id)}
+
+@router.get("/metrics/profiles/artifacts/{artifact_id}")
+async def download_profile_artifact(artifact_id: int):
+    db = await get_async_db()
+    artifact = await db.fetch_profile_artifact(artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Profile artifact not found")
+
+    path = BASE_DIR / artifact["path"]
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile artifact file was removed")
+    return FileResponse(path, filename=path.name)
@@ -6,32 +6,53 @@ This API router exposes endpoints related to the result interpretation phase of
 Endpoints:
 - POST /result-interpreter: triggers the result interpretation process for a given video.
 - GET /results/xclip-preprocessing: fetches metadata of analyzed videos from the database.
+- GET /results/videos: streams one keyset-paginated page of analyzed videos (newest first),
+  optionally filtered by date range, configuration, anomaly label or presence of anomalies.
 - DELETE /results/xclip-preprocessing/{video_id}: deletes all data related to the specified video.
 """
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-from backend.app.core.database_manager import DatabaseManager
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from backend.app.models.result_models import ResultInterpreterRequest
-from backend.app.services.result_interpreter_service import run_result_interpreter, get_results_from_xclip_preprocessing, delete_video_analysis
+from backend.app.services.result_interpreter_service import (
+    run_result_interpreter,
+    get_results_from_xclip_preprocessing,
+    stream_analyzed_videos_page,
+    delete_video_analysis
+)
+from backend.app.utils.executor_utils import run_in_pipeline_executor
 
 router = APIRouter()
 
 @router.post("/result-interpreter")
-def result_interpreter(request: ResultInterpreterRequest):
-    return run_result_interpreter(request)
+async def result_interpreter(request: ResultInterpreterRequest):
+    return await run_in_pipeline_executor(run_result_interpreter, request)
 
 @router.get("/results/xclip-preprocessing")
-def xclip_preprocessing():
+async def xclip_preprocessing():
     try:
-        db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    
-        db_manager.connect()
-        db_manager.create_tables()
-        results = get_results_from_xclip_preprocessing()
+        results = await get_results_from_xclip_preprocessing()
         return results
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
     
+@router.get("/results/videos")
+async def list_analyzed_videos(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    config_id: Optional[int] = None,
+    has_anomalies: Optional[bool] = None,
+    label: Optional[str] = None
+):
+    try:
+        page = stream_analyzed_videos_page(limit, cursor, date_from, date_to, config_id, has_anomalies, label)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(page, media_type="application/json")
+
 @router.delete("/results/xclip-preprocessing/{video_id}")
 def delete_xclip_result(video_id: int):
     try:
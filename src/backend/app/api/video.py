@@ -6,21 +6,39 @@ This API router handles video-related endpoints for the prototype backend.
 Endpoints:
 - GET /video/{video_id}: retrieves metadata for a specific video.
 - POST /video/visualization: triggers the visualization of detected anomalies.
-- POST /video/upload: uploads a video file to the server.
+- POST /video/overlay: exports boxes, anomalies and thumbnails of a video for client-side rendering.
+- GET /video/{video_id}/overlay/{file_name}: downloads a file of the exported overlay.
+- GET /video/{video_id}/stream?source=original|visualization: streams the original or the rendered video (HTTP Range).
+- GET /video/detections/{detection_id}/stream: streams the crop file of a detection (HTTP Range).
+- GET /video/detections/{detection_id}/clip: streams the frames of a detection cut from the original video (HTTP Range).
+- POST /video/upload: uploads a video file to the server (stored once per content).
+- POST /video/upload/sessions: starts a resumable chunked upload.
+- PUT /video/upload/sessions/{upload_id}?offset=N: appends the request body to the upload at byte offset N.
+- GET /video/upload/sessions/{upload_id}: returns the received bytes of an upload (where to resume).
+- POST /video/upload/sessions/{upload_id}/complete: verifies the upload and stores the video.
 """
 from fastapi import APIRouter, HTTPException
-from backend.app.models.video_models import VideoVisualizationRequest
-from backend.app.services.video_service import run_video_visualization, save_uploaded_video, get_video_data
+from backend.app.models.video_models import VideoVisualizationRequest, VideoOverlayRequest, VideoUploadInitRequest
+from backend.app.services.video_service import (
+    run_video_visualization, run_overlay_export, get_overlay_file_path, save_uploaded_video, get_video_data,
+    start_chunked_upload, upload_chunk, get_upload_status, complete_chunked_upload,
+    get_video_stream_path, get_detection_crop_path, get_detection_clip_path
+)
+from backend.app.core.upload_store import UploadOffsetMismatch
+from backend.app.utils.executor_utils import run_in_pipeline_executor
+from backend.app.utils.file_utils import file_stream_response
 
-from fastapi import APIRouter, UploadFile, File
-from fastapi.responses import JSONResponse
+from typing import Literal
+from fastapi import APIRouter, UploadFile, File, Request
+from fastapi.responses import JSONResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter()
 
 @router.get("/video/{video_id}")
 async def fetch_video_data(video_id: int):
     try:
-        video_data = get_video_data(video_id)
+        video_data = await get_video_data(video_id)
         if not video_data:
             raise HTTPException(status_code=404, detail="Video not found")
         return video_data
@@ -30,16 +48,85 @@ async def fetch_video_data(video_id: int):
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 @router.post("/video/visualization")
-def video_visualization(request: VideoVisualizationRequest):
-    return run_video_visualization(request)
+async def video_visualization(request: VideoVisualizationRequest):
+    return await run_in_pipeline_executor(run_video_visualization, request)
+
+@router.post("/video/overlay")
+async def video_overlay(request: VideoOverlayRequest):
+    return await run_in_pipeline_executor(run_overlay_export, request)
+
+@router.get("/video/{video_id}/overlay/{file_name}")
+def fetch_overlay_file(video_id: int, file_name: str):
+    path = get_overlay_file_path(video_id, file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Overlay file not found")
+    media_type = "text/vtt" if file_name.endswith(".vtt") else None
+    return FileResponse(path, media_type=media_type, filename=file_name)
+
+@router.api_route("/video/{video_id}/stream", methods=["GET", "HEAD"])
+async def stream_video(video_id: int, request: Request, source: Literal["original", "visualization"] = "original"):
+    path = await get_video_stream_path(video_id, source)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Video file not found")
+    # The visualization is rendered again on request, the original never changes
+    cache_control = "public, max-age=86400" if source == "original" else "no-cache"
+    return await file_stream_response(request, path, cache_control)
+
+@router.api_route("/video/detections/{detection_id}/stream", methods=["GET", "HEAD"])
+async def stream_detection_crop(detection_id: int, request: Request):
+    path = await get_detection_crop_path(detection_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Detection video not found")
+    return await file_stream_response(request, path)
+
+@router.api_route("/video/detections/{detection_id}/clip", methods=["GET", "HEAD"])
+async def stream_detection_clip(detection_id: int, request: Request):
+    path = await get_detection_clip_path(detection_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Detection or its video not found")
+    return await file_stream_response(request, path)
 
 @router.post("/video/upload")
 async def upload_video(video: UploadFile = File(...)):
     try:
-        video_path, video_filename = save_uploaded_video(video)
-        return JSONResponse(status_code=200, content={
-            "video_path": video_path,
-            "video_filename": video_filename
-        })
+        # Copying the upload is blocking file I/O, keep it off the event loop
+        stored = await run_in_threadpool(save_uploaded_video, video)
+        return JSONResponse(status_code=200, content=stored)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@router.post("/video/upload/sessions")
+def create_upload_session(request: VideoUploadInitRequest):
+    return start_chunked_upload(request)
+
+@router.put("/video/upload/sessions/{upload_id}")
+async def put_upload_chunk(upload_id: str, offset: int, request: Request):
+    try:
+        session = await upload_chunk(upload_id, offset, request.stream())
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadOffsetMismatch as e:
+        return JSONResponse(status_code=409, content={"error": str(e), "received": e.expected_offset},
+                            headers={"Upload-Offset": str(e.expected_offset)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(status_code=200, content=session, headers={"Upload-Offset": str(session["received"])})
+
+@router.get("/video/upload/sessions/{upload_id}")
+def fetch_upload_status(upload_id: str):
+    try:
+        session = get_upload_status(upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return JSONResponse(status_code=200, content=session, headers={"Upload-Offset": str(session["received"])})
+
+@router.post("/video/upload/sessions/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    try:
+        return await complete_chunked_upload(upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -8,28 +8,34 @@ Main Functions:
 - main: orchestrates the full recognition workflow using multiprocessing (or sequential mode).
 - fetch_video_segments: retrieves video segments tied to object detections.
 - analyze_video_task: processes a single video segment using the XCLIP handler.
-- save_results_to_db: stores recognition results in the database.
+- save_results_to_db: stores recognition results of all detections as one logits matrix of the video.
 """
 from backend.app.core.xclip_handler import XCLIPHandler
 import time
 import argparse
 import json
 from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.logits_store import save_video_logits, logits_matrix_path, BASE_DIR
+from backend.app.core.instrumentation import StageRecorder
+from backend.app.core.profiling import StageProfiler, init_profiling_worker, torch_trace, worker_profile_block, worker_profile_dir
 from multiprocessing import Pool
 import os
 import torch
 class DetectionInterruptedError(Exception):
     pass
 
-def save_results_to_db(results, video_id, db_manager: DatabaseManager):
+def save_results_to_db(results, video_id, list_of_categories, db_manager: DatabaseManager):
     try:
         db_manager.connect()
-        for detection_id, logits_per_video in results:
+        detection_ids = []
+        logits_rows = []
+        for detection_id, logits_per_video, _ in results:
             if logits_per_video is None:
                 print(f"⚠️  Skipping detection {detection_id} due to previous error.")
                 continue
-            logits_binary = logits_per_video.numpy().tobytes()
-            db_manager.insert_anomaly_recognition_data(video_id, detection_id, logits_binary)
+            detection_ids.append(detection_id)
+            logits_rows.append(logits_per_video.numpy())
+        save_video_logits(db_manager, video_id, detection_ids, logits_rows, list_of_categories)
     except Exception as e:
         print(f"Database error: {e}")
     finally:
@@ -49,61 +55,78 @@ def fetch_video_segments(video_id, db_manager: DatabaseManager):
 def analyze_video_task(args):
     try:
         video_path, list_of_categories, detection_id, batch_size, frame_sample_rate = args
-        handler = XCLIPHandler(list_of_categories)
-        result = handler.analyze_video(video_path, batch_size=batch_size, frame_sample_rate=frame_sample_rate)
-        return (detection_id, result)
+        with worker_profile_block(f"xclip_{detection_id}"):
+            handler = XCLIPHandler(list_of_categories)
+            with torch_trace(worker_profile_dir(), f"xclip_{detection_id}"):
+                result = handler.analyze_video(video_path, batch_size=batch_size, frame_sample_rate=frame_sample_rate)
+        return (detection_id, result, handler.frames_decoded)
     except Exception as e:
         print(f"❌ Error in detection {detection_id}: {e}")
-        return (detection_id, None)
+        return (detection_id, None, 0)
 
-def main(video_id, categories_json, batch_size = 32, frame_sample_rate = 4, processing_mode = "parallel"):
+def main(video_id, categories_json, batch_size = 32, frame_sample_rate = 4, processing_mode = "parallel", num_processes = None, profile = False):
     print(f"The XCLIP - Action Recognition program has started.")
 
     db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    
-    start_time = time.time()
 
-    # Load categories from the provided JSON file
-    # with open(categories_json, 'r') as f:
-    #     list_of_categories = json.load(f)
-    list_of_categories = categories_json
+    with StageRecorder("anomaly_recognition", video_id) as recorder, StageProfiler(recorder, profile) as profiler:
+        recorder.track_db(db_manager)
+        recorder.detail(processing_mode=processing_mode, batch_size=batch_size, frame_sample_rate=frame_sample_rate)
+        
+        start_time = time.time()
 
-    # Initialize XCLIP handler
-    handler = XCLIPHandler(list_of_categories)
-    
-    # Analyze video and get results
-    results = []
-    videos = fetch_video_segments(video_id, db_manager)
-
-    if not videos:
-        print("⚠️  No video segments found for this video_id. Skipping analysis.")
-        return
-
-    os.environ["TOKENIZERS_PARALLELISM"] = "false"
-
-    if processing_mode == "parallel":
-        num_processes = os.cpu_count()
-        try:
-            with Pool(processes=min(len(videos), num_processes)) as pool:
-                results = pool.map(analyze_video_task, [(video_path, list_of_categories, detection_id, batch_size, frame_sample_rate) for video_path, detection_id in videos])
-        except KeyboardInterrupt:
-            print("⚠️  Analyzing was interrupted. Terminating threads...")
-            pool.terminate()
-            raise DetectionInterruptedError("The analyzing was manually interrupted.")
-        finally:
-            print("All threads have been terminated.")
-    else: 
-        for video_path, detection_id in videos:
-            res = analyze_video_task((video_path, list_of_categories, detection_id, batch_size, frame_sample_rate))
-            if res:
-                results.append(res)
-    
-    save_results_to_db(results, video_id, db_manager)
-    
-    end_time = time.time()
-    elapsed_time = end_time - start_time
+        # Load categories from the provided JSON file
+        # with open(categories_json, 'r') as f:
+        #     list_of_categories = json.load(f)
+        list_of_categories = categories_json
 
-    print(f"Program finished. It took {elapsed_time:.2f} seconds.")
+        # Initialize XCLIP handler
+        handler = XCLIPHandler(list_of_categories)
+        
+        # Analyze video and get results
+        results = []
+        videos = fetch_video_segments(video_id, db_manager)
+
+        if not videos:
+            print("⚠️  No video segments found for this video_id. Skipping analysis.")
+            return
+
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+        if processing_mode == "parallel":
+            # Callers sharing the host (e.g. the experiment scheduler) pass their share of the CPU budget
+            num_processes = num_processes or os.cpu_count()
+            try:
+                with Pool(processes=min(len(videos), num_processes), initializer=init_profiling_worker, initargs=(profiler.directory,)) as pool:
+                    results = pool.map(analyze_video_task, [(video_path, list_of_categories, detection_id, batch_size, frame_sample_rate) for video_path, detection_id in videos])
+            except KeyboardInterrupt:
+                print("⚠️  Analyzing was interrupted. Terminating threads...")
+                pool.terminate()
+                raise DetectionInterruptedError("The analyzing was manually interrupted.")
+            finally:
+                print("All threads have been terminated.")
+        else: 
+            for video_path, detection_id in videos:
+                # The stage profile covers this thread, only the model calls are traced separately
+                with torch_trace(profiler.directory, f"xclip_{detection_id}"):
+                    res = analyze_video_task((video_path, list_of_categories, detection_id, batch_size, frame_sample_rate))
+                if res:
+                    results.append(res)
+        
+        save_results_to_db(results, video_id, list_of_categories, db_manager)
+
+        logits_path = BASE_DIR / logits_matrix_path(video_id)
+        recorder.add(
+            frames_decoded=sum(frames_decoded for _, _, frames_decoded in results),
+            model_invocations=sum(1 for _, logits_per_video, _ in results if logits_per_video is not None),
+            bytes_written=logits_path.stat().st_size if logits_path.exists() else 0
+        )
+        recorder.detail(segments=len(videos))
+        
+        end_time = time.time()
+        elapsed_time = end_time - start_time
+
+        print(f"Program finished. It took {elapsed_time:.2f} seconds.")
 
 
 if __name__ == "__main__":
@@ -111,7 +134,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run XCLIP Action Recognition")
     parser.add_argument('--video_id', required=True, type=int, help="ID of video source in database")
     parser.add_argument('--categories_json', required=True, type=str, help="Path to the JSON file containing categories")
+    parser.add_argument('--profile', action="store_true", help="Store cProfile and torch profiler artifacts of the run")
     
     args = parser.parse_args()
 
-    main(args.video_id, args.categories_json)
\ No newline at end of file
+    main(args.video_id, args.categories_json, profile=args.profile)
\ No newline at end of file
@@ -1,6 +1,10 @@
 import os
 import cv2
 from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.instrumentation import StageRecorder
+from backend.app.core.profiling import StageProfiler, init_profiling_worker, worker_profile_block
+from backend.app.core.video_writer import CROP_VIDEO_PROFILE, open_video_writer, profile_extension
+from backend.app.core.video_processor import open_video_at
 import argparse
 import time
 from multiprocessing import Pool
@@ -24,8 +28,9 @@ from typing import Dict, List, Tuple
 class DetectionInterruptedError(Exception):
     pass
 
-def init_worker():
+def init_worker(profile_dir=None):
     signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_profiling_worker(profile_dir)
 
 def create_bb_map(bounding_boxes): 
     bb_map = {}
@@ -67,10 +72,15 @@ def fetch_detections_and_bounding_boxes(video_id, db_manager):
     return detections, all_bounding_boxes
 
 def crop_video_for_detection(args):
+    with worker_profile_block(f"crop_{args[1]['id']}"):
+        return _crop_video_for_detection(args)
+
+def _crop_video_for_detection(args):
     try:
-        input_video_path, detection, max_bb, output_dir, video_id, offset_x, offset_y, size_threshold = args
-        cap = cv2.VideoCapture(input_video_path)
-        output_video_path = os.path.join(output_dir, f"{video_id}_{detection['id']}.mp4")
+        input_video_path, detection, max_bb, output_dir, video_id, offset_x, offset_y, size_threshold, keyframes = args
+        # Positioned on the first frame of the detection
+        cap = open_video_at(input_video_path, detection['start_frame'], keyframes)
+        output_video_path = os.path.join(output_dir, f"{video_id}_{detection['id']}.{profile_extension(CROP_VIDEO_PROFILE)}")
         
         init_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) 
         init_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -86,18 +96,18 @@ def crop_video_for_detection(args):
         width = abs(x2-x1)
         height = abs(y2-y1)
             
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
+        out = open_video_writer(output_video_path, fps, (width, height), CROP_VIDEO_PROFILE)
 
         detection_start_frame = detection['start_frame']
         detection_end_frame = detection['end_frame']
 
-        cap.set(cv2.CAP_PROP_POS_FRAMES, detection_start_frame)
+        frames_decoded = 0
         
         for frame_idx in range(detection_start_frame, detection_end_frame + 1):
             ret, frame = cap.read()
             if not ret:
                 break 
+            frames_decoded += 1
             
             cropped_frame = frame[y1:y2, x1:x2]
             
@@ -105,11 +115,13 @@ def crop_video_for_detection(args):
                 
         cap.release()
         out.release()
+        return {"frames_decoded": frames_decoded, "bytes_written": os.path.getsize(output_video_path)}
     except Exception as e:
         return f"❌ Error in detection {detection['id']}: {e}"
 
-def prepare_data_for_xclip(video_id, video_path, db_manager, output_dir, offset_x, offset_y, size_threshold, processing_mode = "parallel"):
+def prepare_data_for_xclip(video_id, video_path, db_manager, output_dir, offset_x, offset_y, size_threshold, processing_mode = "parallel", num_processes = None, profile_dir = None):
     detections, all_bounding_boxes = fetch_detections_and_bounding_boxes(video_id, db_manager)
+    keyframes = db_manager.fetch_video_keyframes(video_id)
 
     args_list = []
     for detection in detections:
@@ -121,12 +133,13 @@ def prepare_data_for_xclip(video_id, video_path, db_manager, output_dir, offset_
             print(f"No bounding boxes for detection {detection_id}. Skipping...")
             continue
         
-        args_list.append((video_path, detection, max_bb, output_dir, video_id, offset_x, offset_y, size_threshold))
+        args_list.append((video_path, detection, max_bb, output_dir, video_id, offset_x, offset_y, size_threshold, keyframes))
 
     if processing_mode == "parallel":
         try:
-            with Pool(initializer=init_worker) as pool:
-                pool.map(crop_video_for_detection, args_list)
+            # num_processes=None uses all cores
+            with Pool(processes=num_processes, initializer=init_worker, initargs=(profile_dir,)) as pool:
+                results = pool.map(crop_video_for_detection, args_list)
         except KeyboardInterrupt:
             print("\nDetection was interrupted. Terminating threads...")
             pool.terminate()
@@ -134,33 +147,45 @@ def prepare_data_for_xclip(video_id, video_path, db_manager, output_dir, offset_
         finally:
             print("All threads have been terminated.")
     else:
-        for args in args_list:
-            result = crop_video_for_detection(args)
-        
-def main(video_id, video_path, output_dir, offset_x, offset_y, size_threshold, processing_mode):
+        results = [crop_video_for_detection(args) for args in args_list]
+
+    # Per detection: frame and byte counts of the crop, or an error message
+    return results
+
+def main(video_id, video_path, output_dir, offset_x, offset_y, size_threshold, processing_mode, num_processes=None, profile=False):
     db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    db_manager.connect()
-    
-    start_time = time.time()
 
-    try:
-        print("The program for preparing data for XCLIP action recognition has started.")
+    with StageRecorder("anomaly_recognition_preprocessor", video_id) as recorder, StageProfiler(recorder, profile) as profiler:
+        recorder.track_db(db_manager)
+        db_manager.connect()
+        
+        start_time = time.time()
 
-        prepare_data_for_xclip(video_id, video_path, db_manager, output_dir, offset_x, offset_y, size_threshold, processing_mode)
+        try:
+            print("The program for preparing data for XCLIP action recognition has started.")
 
-    except DetectionInterruptedError as e:
-        print("\nThe detection was manually interrupted. Shutting down the program.")
-    except KeyboardInterrupt:
-        print("\nThe detection was manually interrupted. Shutting down the program.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-    finally:
-        end_time = time.time()
-        elapsed_time = end_time - start_time
+            results = prepare_data_for_xclip(video_id, video_path, db_manager, output_dir, offset_x, offset_y, size_threshold, processing_mode, num_processes, profiler.directory)
+
+            crops = [result for result in results if isinstance(result, dict)]
+            recorder.add(
+                frames_decoded=sum(crop["frames_decoded"] for crop in crops),
+                bytes_written=sum(crop["bytes_written"] for crop in crops)
+            )
+            recorder.detail(processing_mode=processing_mode, crops=len(crops), failed_crops=len(results) - len(crops))
+
+        except DetectionInterruptedError as e:
+            print("\nThe detection was manually interrupted. Shutting down the program.")
+        except KeyboardInterrupt:
+            print("\nThe detection was manually interrupted. Shutting down the program.")
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}")
+        finally:
+            end_time = time.time()
+            elapsed_time = end_time - start_time
 
-        print(f"Program finished. It took {elapsed_time:.2f} seconds.")
+            print(f"Program finished. It took {elapsed_time:.2f} seconds.")
 
-        db_manager.close()
+            db_manager.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Prepare video data for analysis.")
@@ -0,0 +1,351 @@
+"""
+async_database_manager.py
+
+Asyncio-native counterpart of `DatabaseManager` built on asyncpg. It serves the read-only
+queries used by the API endpoints, so that they can be awaited on the event loop instead of
+blocking it. Writes and schema management stay in the psycopg2-based `DatabaseManager`,
+which is used by the (blocking) processing pipeline.
+
+Functions:
+- get_async_db: returns the shared, lazily connected `AsyncDatabaseManager` instance.
+- close_async_db: closes the shared connection pool (called on application shutdown).
+- get_async_db_pool_stats: returns the size, idle and maximum connections of the shared pool.
+"""
+
+import asyncio
+import json
+
+import asyncpg
+
+
+class AsyncDatabaseManager:
+    def __init__(self, db_name, user, password, host='localhost', port='5432'):
+        self.db_name = db_name
+        self.user = user
+        self.password = password
+        self.host = host
+        self.port = port
+        self.pool = None
+        self.min_connection_pool = 1
+        self.max_connection_pool = 20
+
+    async def connect(self):
+        """Initialize the asyncpg connection pool. The database must already exist."""
+        if self.pool is not None:
+            return
+
+        self.pool = await asyncpg.create_pool(
+            database=self.db_name,
+            user=self.user,
+            password=self.password,
+            host=self.host,
+            port=int(self.port),
+            min_size=self.min_connection_pool,
+            max_size=self.max_connection_pool,
+            init=self._init_connection
+        )
+        print(f"Connected to database '{self.db_name}' (async pool) successfully.")
+
+    @staticmethod
+    async def _init_connection(conn):
+        # Decode JSON/JSONB columns into Python objects, the same way psycopg2 does
+        await conn.set_type_codec('jsonb', encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+        await conn.set_type_codec('json', encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def fetch_video_by_id(self, video_id: int):
+        query = """
+            SELECT id, video_path, video_filename, duration, fps, date_processed, name_of_analysis
+            FROM videos
+            WHERE id = $1;
+        """
+        row = await self.pool.fetchrow(query, video_id)
+
+        if row:
+            return {
+                'id': row['id'],
+                'video_path': row['video_path'],
+                'video_filename': row['video_filename'],
+                'duration': row['duration'],
+                'fps': row['fps'],
+                'date_processed': row['date_processed'],
+                'name_of_analysis': row['name_of_analysis'],
+            }
+        return None
+
+    async def fetch_detections_by_video_id(self, video_id: int):
+        # Detections and their anomalies are loaded in one round-trip instead of one query per detection
+        query = """
+            SELECT
+                d.id, d.video_id, d.start_frame, d.end_frame, d.class_id, d.confidence, d.track_id,
+                d.video_object_detection_path, da.anomaly_label, da.anomaly_score
+            FROM detections d
+            LEFT JOIN detection_anomalies da ON da.detection_id = d.id
+            WHERE d.video_id = $1
+            ORDER BY d.id, da.anomaly_score DESC;
+        """
+        rows = await self.pool.fetch(query, video_id)
+
+        detection_map = {}
+        for row in rows:
+            detection_id = row['id']
+            if detection_id not in detection_map:
+                detection_map[detection_id] = {
+                    'id': detection_id,
+                    'video_id': row['video_id'],
+                    'start_frame': row['start_frame'],
+                    'end_frame': row['end_frame'],
+                    'class_id': row['class_id'],
+                    'confidence': row['confidence'],
+                    'track_id': row['track_id'],
+                    'video_object_detection_path': row['video_object_detection_path'],
+                    'anomalies': []
+                }
+
+            if row['anomaly_label'] is not None:
+                detection_map[detection_id]['anomalies'].append({
+                    "label": row['anomaly_label'],
+                    "score": row['anomaly_score']
+                })
+
+        return list(detection_map.values())
+
+    # The linked configurations are aggregated per video in the same query instead of being fetched per video,
+    # so every video is one row (and LIMIT and the keyset cursor count videos)
+    VIDEO_CONFIGS_JOIN = """
+        LEFT JOIN LATERAL (
+            SELECT json_agg(
+                json_build_object('id', ac.id, 'name', ac.name, 'categories', ac.categories,
+                                  'settings', ac.settings, 'created_at', ac.created_at)
+                ORDER BY ac.id DESC
+            ) AS configs
+            FROM analysis_configurations_link acl
+            JOIN analysis_configurations ac ON ac.id = acl.config_id
+            WHERE acl.video_id = v.id
+        ) c ON TRUE
+    """
+
+    async def fetch_videos(self):
+        query = f"""
+            SELECT v.id, v.video_path, v.video_filename, v.duration, v.fps, v.date_processed, v.name_of_analysis, c.configs
+            FROM videos v
+            {self.VIDEO_CONFIGS_JOIN};
+        """
+        rows = await self.pool.fetch(query)
+
+        videos = [self._video_from_row(row) for row in rows]
+        return videos if videos else None
+
+    async def fetch_all_analysis_configurations(self):
+        query = """
+            SELECT id, name, categories, settings, created_at
+            FROM analysis_configurations
+            ORDER BY created_at DESC;
+        """
+        rows = await self.pool.fetch(query)
+
+        return [
+            {
+                "id": row['id'],
+                "name": row['name'],
+                "categories": row['categories'],
+                "settings": row['settings'],
+                "created_at": row['created_at']
+            }
+            for row in rows
+        ]
+
+    async def fetch_analysis_configuration_by_id(self, config_id: int):
+        query = """
+            SELECT id, name, categories, settings, created_at
+            FROM analysis_configurations
+            WHERE id = $1;
+        """
+        row = await self.pool.fetchrow(query, config_id)
+
+        if row:
+            return {
+                "id": row['id'],
+                "name": row['name'],
+                "categories": row['categories'],
+                "settings": row['settings'],
+                "created_at": row['created_at']
+            }
+        return None
+
+    async def iter_videos_page(self, limit: int, after=None, date_from=None, date_to=None, config_id=None,
+                               has_anomalies=None, label=None):
+        """Streams one keyset page of videos ordered by (date_processed, id) descending.
+
+        `after` is the (date_processed, id) pair of the last video of the previous page.
+        """
+        args = []
+
+        def arg(value):
+            args.append(value)
+            return f"${len(args)}"
+
+        conditions = []
+        if after is not None:
+            conditions.append(f"(v.date_processed, v.id) < ({arg(after[0])}, {arg(after[1])})")
+        if date_from is not None:
+            conditions.append(f"v.date_processed >= {arg(date_from)}")
+        if date_to is not None:
+            conditions.append(f"v.date_processed <= {arg(date_to)}")
+        if config_id is not None:
+            conditions.append(f"EXISTS (SELECT 1 FROM analysis_configurations_link l WHERE l.video_id = v.id AND l.config_id = {arg(config_id)})")
+        if has_anomalies is not None:
+            conditions.append(f"""{'' if has_anomalies else 'NOT '}EXISTS (
+                SELECT 1 FROM detections d
+                JOIN detection_anomalies da ON da.detection_id = d.id
+                WHERE d.video_id = v.id
+            )""")
+        if label is not None:
+            conditions.append(f"""EXISTS (
+                SELECT 1 FROM detections d
+                JOIN detection_anomalies da ON da.detection_id = d.id
+                WHERE d.video_id = v.id AND da.anomaly_label = {arg(label)}
+            )""")
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT v.id, v.video_path, v.video_filename, v.duration, v.fps, v.date_processed, v.name_of_analysis, c.configs
+            FROM videos v
+            {self.VIDEO_CONFIGS_JOIN}
+            {where}
+            ORDER BY v.date_processed DESC, v.id DESC
+            LIMIT {arg(limit)};
+        """
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(query, *args):
+                    yield self._video_from_row(row)
+
+    async def iter_detections_page(self, video_id: int, limit: int, after_id=None, min_confidence=None,
+                                   label=None, has_anomalies=None):
+        """Streams one keyset page of detections of a video ordered by id, each with its anomalies."""
+        args = [video_id]
+
+        def arg(value):
+            args.append(value)
+            return f"${len(args)}"
+
+        conditions = ["d.video_id = $1"]
+        if after_id is not None:
+            conditions.append(f"d.id > {arg(after_id)}")
+        if min_confidence is not None:
+            conditions.append(f"d.confidence >= {arg(min_confidence)}")
+        if label is not None:
+            conditions.append(f"EXISTS (SELECT 1 FROM detection_anomalies f WHERE f.detection_id = d.id AND f.anomaly_label = {arg(label)})")
+        if has_anomalies is not None:
+            conditions.append(f"{'' if has_anomalies else 'NOT '}EXISTS (SELECT 1 FROM detection_anomalies f WHERE f.detection_id = d.id)")
+
+        query = f"""
+            SELECT
+                d.id, d.video_id, d.start_frame, d.end_frame, d.class_id, d.confidence, d.track_id,
+                d.video_object_detection_path, COALESCE(a.anomalies, '[]'::json) AS anomalies
+            FROM detections d
+            LEFT JOIN LATERAL (
+                SELECT json_agg(
+                    json_build_object('label', da.anomaly_label, 'score', da.anomaly_score)
+                    ORDER BY da.anomaly_score DESC
+                ) AS anomalies
+                FROM detection_anomalies da
+                WHERE da.detection_id = d.id
+            ) a ON TRUE
+            WHERE {' AND '.join(conditions)}
+            ORDER BY d.id
+            LIMIT {arg(limit)};
+        """
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(query, *args):
+                    yield {
+                        'id': row['id'],
+                        'video_id': row['video_id'],
+                        'start_frame': row['start_frame'],
+                        'end_frame': row['end_frame'],
+                        'class_id': row['class_id'],
+                        'confidence': row['confidence'],
+                        'track_id': row['track_id'],
+                        'video_object_detection_path': row['video_object_detection_path'],
+                        'anomalies': row['anomalies']
+                    }
+
+    async def fetch_stage_metrics(self, video_id: int):
+        query = """
+            SELECT id, run_id, stage, status, wall_seconds, cpu_seconds, peak_rss_bytes,
+                   frames_decoded, model_invocations, db_round_trips, bytes_written, details, timestamp
+            FROM stage_metrics
+            WHERE video_id = $1
+            ORDER BY id;
+        """
+        rows = await self.pool.fetch(query, video_id)
+        return [dict(row) for row in rows]
+
+    async def fetch_profile_artifacts(self, video_id: int):
+        query = """
+            SELECT id, run_id, stage, kind, path, size_bytes, timestamp
+            FROM profile_artifacts
+            WHERE video_id = $1
+            ORDER BY id;
+        """
+        rows = await self.pool.fetch(query, video_id)
+        return [dict(row) for row in rows]
+
+    async def fetch_profile_artifact(self, artifact_id: int):
+        row = await self.pool.fetchrow("SELECT id, kind, path FROM profile_artifacts WHERE id = $1;", artifact_id)
+        return dict(row) if row else None
+
+    async def fetch_detection_media(self, detection_id: int):
+        # Frame range and file paths needed to stream a detection (its crop or a clip of the original video)
+        query = """
+            SELECT d.id, d.video_id, d.start_frame, d.end_frame, d.video_object_detection_path, v.video_path, v.fps
+            FROM detections d
+            JOIN videos v ON v.id = d.video_id
+            WHERE d.id = $1;
+        """
+        row = await self.pool.fetchrow(query, detection_id)
+        return dict(row) if row else None
+
+    @staticmethod
+    def _video_from_row(row):
+        configs = row['configs'] or []
+        return {
+            'id': row['id'],
+            'video_path': row['video_path'],
+            'video_filename': row['video_filename'],
+            'duration': row['duration'],
+            'fps': row['fps'],
+            'date_processed': row['date_processed'],
+            'name_of_analysis': row['name_of_analysis'],
+            # The latest linked configuration, all of them in `configs`
+            'config': configs[0] if configs else None,
+            'configs': configs
+        }
+
+
+_async_db = AsyncDatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
+_connect_lock = asyncio.Lock()
+
+async def get_async_db() -> AsyncDatabaseManager:
+    # The pool is created on first use and then shared by all requests of this worker
+    if _async_db.pool is None:
+        async with _connect_lock:
+            await _async_db.connect()
+    return _async_db
+
+async def close_async_db():
+    await _async_db.close()
+
+def get_async_db_pool_stats():
+    pool = _async_db.pool
+    if pool is None:
+        return {"size": 0, "idle": 0, "max": _async_db.max_connection_pool}
+    return {"size": pool.get_size(), "idle": pool.get_idle_size(), "max": pool.get_max_size()}
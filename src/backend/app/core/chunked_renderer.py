@@ -0,0 +1,125 @@
+"""
+chunked_renderer.py
+
+Renders a video in parallel: the frames are split into contiguous ranges, every range is decoded,
+drawn and encoded (see video_writer.py) into its own chunk file by a worker process, and the chunks are joined with the
+ffmpeg concat demuxer (`-c copy`), so the result is not encoded a second time.
+
+Every chunk is a complete stream that starts with a keyframe, which is what the concat demuxer needs
+to join them without re-encoding; the ranges themselves can start at any frame because the workers
+seek in the input (OpenCV decodes from the preceding keyframe up to the requested frame).
+
+The drawing is done by a module-level function `draw(frame, frame_id, *draw_args)` that changes
+the frame in place, so it can be sent to the worker processes.
+
+Functions:
+- split_frame_ranges: splits the frames into contiguous (start, end) ranges, aligned to the frame step.
+- render_chunk: renders one range of frames into a chunk file (runs in a worker process).
+- concat_chunks: joins the chunk files into the output without re-encoding.
+- render_video_in_chunks: renders the whole video with a process pool and returns the number of frames read.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+from multiprocessing import Pool
+
+import cv2
+
+from backend.app.core.video_writer import open_video_writer, profile_extension
+
+# Shorter chunks do not pay off the seek and the process start
+MIN_CHUNK_SECONDS = 2.0
+
+def split_frame_ranges(num_frames, num_chunks, frame_step=1, min_chunk_frames=1) -> list:
+    """Splits [0, num_frames) into at most `num_chunks` ranges that start at multiples of `frame_step`."""
+    if num_frames <= 0:
+        return []
+    chunk_size = max(min_chunk_frames, -(-num_frames // max(1, num_chunks)))
+    # Every chunk starts on a written frame, so the skipping pattern stays the same as in one pass
+    chunk_size = -(-chunk_size // frame_step) * frame_step
+    return [(start, min(start + chunk_size, num_frames)) for start in range(0, num_frames, chunk_size)]
+
+def render_chunk(video_path, start, end, chunk_path, draw, draw_args=(), frame_step=1, profile="browser", threads=0) -> int:
+    """Draws and writes every `frame_step`-th frame of [start, end). Returns the number of frames read."""
+    cap = cv2.VideoCapture(video_path)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    out = open_video_writer(chunk_path, fps / frame_step, (width, height), profile, threads)
+
+    frames = 0
+    for frame_id in range(start, end):
+        if (frame_id - start) % frame_step != 0:
+            if not cap.grab():
+                break
+            frames += 1
+            continue
+
+        ret, frame = cap.read()
+        if not ret:
+            break
+        draw(frame, frame_id, *draw_args)
+        out.write(frame)
+        frames += 1
+
+    cap.release()
+    out.release()
+    return frames
+
+def concat_chunks(chunk_paths, output_path):
+    """Joins the chunks (same codec and parameters) into `output_path` with the ffmpeg concat demuxer."""
+    # imageio-ffmpeg ships a static ffmpeg binary (it is installed with moviepy)
+    import imageio_ffmpeg
+
+    list_path = f"{output_path}.chunks.txt"
+    with open(list_path, "w") as file:
+        for chunk_path in chunk_paths:
+            escaped = os.path.abspath(chunk_path).replace("'", "'\\''")
+            file.write(f"file '{escaped}'\n")
+
+    try:
+        subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", list_path, "-c", "copy", "-movflags", "+faststart", output_path],
+            check=True
+        )
+    finally:
+        os.remove(list_path)
+
+def render_video_in_chunks(video_path, output_path, draw, draw_args=(), num_processes=None, frame_step=1, profile="browser") -> int:
+    """Renders the video into `output_path` with `num_processes` workers (None = all cores). Returns the number of frames read.
+
+    `profile` is a video profile of video_writer.py, except "npy" (the chunks of an array cannot be concatenated).
+    """
+    cap = cv2.VideoCapture(video_path)
+    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    cap.release()
+
+    num_processes = num_processes or os.cpu_count()
+    ranges = split_frame_ranges(num_frames, num_processes, frame_step, int(MIN_CHUNK_SECONDS * fps))
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    if len(ranges) <= 1:
+        # Nothing to parallelize, the frame count of the container can also be missing
+        return render_chunk(video_path, 0, num_frames if num_frames > 0 else 2**31 - 1, output_path, draw, draw_args, frame_step, profile)
+
+    chunk_dir = tempfile.mkdtemp(prefix="chunks_", dir=os.path.dirname(output_path) or ".")
+    try:
+        chunk_paths = [os.path.join(chunk_dir, f"chunk_{index:04d}.{profile_extension(profile)}") for index in range(len(ranges))]
+        with Pool(processes=min(len(ranges), num_processes)) as pool:
+            # One encoder thread per chunk, the parallelism comes from the chunks
+            frames = pool.starmap(render_chunk, [
+                (video_path, start, end, chunk_path, draw, draw_args, frame_step, profile, 1)
+                for (start, end), chunk_path in zip(ranges, chunk_paths)
+            ])
+        concat_chunks(chunk_paths, output_path)
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+
+    return sum(frames)
@@ -1,8 +1,39 @@
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 import json
+import os
 import cv2
 from psycopg2 import pool
+from backend.app.core.video_processor import load_keyframe_index
+from psycopg2.extensions import connection as _pg_connection, cursor as _pg_cursor
+
+
+class CountingConnection(_pg_connection):
+    """Connection that reports the statements of its cursors to the owning `DatabaseManager`."""
+    manager = None
+
+
+class CountingCursor(_pg_cursor):
+    """Cursor counting database round-trips (`execute_values` issues one per page)."""
+    def execute(self, query, vars=None):
+        if self.connection.manager is not None:
+            self.connection.manager.db_round_trips += 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        # psycopg2 sends one statement per parameter set
+        vars_list = list(vars_list)
+        if self.connection.manager is not None:
+            self.connection.manager.db_round_trips += len(vars_list)
+        return super().executemany(query, vars_list)
+
+class DetectionLeaseLost(Exception):
+    """The detection run of a video was taken over by another process (its lease expired)."""
+    def __init__(self, video_id):
+        super().__init__(f"The detection run of video {video_id} is no longer leased to this process.")
+        self.video_id = video_id
+
 
 # This class, `DatabaseManager`, provides an interface for interacting with a PostgreSQL database
 # to store and manage data for a video-based anomaly detection system.
@@ -11,6 +42,7 @@ from psycopg2 import pool
 # - Managing connection pooling and automatic creation of the database if it doesn't exist.
 # - Creating, clearing, and dropping all necessary tables.
 # - Inserting and fetching videos, detections, bounding boxes, and anomaly-related data.
+# - Storing detections chunk by chunk with checkpoints, so unfinished detection runs can be resumed.
 # - Handling storage and retrieval of analysis configurations and their links to videos.
 # - Managing detection anomalies, including top-k anomaly labels and scores per detection.
 # - Providing access to raw logits and interpreted anomaly results.
@@ -28,6 +60,8 @@ class DatabaseManager:
         self.connection_pool = None
         self.min_connection_pool = 1
         self.max_connection_pool = 20
+        # Statements sent through this manager, read by the stage instrumentation
+        self.db_round_trips = 0
 
     def connect(self):
         """Initialize the connection pool and create database if it doesn't exist."""
@@ -62,7 +96,9 @@ class DatabaseManager:
                 user=self.user,
                 password=self.password,
                 host=self.host,
-                port=self.port
+                port=self.port,
+                connection_factory=CountingConnection,
+                cursor_factory=CountingCursor
             )
             print(f"Connected to database '{self.db_name}' successfully.")
 
@@ -71,7 +107,9 @@ class DatabaseManager:
             raise
 
     def get_connection(self):
-        return self.connection_pool.getconn()
+        conn = self.connection_pool.getconn()
+        conn.manager = self
+        return conn
 
     def release_connection(self, conn):
         self.connection_pool.putconn(conn)
@@ -84,13 +122,29 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS videos (
                 id SERIAL PRIMARY KEY,
                 video_path TEXT NOT NULL,
+                video_filename TEXT,
                 duration INTEGER,
                 fps FLOAT,
                 date_processed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                name_of_analysis TEXT DEFAULT 'Unnamed analysis'
+                name_of_analysis TEXT DEFAULT 'Unnamed analysis',
+                keyframes INTEGER[],
+                detection_key TEXT,
+                detection_status TEXT,
+                detection_lease_owner TEXT,
+                detection_lease_expires_at TIMESTAMP
             );
         """
 
+        # Columns added after the first release, for databases created before them
+        add_new_columns = """
+            ALTER TABLE videos ADD COLUMN IF NOT EXISTS keyframes INTEGER[];
+            ALTER TABLE videos ADD COLUMN IF NOT EXISTS detection_key TEXT;
+            ALTER TABLE videos ADD COLUMN IF NOT EXISTS detection_status TEXT;
+            ALTER TABLE videos ADD COLUMN IF NOT EXISTS detection_lease_owner TEXT;
+            ALTER TABLE videos ADD COLUMN IF NOT EXISTS detection_lease_expires_at TIMESTAMP;
+            ALTER TABLE videos ADD COLUMN IF NOT EXISTS video_filename TEXT;
+        """
+
         create_detections_table = """
             CREATE TABLE IF NOT EXISTS detections (
                 id SERIAL PRIMARY KEY,
@@ -127,6 +181,21 @@ class DatabaseManager:
             );
         """
 
+        create_anomaly_recognition_matrices_table = """
+            CREATE TABLE IF NOT EXISTS anomaly_recognition_matrices (
+              video_id INTEGER PRIMARY KEY,
+              detection_ids INTEGER[] NOT NULL,
+              categories TEXT[] NOT NULL,
+              category_hash TEXT NOT NULL,
+              num_detections INTEGER NOT NULL,
+              num_categories INTEGER NOT NULL,
+              dtype TEXT NOT NULL DEFAULT 'float32',
+              matrix_path TEXT NOT NULL,
+              timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+              FOREIGN KEY (video_id) REFERENCES videos(id) ON DELETE CASCADE
+            );
+        """
+
         create_analysis_configurations_table = """
             CREATE TABLE IF NOT EXISTS analysis_configurations (
                 id SERIAL PRIMARY KEY,
@@ -156,16 +225,118 @@ class DatabaseManager:
             );
         """
 
+        create_experiments_table = """
+            CREATE TABLE IF NOT EXISTS experiments (
+                id SERIAL PRIMARY KEY,
+                name TEXT,
+                request JSONB NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                result JSONB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            );
+        """
+
+        create_experiment_tasks_table = """
+            CREATE TABLE IF NOT EXISTS experiment_tasks (
+                id SERIAL PRIMARY KEY,
+                experiment_id INTEGER REFERENCES experiments(id) ON DELETE CASCADE,
+                video_path TEXT NOT NULL,
+                label TEXT NOT NULL,
+                kwargs JSONB NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                lease_owner TEXT,
+                lease_expires_at TIMESTAMP,
+                result JSONB,
+                error TEXT,
+                duration_seconds FLOAT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (experiment_id, video_path)
+            );
+        """
+
+        create_profile_artifacts_table = """
+            CREATE TABLE IF NOT EXISTS profile_artifacts (
+                id SERIAL PRIMARY KEY,
+                video_id INTEGER REFERENCES videos(id) ON DELETE CASCADE,
+                run_id TEXT,
+                stage TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size_bytes BIGINT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """
+
+        create_stage_metrics_table = """
+            CREATE TABLE IF NOT EXISTS stage_metrics (
+                id SERIAL PRIMARY KEY,
+                video_id INTEGER REFERENCES videos(id) ON DELETE CASCADE,
+                run_id TEXT,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                wall_seconds FLOAT,
+                cpu_seconds FLOAT,
+                peak_rss_bytes BIGINT,
+                frames_decoded BIGINT,
+                model_invocations BIGINT,
+                db_round_trips BIGINT,
+                bytes_written BIGINT,
+                details JSONB,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """
+
+        # One row per detection chunk stored so far, an interrupted detection resumes with the missing chunks
+        create_detection_checkpoints_table = """
+            CREATE TABLE IF NOT EXISTS detection_checkpoints (
+                id SERIAL PRIMARY KEY,
+                video_id INTEGER REFERENCES videos(id) ON DELETE CASCADE,
+                start_frame INTEGER NOT NULL,
+                end_frame INTEGER NOT NULL,
+                next_track_id INTEGER,
+                tracker_tail JSONB,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (video_id, start_frame)
+            );
+        """
+
+        # Indexes backing the per-video lookups and the keyset-paginated listings
+        create_indexes = """
+            CREATE INDEX IF NOT EXISTS idx_videos_date_processed_id ON videos (date_processed DESC, id DESC);
+            CREATE INDEX IF NOT EXISTS idx_detections_video_id_id ON detections (video_id, id);
+            CREATE INDEX IF NOT EXISTS idx_bounding_boxes_detection_id ON bounding_boxes (detection_id);
+            CREATE INDEX IF NOT EXISTS idx_anomaly_recognition_data_video_id ON anomaly_recognition_data (video_id);
+            CREATE INDEX IF NOT EXISTS idx_analysis_configurations_link_config_id ON analysis_configurations_link (config_id);
+            CREATE INDEX IF NOT EXISTS idx_detection_anomalies_detection_id ON detection_anomalies (detection_id, anomaly_score DESC);
+            CREATE INDEX IF NOT EXISTS idx_detection_anomalies_label ON detection_anomalies (anomaly_label);
+            CREATE INDEX IF NOT EXISTS idx_experiment_tasks_claim ON experiment_tasks (status, lease_expires_at);
+            CREATE INDEX IF NOT EXISTS idx_experiment_tasks_experiment_id ON experiment_tasks (experiment_id, status);
+            CREATE INDEX IF NOT EXISTS idx_stage_metrics_video_id ON stage_metrics (video_id, id);
+            CREATE INDEX IF NOT EXISTS idx_profile_artifacts_video_id ON profile_artifacts (video_id, id);
+            CREATE INDEX IF NOT EXISTS idx_videos_detection_key ON videos (detection_key, detection_status);
+        """
+
         conn = self.get_connection()
         cursor = conn.cursor()
 
         cursor.execute(create_videos_table)
+        cursor.execute(add_new_columns)
         cursor.execute(create_detections_table)
         cursor.execute(create_bounding_boxes_table)
         cursor.execute(create_anomaly_recognition_data_table)
+        cursor.execute(create_anomaly_recognition_matrices_table)
         cursor.execute(create_analysis_configurations_table)
         cursor.execute(create_analysis_configurations_link_table)
         cursor.execute(create_detection_anomalies_table)
+        cursor.execute(create_experiments_table)
+        cursor.execute(create_experiment_tasks_table)
+        cursor.execute(create_stage_metrics_table)
+        cursor.execute(create_profile_artifacts_table)
+        cursor.execute(create_detection_checkpoints_table)
+        cursor.execute(create_indexes)
 
         conn.commit()
 
@@ -176,18 +347,30 @@ class DatabaseManager:
         delete_detections = "DELETE FROM detections;"
         delete_videos = "DELETE FROM videos;"
         delete_anomaly_recognition_data = "DELETE FROM anomaly_recognition_data;"
+        delete_anomaly_recognition_matrices = "DELETE FROM anomaly_recognition_matrices;"
         delete_analysis_configurations_data = "DELETE FROM analysis_configurations;"
         delete_analysis_configurations_link_data = "DELETE FROM analysis_configurations_link;"
         delete_detection_anomalies = "DELETE FROM detection_anomalies;"
+        delete_experiment_tasks = "DELETE FROM experiment_tasks;"
+        delete_experiments = "DELETE FROM experiments;"
+        delete_stage_metrics = "DELETE FROM stage_metrics;"
+        delete_profile_artifacts = "DELETE FROM profile_artifacts;"
+        delete_detection_checkpoints = "DELETE FROM detection_checkpoints;"
 
 
         conn = self.get_connection()
         cursor = conn.cursor()
 
+        cursor.execute(delete_detection_checkpoints)
+        cursor.execute(delete_profile_artifacts)
+        cursor.execute(delete_stage_metrics)
+        cursor.execute(delete_experiment_tasks)
+        cursor.execute(delete_experiments)
         cursor.execute(delete_detection_anomalies)
         cursor.execute(delete_analysis_configurations_link_data)
         cursor.execute(delete_analysis_configurations_data)
         cursor.execute(delete_anomaly_recognition_data)
+        cursor.execute(delete_anomaly_recognition_matrices)
         cursor.execute(delete_bounding_boxes)
         cursor.execute(delete_detections)
         cursor.execute(delete_videos)
@@ -200,17 +383,29 @@ class DatabaseManager:
         drop_detections_table = "DROP TABLE IF EXISTS detections;"
         drop_bounding_boxes_table = "DROP TABLE IF EXISTS bounding_boxes;"
         drop_anomaly_recognition_data_table = "DROP TABLE IF EXISTS anomaly_recognition_data;"
+        drop_anomaly_recognition_matrices_table = "DROP TABLE IF EXISTS anomaly_recognition_matrices;"
         drop_analysis_configurations_link_table = "DROP TABLE IF EXISTS analysis_configurations_link;"
         drop_analysis_configurations_table = "DROP TABLE IF EXISTS analysis_configurations;"
         drop_detection_anomalies_table = "DROP TABLE IF EXISTS detection_anomalies;"
+        drop_experiment_tasks_table = "DROP TABLE IF EXISTS experiment_tasks;"
+        drop_experiments_table = "DROP TABLE IF EXISTS experiments;"
+        drop_stage_metrics_table = "DROP TABLE IF EXISTS stage_metrics;"
+        drop_profile_artifacts_table = "DROP TABLE IF EXISTS profile_artifacts;"
+        drop_detection_checkpoints_table = "DROP TABLE IF EXISTS detection_checkpoints;"
 
         conn = self.get_connection()
         cursor = conn.cursor()
 
+        cursor.execute(drop_detection_checkpoints_table)
+        cursor.execute(drop_profile_artifacts_table)
+        cursor.execute(drop_stage_metrics_table)
+        cursor.execute(drop_experiment_tasks_table)
+        cursor.execute(drop_experiments_table)
         cursor.execute(drop_detection_anomalies_table)
         cursor.execute(drop_analysis_configurations_link_table)
         cursor.execute(drop_analysis_configurations_table)
         cursor.execute(drop_anomaly_recognition_data_table)
+        cursor.execute(drop_anomaly_recognition_matrices_table)
         cursor.execute(drop_bounding_boxes_table)
         cursor.execute(drop_detections_table)
         cursor.execute(drop_videos_table)
@@ -227,16 +422,25 @@ class DatabaseManager:
         duration = video.get(cv2.CAP_PROP_FRAME_COUNT) / fps
         return duration, fps
 
-    def insert_video(self, video_path, name_of_analysis):
+    def insert_video(self, video_path, name_of_analysis, keyframes=None, detection_key=None, lease_owner=None, lease_seconds=None, video_filename=None):
         duration, fps = self.get_video_duration(video_path)
+        # Uploaded videos are stored under their hash, the original file name is kept for display and evaluation
+        video_filename = video_filename or os.path.basename(video_path)
+        # The keyframe index is built once here, the workers seek with it (see video_processor.open_video_at)
+        if keyframes is None:
+            keyframes = load_keyframe_index(video_path)
+        # A video inserted for a detection run stays 'running', leased to `lease_owner`, until the run finishes
+        detection_status = 'running' if detection_key else None
         insert_query = """
-                INSERT INTO videos (video_path, duration, fps, name_of_analysis)
-                VALUES (%s, %s, %s, %s) RETURNING id;
+                INSERT INTO videos (video_path, video_filename, duration, fps, name_of_analysis, keyframes, detection_key, detection_status,
+                                    detection_lease_owner, detection_lease_expires_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW() + %s * INTERVAL '1 second') RETURNING id;
             """
         conn = self.get_connection()
         cursor = conn.cursor()
 
-        cursor.execute(insert_query, (video_path, duration, fps, name_of_analysis))
+        cursor.execute(insert_query, (video_path, video_filename, duration, fps, name_of_analysis, keyframes, detection_key, detection_status,
+                                      lease_owner, lease_seconds))
         conn.commit()
 
         video_id = cursor.fetchone()[0]
@@ -285,6 +489,281 @@ class DatabaseManager:
 
         self.release_connection(conn)
 
+    # Unfinished detection runs that no live process holds: interrupted, failed, or running with an expired lease
+    # (a crashed process never finishes its run). Runs without a lease were started before leases existed.
+    ABANDONED_DETECTION_RUN = """
+        detection_key = %s AND (
+            detection_status IN ('interrupted', 'failed')
+            OR (detection_status = 'running' AND (detection_lease_expires_at IS NULL OR detection_lease_expires_at < NOW()))
+        )
+    """
+
+    def claim_incomplete_detection_run(self, detection_key, lease_owner, lease_seconds):
+        """Leases the latest abandoned detection run with the key to `lease_owner`. Returns its video id or None."""
+        # SKIP LOCKED: two processes never claim the same run, a run that is being claimed is left to the other one
+        claim_query = f"""
+            UPDATE videos
+            SET detection_status = 'running', detection_lease_owner = %s,
+                detection_lease_expires_at = NOW() + %s * INTERVAL '1 second'
+            WHERE id = (
+                SELECT id FROM videos
+                WHERE {self.ABANDONED_DETECTION_RUN}
+                ORDER BY id DESC
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id;
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(claim_query, (lease_owner, lease_seconds, detection_key))
+            result = cursor.fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
+        return result[0] if result else None
+
+    def delete_incomplete_detection_runs(self, detection_key):
+        """Deletes the videos of abandoned detection runs with the key (cascades to their detections and checkpoints).
+
+        Runs held by a live process (running with a valid lease) are never deleted.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(f"""
+                DELETE FROM videos
+                WHERE id IN (SELECT id FROM videos WHERE {self.ABANDONED_DETECTION_RUN} FOR UPDATE SKIP LOCKED)
+                RETURNING id;
+            """, (detection_key,))
+            video_ids = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
+        return video_ids
+
+    def renew_detection_lease(self, video_id, lease_owner, lease_seconds) -> bool:
+        """Extends the lease of a running detection. False if the run is no longer held by `lease_owner`."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            UPDATE videos SET detection_lease_expires_at = NOW() + %s * INTERVAL '1 second'
+            WHERE id = %s AND detection_lease_owner = %s AND detection_status = 'running';
+        """, (lease_seconds, video_id, lease_owner))
+        renewed = cursor.rowcount == 1
+        conn.commit()
+
+        self.release_connection(conn)
+        return renewed
+
+    def finish_detection_run(self, video_id, lease_owner, detection_status) -> bool:
+        """Stores the final status of a detection run, unless another process has taken the run over meanwhile."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            UPDATE videos SET detection_status = %s, detection_lease_expires_at = NULL
+            WHERE id = %s AND detection_lease_owner = %s AND detection_status = 'running';
+        """, (detection_status, video_id, lease_owner))
+        finished = cursor.rowcount == 1
+        conn.commit()
+
+        self.release_connection(conn)
+        return finished
+
+    def fetch_detection_checkpoints(self, video_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT start_frame, end_frame, next_track_id, tracker_tail
+            FROM detection_checkpoints
+            WHERE video_id = %s
+            ORDER BY start_frame;
+        """, (video_id,))
+        rows = cursor.fetchall()
+
+        self.release_connection(conn)
+        return [
+            {'start_frame': row[0], 'end_frame': row[1], 'next_track_id': row[2], 'tracker_tail': row[3]}
+            for row in rows
+        ]
+
+    def fetch_detection_track_map(self, video_id):
+        """Returns {track_id: detection_id} of the detections stored for the video."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT track_id, id FROM detections WHERE video_id = %s ORDER BY id;", (video_id,))
+        result = {row[0]: row[1] for row in cursor.fetchall()}
+
+        self.release_connection(conn)
+        return result
+
+    def store_detection_chunk(self, video_id, detections, detection_map, checkpoint=None, video_type="mp4", lease_owner=None, lease_seconds=None):
+        """Stores the detections of one chunk, and its checkpoint, in a single transaction.
+
+        `detection_map` ({track_id: detection_id}) holds the tracks stored by earlier chunks, their end frames are
+        extended. Returns the entries of the tracks started in this chunk. Nothing is stored if any statement fails.
+        With `lease_owner` the lease of the run is renewed in the same transaction; if the run is no longer held by
+        `lease_owner`, nothing is stored and DetectionLeaseLost is raised.
+        """
+        new_tracks = {}  # track_id -> [start_frame, end_frame, class_id, confidence]
+        end_frames = {}  # detection_id of an earlier track -> its last frame in this chunk
+        for detection in detections:
+            track_id = detection.get('track_id')
+            frame_id = detection['frame_id']
+            if track_id in detection_map:
+                detection_id = detection_map[track_id]
+                end_frames[detection_id] = max(end_frames.get(detection_id, frame_id), frame_id)
+            elif track_id in new_tracks:
+                new_tracks[track_id][1] = max(new_tracks[track_id][1], frame_id)
+            else:
+                new_tracks[track_id] = [frame_id, frame_id, detection['class_id'], detection['confidence']]
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            if lease_owner is not None:
+                # Also locks the video row, so the run cannot be claimed by another process while the chunk is stored
+                cursor.execute("""
+                    UPDATE videos SET detection_lease_expires_at = NOW() + %s * INTERVAL '1 second'
+                    WHERE id = %s AND detection_lease_owner = %s AND detection_status = 'running';
+                """, (lease_seconds, video_id, lease_owner))
+                if cursor.rowcount != 1:
+                    raise DetectionLeaseLost(video_id)
+
+            new_map = {}
+            if new_tracks:
+                rows = execute_values(
+                    cursor,
+                    "INSERT INTO detections (video_id, start_frame, end_frame, class_id, confidence, track_id) VALUES %s RETURNING id;",
+                    [(video_id, start, end, class_id, confidence, track_id) for track_id, (start, end, class_id, confidence) in new_tracks.items()],
+                    page_size=10000, fetch=True
+                )
+                new_map = {track_id: row[0] for track_id, row in zip(new_tracks, rows)}
+                cursor.execute("""
+                    UPDATE detections
+                    SET video_object_detection_path = 'data/output/' || video_id || '/anomaly_recognition_preprocessor/' || video_id || '_' || id || '.' || %s
+                    WHERE id = ANY(%s);
+                """, (video_type, list(new_map.values())))
+
+            if end_frames:
+                execute_values(
+                    cursor,
+                    """
+                        UPDATE detections SET end_frame = GREATEST(detections.end_frame, v.end_frame)
+                        FROM (VALUES %s) AS v (id, end_frame)
+                        WHERE detections.id = v.id;
+                    """,
+                    list(end_frames.items()),
+                    page_size=10000
+                )
+
+            detection_ids = {**detection_map, **new_map}
+            execute_values(
+                cursor,
+                "INSERT INTO bounding_boxes (detection_id, frame_id, bbox) VALUES %s;",
+                [(detection_ids[detection.get('track_id')], detection['frame_id'], json.dumps(detection['bbox'])) for detection in detections],
+                page_size=10000
+            )
+
+            if checkpoint is not None:
+                cursor.execute("""
+                    INSERT INTO detection_checkpoints (video_id, start_frame, end_frame, next_track_id, tracker_tail)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (video_id, start_frame) DO UPDATE
+                    SET end_frame = EXCLUDED.end_frame,
+                        next_track_id = EXCLUDED.next_track_id,
+                        tracker_tail = EXCLUDED.tracker_tail,
+                        timestamp = CURRENT_TIMESTAMP;
+                """, (video_id, checkpoint['start_frame'], checkpoint['end_frame'], checkpoint['next_track_id'], json.dumps(checkpoint['tracker_tail'])))
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
+        return new_map
+
+    def copy_video_detections(self, source_video_id, video_path, name_of_analysis, share_crops=False, video_type="mp4", video_filename=None):
+        """Stores the finished detection run of `source_video_id` (detections and bounding boxes) as a new video
+        of `video_path` (a file with the same content, originally named `video_filename`).
+
+        Later stages of the copy write only to the new video, so an analysis reusing a cached detection run never
+        changes the results of earlier analyses. With `share_crops` the copied detections point to the crops of
+        the source video, otherwise to their own (not yet cropped) paths. Returns (video_id, {source detection id:
+        detection id}), or (None, {}) if the source video does not exist. Everything is copied in one transaction.
+        """
+        insert_video_query = """
+            INSERT INTO videos (video_path, video_filename, duration, fps, name_of_analysis, keyframes, detection_key, detection_status)
+            SELECT %s, %s, duration, fps, %s, keyframes, detection_key, 'completed'
+            FROM videos WHERE id = %s
+            RETURNING id;
+        """
+        # The new ids are drawn before the insert, so every source detection is paired with its copy
+        copy_detections_query = """
+            WITH source AS (
+                SELECT id, start_frame, end_frame, class_id, confidence, track_id, video_object_detection_path,
+                       nextval(pg_get_serial_sequence('detections', 'id')) AS new_id
+                FROM detections
+                WHERE video_id = %(source_video_id)s
+            ), copied_detections AS (
+                INSERT INTO detections (id, video_id, start_frame, end_frame, class_id, confidence, track_id, video_object_detection_path)
+                SELECT new_id, %(video_id)s, start_frame, end_frame, class_id, confidence, track_id,
+                       CASE WHEN %(share_crops)s THEN video_object_detection_path
+                            ELSE 'data/output/' || %(video_id)s || '/anomaly_recognition_preprocessor/' || %(video_id)s || '_' || new_id || '.' || %(video_type)s
+                       END
+                FROM source
+            ), copied_boxes AS (
+                INSERT INTO bounding_boxes (detection_id, frame_id, bbox)
+                SELECT source.new_id, b.frame_id, b.bbox
+                FROM bounding_boxes b
+                JOIN source ON source.id = b.detection_id
+            )
+            SELECT id, new_id FROM source;
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(insert_video_query, (video_path, video_filename or os.path.basename(video_path), name_of_analysis, source_video_id))
+            row = cursor.fetchone()
+            if row is None:
+                conn.rollback()
+                return None, {}
+            video_id = row[0]
+            cursor.execute(copy_detections_query, {
+                "source_video_id": source_video_id,
+                "video_id": video_id,
+                "share_crops": share_crops,
+                "video_type": video_type
+            })
+            detection_map = {source_id: detection_id for source_id, detection_id in cursor.fetchall()}
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
+        return video_id, detection_map
+
     def fetch_detections(self):
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -364,6 +843,33 @@ class DatabaseManager:
 
         return bounding_boxes
     
+    def fetch_bounding_boxes_by_video_id(self, video_id):
+        """All bounding boxes of the video in a single query, sorted by frame."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        query = """
+            SELECT bb.detection_id, d.track_id, bb.frame_id, bb.bbox
+            FROM bounding_boxes bb
+            JOIN detections d ON d.id = bb.detection_id
+            WHERE d.video_id = %s
+            ORDER BY bb.frame_id, bb.detection_id;
+        """
+        cursor.execute(query, (video_id,))
+        result = cursor.fetchall()
+        self.release_connection(conn)
+
+        bounding_boxes = []
+        for row in result:
+            bounding_boxes.append({
+                'detection_id': row[0],
+                'track_id': row[1],
+                'frame_id': row[2],
+                'bbox': json.loads(row[3])
+            })
+
+        return bounding_boxes
+
     def fetch_detections_by_video_id(self, video_id):
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -467,6 +973,103 @@ class DatabaseManager:
 
         return anomaly_recognition_data
 
+    def upsert_anomaly_recognition_matrix(self, video_id, detection_ids, categories, category_hash, shape, matrix_path, dtype="float32"):
+        query = """
+            INSERT INTO anomaly_recognition_matrices
+                (video_id, detection_ids, categories, category_hash, num_detections, num_categories, dtype, matrix_path)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (video_id) DO UPDATE SET
+                detection_ids = EXCLUDED.detection_ids,
+                categories = EXCLUDED.categories,
+                category_hash = EXCLUDED.category_hash,
+                num_detections = EXCLUDED.num_detections,
+                num_categories = EXCLUDED.num_categories,
+                dtype = EXCLUDED.dtype,
+                matrix_path = EXCLUDED.matrix_path,
+                timestamp = CURRENT_TIMESTAMP;
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(query, (video_id, list(detection_ids), list(categories), category_hash, shape[0], shape[1], dtype, matrix_path))
+        conn.commit()
+
+        self.release_connection(conn)
+
+    def fetch_anomaly_recognition_matrices(self, video_ids):
+        query = """
+            SELECT video_id, detection_ids, categories, category_hash, num_detections, num_categories, dtype, matrix_path
+            FROM anomaly_recognition_matrices
+            WHERE video_id = ANY(%s);
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(query, (list(video_ids),))
+        rows = cursor.fetchall()
+
+        self.release_connection(conn)
+
+        return {
+            row[0]: {
+                'video_id': row[0],
+                'detection_ids': row[1],
+                'categories': row[2],
+                'category_hash': row[3],
+                'num_detections': row[4],
+                'num_categories': row[5],
+                'dtype': row[6],
+                'matrix_path': row[7]
+            }
+            for row in rows
+        }
+
+    def fetch_analyzed_videos(self, video_ids=None):
+        """Returns the videos with a finished detection run whose detections were recognized, including the
+        videos without any detection (nothing was detected in them)."""
+        query = """
+            SELECT v.id, v.video_path, v.video_filename
+            FROM videos v
+            WHERE (v.detection_status IS NULL OR v.detection_status = 'completed')
+              AND (
+                NOT EXISTS (SELECT 1 FROM detections d WHERE d.video_id = v.id)
+                OR EXISTS (SELECT 1 FROM anomaly_recognition_matrices m WHERE m.video_id = v.id)
+                OR EXISTS (SELECT 1 FROM anomaly_recognition_data r WHERE r.video_id = v.id)
+              )
+        """
+        params = ()
+        if video_ids is not None:
+            query += " AND v.id = ANY(%s)"
+            params = (list(video_ids),)
+        query += " ORDER BY v.id;"
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+
+        self.release_connection(conn)
+
+        return [{'video_id': row[0], 'video_path': row[1], 'video_filename': row[2]} for row in rows]
+
+    def fetch_detection_confidences(self, video_ids):
+        """Returns {detection_id: confidence} of all detections of the given videos in one query."""
+        query = """
+            SELECT id, confidence
+            FROM detections
+            WHERE video_id = ANY(%s);
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(query, (list(video_ids),))
+        rows = cursor.fetchall()
+
+        self.release_connection(conn)
+
+        return {row[0]: row[1] for row in rows}
+
     def fetch_anomalies_by_video_id(self, video_id):
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -512,12 +1115,22 @@ class DatabaseManager:
         
         return result[0] if result else None
     
+    def fetch_video_keyframes(self, video_id: int):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT keyframes FROM videos WHERE id = %s", (video_id,))
+        result = cursor.fetchone()
+        self.release_connection(conn)
+
+        return result[0] if result else None
+
     def fetch_video_by_id(self, video_id: int):
         conn = self.get_connection()
         cursor = conn.cursor()
 
         query = """
-            SELECT id, video_path, duration, fps, date_processed, name_of_analysis
+            SELECT id, video_path, duration, fps, date_processed, name_of_analysis, detection_status, video_filename
             FROM videos
             WHERE id = %s;
         """
@@ -534,6 +1147,8 @@ class DatabaseManager:
                 'fps': result[3],
                 'date_processed': result[4],
                 'name_of_analysis': result[5],
+                'detection_status': result[6],
+                'video_filename': result[7],
             }
         return None
 
@@ -559,7 +1174,7 @@ class DatabaseManager:
 
         query = """
             SELECT v.id, v.video_path, v.duration, v.fps, v.date_processed, v.name_of_analysis,
-                acl.config_id
+                acl.config_id, v.video_filename
             FROM videos v
             LEFT JOIN analysis_configurations_link acl ON v.id = acl.video_id;
         """
@@ -575,6 +1190,7 @@ class DatabaseManager:
                 'fps': row[3],
                 'date_processed': row[4],
                 'name_of_analysis': row[5],
+                'video_filename': row[7],
             }
 
             config_id = row[6]
@@ -718,6 +1334,32 @@ class DatabaseManager:
         conn.commit()
         self.release_connection(conn)
 
+    def replace_detection_anomalies_for_videos(self, video_ids: list[int], anomalies: list[tuple]):
+        """Replaces all anomalies of the given videos with `anomalies` ((detection_id, label, score) rows)
+        in a single transaction, using one bulk INSERT."""
+        delete_query = """
+            DELETE FROM detection_anomalies da
+            USING detections d
+            WHERE da.detection_id = d.id AND d.video_id = ANY(%s);
+        """
+        insert_query = """
+            INSERT INTO detection_anomalies (detection_id, anomaly_label, anomaly_score)
+            VALUES %s
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(delete_query, (list(video_ids),))
+            if anomalies:
+                execute_values(cursor, insert_query, anomalies, page_size=5000)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
     def fetch_detection_anomalies(self, detection_id: int) -> list[dict]:
         query = """
             SELECT anomaly_label, anomaly_score
@@ -769,4 +1411,274 @@ class DatabaseManager:
                 'score': row[5]
             })
 
-        return list(detection_map.values())
\ No newline at end of file
+        return list(detection_map.values())
+
+    def insert_experiment(self, name, request: dict, tasks: list[dict]) -> int:
+        """Inserts an experiment together with its per-video tasks in one transaction."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                "INSERT INTO experiments (name, request) VALUES (%s, %s) RETURNING id;",
+                (name, json.dumps(request))
+            )
+            experiment_id = cursor.fetchone()[0]
+            execute_values(cursor, """
+                INSERT INTO experiment_tasks (experiment_id, video_path, label, kwargs, max_attempts)
+                VALUES %s
+            """, [
+                (experiment_id, task["video_path"], task["label"], json.dumps(task["kwargs"]), task.get("max_attempts", 3))
+                for task in tasks
+            ])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
+        return experiment_id
+
+    # Tasks whose lease expired after their last attempt are given up
+    EXPIRE_EXPERIMENT_TASKS = """
+        UPDATE experiment_tasks
+        SET status = 'failed', error = COALESCE(error, 'Lease expired'), lease_owner = NULL, updated_at = NOW()
+        WHERE status = 'running' AND lease_expires_at < NOW() AND attempts >= max_attempts
+    """
+
+    def expire_experiment_tasks(self, experiment_id: int) -> int:
+        """Gives up the tasks of the experiment whose last lease expired. Returns the number of failed tasks."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(self.EXPIRE_EXPERIMENT_TASKS + " AND experiment_id = %s;", (experiment_id,))
+            expired = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
+        return expired
+
+    def claim_experiment_task(self, worker_id: str, lease_seconds: int):
+        """Leases the next pending (or abandoned) task to `worker_id`. Returns the task or None."""
+        # SKIP LOCKED lets many workers claim different tasks at the same time without blocking
+        claim_query = """
+            UPDATE experiment_tasks
+            SET status = 'running', lease_owner = %s, lease_expires_at = NOW() + %s * INTERVAL '1 second',
+                attempts = attempts + 1, updated_at = NOW()
+            WHERE id = (
+                SELECT id FROM experiment_tasks
+                WHERE (status = 'pending' OR (status = 'running' AND lease_expires_at < NOW()))
+                  AND attempts < max_attempts
+                ORDER BY experiment_id, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, experiment_id, video_path, label, kwargs, attempts;
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(self.EXPIRE_EXPERIMENT_TASKS + ";")
+            cursor.execute(claim_query, (worker_id, lease_seconds))
+            row = cursor.fetchone()
+            if row is not None:
+                cursor.execute(
+                    "UPDATE experiments SET status = 'running' WHERE id = %s AND status = 'pending';",
+                    (row[1],)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'experiment_id': row[1],
+            'video_path': row[2],
+            'label': row[3],
+            'kwargs': row[4],
+            'attempts': row[5]
+        }
+
+    def renew_experiment_task_lease(self, task_id: int, worker_id: str, lease_seconds: int) -> bool:
+        query = """
+            UPDATE experiment_tasks
+            SET lease_expires_at = NOW() + %s * INTERVAL '1 second', updated_at = NOW()
+            WHERE id = %s AND lease_owner = %s AND status = 'running';
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(query, (lease_seconds, task_id, worker_id))
+        renewed = cursor.rowcount == 1
+        conn.commit()
+
+        self.release_connection(conn)
+        return renewed
+
+    def complete_experiment_task(self, task_id: int, worker_id: str, result: dict, duration_seconds: float) -> bool:
+        # A worker that lost its lease must not overwrite the result of the worker that took over
+        query = """
+            UPDATE experiment_tasks
+            SET status = 'done', result = %s, duration_seconds = %s, error = NULL,
+                lease_owner = NULL, lease_expires_at = NULL, updated_at = NOW()
+            WHERE id = %s AND lease_owner = %s;
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(query, (json.dumps(result), duration_seconds, task_id, worker_id))
+        completed = cursor.rowcount == 1
+        conn.commit()
+
+        self.release_connection(conn)
+        return completed
+
+    def fail_experiment_task(self, task_id: int, worker_id: str, error: str):
+        """Returns the task to the queue, or marks it as failed after its last attempt."""
+        query = """
+            UPDATE experiment_tasks
+            SET status = CASE WHEN attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+                error = %s, lease_owner = NULL, lease_expires_at = NULL, updated_at = NOW()
+            WHERE id = %s AND lease_owner = %s;
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(query, (error, task_id, worker_id))
+        conn.commit()
+
+        self.release_connection(conn)
+
+    def fetch_experiment(self, experiment_id: int):
+        """Returns the experiment with the number of its tasks per status, or None."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT id, name, request, status, result, created_at, finished_at
+            FROM experiments WHERE id = %s;
+        """, (experiment_id,))
+        row = cursor.fetchone()
+
+        task_counts = {}
+        if row:
+            cursor.execute("""
+                SELECT status, COUNT(*) FROM experiment_tasks
+                WHERE experiment_id = %s GROUP BY status;
+            """, (experiment_id,))
+            task_counts = {status: count for status, count in cursor.fetchall()}
+
+        self.release_connection(conn)
+
+        if not row:
+            return None
+        return {
+            'id': row[0],
+            'name': row[1],
+            'request': row[2],
+            'status': row[3],
+            'result': row[4],
+            'created_at': row[5],
+            'finished_at': row[6],
+            'tasks': task_counts
+        }
+
+    def fetch_experiment_tasks(self, experiment_id: int):
+        query = """
+            SELECT id, video_path, label, status, attempts, error, result, duration_seconds
+            FROM experiment_tasks WHERE experiment_id = %s ORDER BY id;
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(query, (experiment_id,))
+        rows = cursor.fetchall()
+
+        self.release_connection(conn)
+
+        return [
+            {
+                'id': row[0],
+                'video_path': row[1],
+                'label': row[2],
+                'status': row[3],
+                'attempts': row[4],
+                'error': row[5],
+                'result': row[6],
+                'duration_seconds': row[7]
+            }
+            for row in rows
+        ]
+
+    def finish_experiment(self, experiment_id: int, result: dict) -> bool:
+        """Stores the aggregated result once no task of the experiment is pending or running."""
+        query = """
+            UPDATE experiments
+            SET status = 'completed', result = %s, finished_at = NOW()
+            WHERE id = %s AND status <> 'completed'
+              AND NOT EXISTS (
+                  SELECT 1 FROM experiment_tasks
+                  WHERE experiment_id = %s AND status IN ('pending', 'running')
+              );
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(query, (json.dumps(result), experiment_id, experiment_id))
+        finished = cursor.rowcount == 1
+        conn.commit()
+
+        self.release_connection(conn)
+        return finished
+
+    def insert_stage_metrics(self, metrics: dict) -> int:
+        query = """
+            INSERT INTO stage_metrics (
+                video_id, run_id, stage, status, wall_seconds, cpu_seconds, peak_rss_bytes,
+                frames_decoded, model_invocations, db_round_trips, bytes_written, details
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id;
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(query, (
+            metrics['video_id'], metrics['run_id'], metrics['stage'], metrics['status'],
+            metrics['wall_seconds'], metrics['cpu_seconds'], metrics['peak_rss_bytes'],
+            metrics['frames_decoded'], metrics['model_invocations'], metrics['db_round_trips'],
+            metrics['bytes_written'], json.dumps(metrics['details'])
+        ))
+        metrics_id = cursor.fetchone()[0]
+        conn.commit()
+
+        self.release_connection(conn)
+        return metrics_id
+
+    def insert_profile_artifacts(self, video_id: int, run_id: str, stage: str, artifacts: list[tuple]):
+        """Registers (kind, path, size_bytes) profiling artifacts of a stage."""
+        if not artifacts:
+            return
+        query = """
+            INSERT INTO profile_artifacts (video_id, run_id, stage, kind, path, size_bytes)
+            VALUES %s;
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        execute_values(cursor, query, [(video_id, run_id, stage, kind, path, size_bytes) for kind, path, size_bytes in artifacts])
+        conn.commit()
+
+        self.release_connection(conn)
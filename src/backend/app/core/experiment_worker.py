@@ -0,0 +1,68 @@
+"""
+experiment_worker.py
+
+Command line interface of the distributed experiment execution (see `distributed_experiment_service.py`).
+
+Commands:
+- enqueue: stores experiment payloads (a JSON list, as in `experiments/payloads`) as tasks in the database.
+- work: runs a worker that claims and processes tasks.
+- status: prints the progress and the result of an experiment.
+
+Usage (from the `src` directory):
+    python -m backend.app.core.experiment_worker enqueue --payloads ../experiments/payloads/sota_payload.json
+    python -m backend.app.core.experiment_worker work --exit_when_idle
+    python -m backend.app.core.experiment_worker status --experiment_id 1
+"""
+
+import argparse
+import json
+
+from backend.app.models.experiment_models import UBnormalExperimentRequest
+from backend.app.services.distributed_experiment_service import enqueue_experiment, get_experiment_status, run_worker
+
+def enqueue(payloads_path, name=None, max_attempts=3):
+    with open(payloads_path, "r") as f:
+        payloads = json.load(f)
+
+    experiment_ids = []
+    for index, payload in enumerate(payloads):
+        # Result files of previous runs wrap the payload in "request_data"
+        payload = payload.get("request_data", payload)
+        request = UBnormalExperimentRequest(**payload)
+        experiment_ids.append(enqueue_experiment(request, f"{name or payloads_path}#{index}", max_attempts))
+    return experiment_ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed UBnormal experiments")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Enqueue experiment payloads")
+    enqueue_parser.add_argument("--payloads", required=True, type=str, help="Path to the JSON file with a list of payloads")
+    enqueue_parser.add_argument("--name", type=str, default=None, help="Name of the experiments (default: payload file)")
+    enqueue_parser.add_argument("--max_attempts", type=int, default=3, help="Attempts per video before it is marked as failed")
+
+    work_parser = subparsers.add_parser("work", help="Run a worker")
+    work_parser.add_argument("--worker_id", type=str, default=None, help="Identifier of the worker (default: host-pid-random)")
+    work_parser.add_argument("--lease_seconds", type=int, default=600, help="Lease of a claimed task, renewed by a heartbeat")
+    work_parser.add_argument("--poll_seconds", type=float, default=5, help="Wait between polls of an empty queue")
+    work_parser.add_argument("--num_processes", type=int, default=None, help="Processes of the preprocessing/recognition pools (default: all cores)")
+    work_parser.add_argument("--max_tasks", type=int, default=None, help="Stop after this many tasks")
+    work_parser.add_argument("--exit_when_idle", action="store_true", help="Stop when there is no task left")
+
+    status_parser = subparsers.add_parser("status", help="Print the status of an experiment")
+    status_parser.add_argument("--experiment_id", required=True, type=int, help="ID of the experiment")
+    status_parser.add_argument("--output", type=str, default=None, help="Optional path of the JSON file with the status")
+
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        print(json.dumps({"experiment_ids": enqueue(args.payloads, args.name, args.max_attempts)}))
+    elif args.command == "work":
+        run_worker(args.worker_id, args.lease_seconds, args.poll_seconds, args.exit_when_idle, args.num_processes, args.max_tasks)
+    else:
+        status = json.dumps(get_experiment_status(args.experiment_id), default=str, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(status)
+        print(status)
@@ -0,0 +1,60 @@
+"""
+frame_box_index.py
+
+Frame-indexed storage of the bounding boxes of a video.
+
+The boxes are kept in NumPy arrays sorted by frame; `frame_ids` lists the frames that have boxes and
+the boxes of `frame_ids[i]` are the rows `offsets[i]:offsets[i + 1]` of `boxes`, `detection_ids` and
+`track_ids`. Looking up a frame is a binary search, so drawing a frame touches only its own boxes.
+
+Classes:
+- FrameBoxIndex: built from the rows of `DatabaseManager.fetch_bounding_boxes_by_video_id`.
+"""
+
+import numpy as np
+
+class FrameBoxIndex:
+    def __init__(self, frame_ids, offsets, boxes, detection_ids, track_ids):
+        self.frame_ids = frame_ids
+        self.offsets = offsets
+        self.boxes = boxes
+        self.detection_ids = detection_ids
+        self.track_ids = track_ids
+
+    @classmethod
+    def from_bounding_boxes(cls, bounding_boxes):
+        """Builds the index from dicts with frame_id, bbox, detection_id and track_id (in any order)."""
+        frame_of_box = np.array([bbox["frame_id"] for bbox in bounding_boxes], dtype=np.int32)
+        boxes = np.array([bbox["bbox"] for bbox in bounding_boxes], dtype=np.float32).reshape(-1, 4)
+        detection_ids = np.array([bbox["detection_id"] for bbox in bounding_boxes], dtype=np.int32)
+        track_ids = np.array([bbox["track_id"] if bbox["track_id"] is not None else -1 for bbox in bounding_boxes], dtype=np.int32)
+
+        # Stable, so boxes of the same frame keep the order of the query
+        order = np.argsort(frame_of_box, kind="stable")
+        frame_ids, counts = np.unique(frame_of_box[order], return_counts=True)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        return cls(frame_ids, offsets, boxes[order], detection_ids[order], track_ids[order])
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def frame_slice(self, frame_id) -> slice:
+        """Rows of the boxes in the frame (an empty slice if the frame has none)."""
+        position = np.searchsorted(self.frame_ids, frame_id)
+        if position == len(self.frame_ids) or self.frame_ids[position] != frame_id:
+            return slice(0, 0)
+        return slice(int(self.offsets[position]), int(self.offsets[position + 1]))
+
+    def boxes_in_frame(self, frame_id):
+        """Returns (boxes, detection_ids, track_ids) of the frame."""
+        rows = self.frame_slice(frame_id)
+        return self.boxes[rows], self.detection_ids[rows], self.track_ids[rows]
+
+    def to_arrays(self) -> dict:
+        return {
+            "frame_ids": self.frame_ids,
+            "offsets": self.offsets,
+            "boxes": self.boxes,
+            "detection_ids": self.detection_ids,
+            "track_ids": self.track_ids
+        }
@@ -0,0 +1,156 @@
+"""
+instrumentation.py
+
+Structured per-stage instrumentation of the analysis pipeline.
+
+`StageRecorder` is used as a context manager around the work of one pipeline stage of one video.
+It measures the wall time, the CPU time (user + system of this process and of its finished child
+processes, e.g. multiprocessing pools), and the peak resident memory of this process and its children
+(sampled in a background thread). Stages add their own counters (frames decoded, model invocations,
+bytes written) and the database round-trips of the `DatabaseManager` instances they use are counted
+automatically. On exit the measurements are stored as one row of the `stage_metrics` table.
+
+CPU time and memory are measured for the whole process, so stages running concurrently in the same
+process (e.g. in the experiment scheduler) are included in each other's numbers.
+
+Functions:
+- analysis_run: decorator grouping the stages recorded during a call under one run id.
+- current_run_id: returns the run id of the enclosing `analysis_run`, if any.
+- StageRecorder: records the metrics of one stage.
+"""
+
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+
+import psutil
+
+from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.prometheus_metrics import STAGE_DURATION, FRAMES_PROCESSED
+
+RSS_SAMPLE_INTERVAL_SECONDS = 0.1
+
+# Stages of one `run_full_analysis` call share its run id, stages started on their own get a new one
+_current_run_id = contextvars.ContextVar("stage_metrics_run_id", default=None)
+
+def analysis_run(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_run_id.set(uuid.uuid4().hex)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Pool threads are reused, the run id must not leak into later standalone stages
+            _current_run_id.reset(token)
+    return wrapper
+
+def current_run_id():
+    return _current_run_id.get()
+
+def _cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def _rss_bytes(process):
+    rss = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            # The child exited between listing and sampling
+            pass
+    return rss
+
+
+class StageRecorder:
+    def __init__(self, stage: str, video_id=None, persist=True):
+        self.stage = stage
+        self.video_id = video_id
+        self.persist = persist
+        self.counters = {"frames_decoded": 0, "model_invocations": 0, "bytes_written": 0}
+        self.details = {}
+        self.metrics = None
+        self._db_managers = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._process = psutil.Process()
+        self._peak_rss = 0
+
+    def add(self, **counters):
+        """Adds to the counters, e.g. `recorder.add(frames_decoded=120, model_invocations=24)`. Thread-safe."""
+        with self._lock:
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def detail(self, **details):
+        with self._lock:
+            self.details.update(details)
+
+    def track_db(self, db_manager: DatabaseManager):
+        """Counts the round-trips of `db_manager` made from now until the end of the stage."""
+        self._db_managers.append((db_manager, db_manager.db_round_trips))
+        return db_manager
+
+    def _sample_rss(self):
+        while True:
+            try:
+                self._peak_rss = max(self._peak_rss, _rss_bytes(self._process))
+            except psutil.Error:
+                pass
+            if self._stop_event.wait(RSS_SAMPLE_INTERVAL_SECONDS):
+                break
+
+    def __enter__(self):
+        self.run_id = _current_run_id.get() or uuid.uuid4().hex
+        self._start_wall = time.time()
+        self._start_cpu = _cpu_seconds()
+        self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        wall_seconds = time.time() - self._start_wall
+        cpu_seconds = _cpu_seconds() - self._start_cpu
+        self._stop_event.set()
+        self._sampler.join()
+
+        db_round_trips = sum(manager.db_round_trips - start for manager, start in self._db_managers)
+        self.metrics = {
+            "video_id": self.video_id,
+            "stage": self.stage,
+            "run_id": self.run_id,
+            "status": "failed" if exc_type else "completed",
+            "wall_seconds": round(wall_seconds, 3),
+            "cpu_seconds": round(cpu_seconds, 3),
+            "peak_rss_bytes": self._peak_rss,
+            "db_round_trips": db_round_trips,
+            **self.counters,
+            "details": self.details
+        }
+        print(f"📊 Stage '{self.stage}' of video {self.video_id}: {self.metrics['wall_seconds']} s wall, "
+              f"{self.metrics['cpu_seconds']} s CPU, {self._peak_rss / 1024 ** 2:.0f} MiB peak RSS, "
+              f"{self.counters['frames_decoded']} frames, {self.counters['model_invocations']} model calls, "
+              f"{db_round_trips} DB round-trips.")
+
+        STAGE_DURATION.labels(self.stage).observe(wall_seconds)
+        FRAMES_PROCESSED.labels(self.stage).inc(self.counters["frames_decoded"])
+
+        if self.persist and self.video_id is not None:
+            self._save()
+        # Never swallow the exception of the stage
+        return False
+
+    def _save(self):
+        # Instrumentation must not break the pipeline, the metrics are only printed if saving fails
+        db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
+        try:
+            db_manager.connect()
+            db_manager.insert_stage_metrics(self.metrics)
+        except Exception as e:
+            print(f"Database error: {e}")
+        finally:
+            if db_manager.connection_pool is not None:
+                db_manager.close()
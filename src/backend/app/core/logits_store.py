@@ -0,0 +1,109 @@
+"""
+logits_store.py
+
+Per-video storage of XCLIP logits as one dense float32 matrix.
+
+All logits of a video are kept in a single (num_detections x num_categories) `.npy` file next to
+the other outputs of the video. The header describing the matrix (row -> detection id mapping,
+category list and its hash, shape, dtype and file path) is stored in the `anomaly_recognition_matrices`
+table. Readers memory-map the file, so interpretation and evaluation can load the logits of a video,
+or of a whole experiment, without parsing one BYTEA row per detection.
+
+Functions:
+- category_hash: stable hash of an ordered list of categories.
+- save_video_logits: writes the logits matrix of a video and registers its header in the database.
+- load_video_logits: loads (memory-maps) the logits matrix of a video.
+- load_experiment_logits: loads the logits matrices of many videos with one header query.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from backend.app.core.database_manager import DatabaseManager
+
+# Base directory = root of the project (assuming this script is in diploma-thesis-prototype/src/backend/app/core/)
+BASE_DIR = Path(__file__).resolve().parents[4]
+
+LOGITS_DTYPE = np.float32
+
+def category_hash(categories) -> str:
+    return hashlib.sha256(json.dumps(list(categories)).encode("utf-8")).hexdigest()[:16]
+
+def logits_matrix_path(video_id: int) -> str:
+    # Relative to the project root, in the same way as `video_object_detection_path`
+    return f"data/output/{video_id}/anomaly_recognition/logits.npy"
+
+def save_video_logits(db_manager: DatabaseManager, video_id: int, detection_ids, logits_rows, categories):
+    """Stacks the per-detection logits into one float32 matrix and stores it for the video."""
+    if logits_rows:
+        matrix = np.stack([np.asarray(row, dtype=LOGITS_DTYPE).reshape(-1) for row in logits_rows])
+    else:
+        matrix = np.empty((0, len(categories)), dtype=LOGITS_DTYPE)
+
+    relative_path = logits_matrix_path(video_id)
+    absolute_path = BASE_DIR / relative_path
+    os.makedirs(absolute_path.parent, exist_ok=True)
+
+    # Write to a temporary file and swap it in, so readers never see a partially written matrix
+    temporary_path = absolute_path.with_suffix(".tmp.npy")
+    np.save(temporary_path, matrix)
+    os.replace(temporary_path, absolute_path)
+
+    db_manager.upsert_anomaly_recognition_matrix(
+        video_id,
+        [int(detection_id) for detection_id in detection_ids],
+        categories,
+        category_hash(categories),
+        matrix.shape,
+        relative_path,
+        np.dtype(LOGITS_DTYPE).name
+    )
+    return relative_path
+
+def _load_from_header(header):
+    logits = np.load(BASE_DIR / header['matrix_path'], mmap_mode="r")
+    return {
+        'video_id': header['video_id'],
+        'detection_ids': np.asarray(header['detection_ids'], dtype=np.int64),
+        'categories': header['categories'],
+        'category_hash': header['category_hash'],
+        'logits': logits
+    }
+
+def _load_from_legacy_rows(db_manager: DatabaseManager, video_id: int):
+    # Videos analyzed before the matrix store existed keep one BYTEA row per detection
+    rows = db_manager.get_anomaly_recognition_data_by_video_id(video_id)
+    if not rows:
+        return None
+
+    logits = np.stack([np.frombuffer(row['logits_per_video'], dtype=LOGITS_DTYPE) for row in rows])
+    return {
+        'video_id': video_id,
+        'detection_ids': np.asarray([row['detection_id'] for row in rows], dtype=np.int64),
+        'categories': None,
+        'category_hash': None,
+        'logits': logits
+    }
+
+def load_video_logits(db_manager: DatabaseManager, video_id: int):
+    """Returns a dict with `detection_ids` (N,), a read-only `logits` matrix (N x C) and the category
+    header of the video, or None if the video has no recognition results."""
+    return load_experiment_logits(db_manager, [video_id]).get(video_id)
+
+def load_experiment_logits(db_manager: DatabaseManager, video_ids):
+    """Same as `load_video_logits` for many videos, keyed by video id. Videos without results are omitted."""
+    headers = db_manager.fetch_anomaly_recognition_matrices(video_ids)
+
+    result = {}
+    for video_id in video_ids:
+        if video_id in headers:
+            result[video_id] = _load_from_header(headers[video_id])
+        else:
+            legacy = _load_from_legacy_rows(db_manager, video_id)
+            if legacy is not None:
+                result[video_id] = legacy
+    return result
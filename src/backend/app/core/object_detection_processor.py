@@ -1,48 +1,133 @@
 # This script is responsible for processing video segments for object detection using YOLO.
 # The main tasks include:
-# - Splitting the video into smaller segments for parallel processing using the `split_video` function.
-# - Handling object detection and tracking within each segment.
+# - Splitting the video into many short chunks using the `split_video_into_chunks` function.
+# - Handling object detection and tracking within each chunk.
 # - Managing detections and bounding boxes, storing results in a database, and handling interruptions.
 # 
-# The `process_segments_parallel` function manages multiple threads that process video segments in parallel.
-# Each thread performs detection or tracking on frames within the specified segment range, stores the results, and writes bounding boxes to the database.
+# The `process_chunks_parallel` function manages a pool of worker threads that pull chunks from a shared queue,
+# so a worker that finishes early takes the next chunk instead of waiting for the slowest segment.
+# Each chunk is tracked from a reset tracker, the `TrackStitcher` joins the tracks of consecutive chunks by their
+# overlap in a few warmup frames, and the results are stored in chunk order while the workers continue.
+# Every chunk is stored in one transaction together with its checkpoint (stitcher state after the chunk), so a run
+# that crashed or was interrupted can be resumed: a rerun with the same video and settings processes only the
+# chunks without a checkpoint (see `detection_run_key`, `--no_resume` discards the unfinished run instead).
+# A run is leased to the process running it (`DetectionLease`), only runs whose lease expired are resumed or discarded.
 # 
-# The script can run in parallel mode, with the `parallel` mode utilizing Python's `Thread` to process video segments concurrently for improved performance.
 # The program also includes error handling and graceful termination in case of manual interruptions.
 # It also ensures that all threads are properly joined and terminated after processing.
 
 import argparse
+import hashlib
+import json
+import socket
 import time
-from backend.app.core.video_processor import split_video
-from backend.app.core.database_manager import DatabaseManager
+import uuid
+from backend.app.core.video_processor import split_video_into_chunks, open_video_at
+from backend.app.core.video_writer import CROP_VIDEO_PROFILE, profile_extension
+from backend.app.core.database_manager import DatabaseManager, DetectionLeaseLost
 import cv2
 import os
 from threading import Thread, Event
-from queue import Queue
+from queue import Queue, Empty
 from backend.app.core.yolo_handler import YOLOHandler
+from backend.app.core.track_stitcher import TrackStitcher
+from backend.app.core.instrumentation import StageRecorder
+from backend.app.core.profiling import StageProfiler, profile_block, torch_trace
 
 class DetectionInterruptedError(Exception):
     pass
 
-def process_segments_parallel(video_path, segments, model_path, classes_to_detect, db_manager, video_id, skip_frames, num_of_skip_frames, confidence_threshold):
-    threads = []
+# Length of the chunks the workers pull from the queue; many short chunks keep all workers busy until the end
+DETECTION_CHUNK_SECONDS = 10
+# Sampled frames before every chunk that are tracked only to warm up the tracker, they link the chunk to the previous one
+TRACKER_WARMUP_FRAMES = 3
+# Lease of a detection run, renewed while the run is alive; a run whose lease expired may be resumed by another process
+DETECTION_LEASE_SECONDS = 120
+
+
+class DetectionLease:
+    """Lease of the detection run of a video, so no other process resumes (or deletes) a run that is still alive."""
+    def __init__(self, db_manager, owner, lease_seconds=DETECTION_LEASE_SECONDS):
+        self.db_manager = db_manager
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.video_id = None
+        self.renewed_at = time.monotonic()
+
+    def renewed(self):
+        self.renewed_at = time.monotonic()
+
+    def renew(self):
+        """Renews the lease a few times per lease period. Raises DetectionLeaseLost if another process took the run over."""
+        if self.video_id is None or time.monotonic() - self.renewed_at < self.lease_seconds / 4:
+            return
+        if not self.db_manager.renew_detection_lease(self.video_id, self.owner, self.lease_seconds):
+            raise DetectionLeaseLost(self.video_id)
+        self.renewed()
+
+
+def read_first_frame(video_path):
+    cap = cv2.VideoCapture(video_path)
+    _, frame = cap.read()
+    cap.release()
+    return frame
+
+def detection_run_key(video_path, model_path, classes_to_detect, skip_frames, num_of_skip_frames, confidence_threshold):
+    """Identifies a detection run, a rerun with the same key resumes the unfinished one.
+
+    The video file is identified by its size and modification time, the chunking is part of the key because the
+    checkpoints refer to chunk boundaries. The number of workers does not change the results and is not included.
+    """
+    stat = os.stat(video_path)
+    parts = [
+        os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns, model_path, sorted(classes_to_detect),
+        skip_frames, num_of_skip_frames, confidence_threshold, DETECTION_CHUNK_SECONDS, TRACKER_WARMUP_FRAMES
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+def process_chunks_parallel(video_path, chunks, model_path, classes_to_detect, db_manager, video_id, skip_frames, num_of_skip_frames, confidence_threshold, num_workers, recorder=None, profile_dir=None, keyframes=None, checkpoints=(), detection_map=None, lease=None):
+    if not chunks:
+        # Everything was stored by the run that is being resumed
+        return []
+
+    chunk_queue = Queue()
+    for index, (start_frame, end_frame) in enumerate(chunks):
+        chunk_queue.put((index, start_frame, end_frame))
     results_queue = Queue()
     stop_event = Event()
+    warmup_span = TRACKER_WARMUP_FRAMES * (num_of_skip_frames if skip_frames else 1)
+
+    # The trackers are created here one after another; creating one resets the track id counter of the process
+    first_frame = read_first_frame(video_path)
+    if first_frame is None:
+        raise ValueError(f"Could not read a frame of {video_path}.")
+    yolo_handlers = []
+    for _ in range(max(1, min(num_workers, len(chunks)))):
+        yolo_handler = YOLOHandler(model_path, classes_to_detect=classes_to_detect)
+        yolo_handler.track(first_frame, confidence_threshold=confidence_threshold)
+        # Fails here, before any chunk is processed, if the tracker is not the one the reset is written for
+        yolo_handler.reset_tracker()
+        yolo_handlers.append(yolo_handler)
+        if lease is not None:
+            lease.renew()
+
+    worker_stats = [{"worker": worker_id, "chunks": 0, "frames": 0, "busy_seconds": 0.0} for worker_id in range(len(yolo_handlers))]
+    threads = []
+    start_time = time.perf_counter()
 
-    # Create threads and divide data to process
+    # Create threads which pull chunks from the queue until it is empty
     try:
-        for i, (start_frame, end_frame) in enumerate(segments):
-            yolo_handler = YOLOHandler(model_path, classes_to_detect=classes_to_detect)
+        for worker_id, yolo_handler in enumerate(yolo_handlers):
             thread = Thread(
-                target=process_segment_and_store_results,
-                args=(video_path, start_frame, end_frame, yolo_handler, results_queue, stop_event, db_manager, video_id, skip_frames, num_of_skip_frames, confidence_threshold),
+                target=detection_worker,
+                args=(worker_id, video_path, yolo_handler, chunk_queue, results_queue, stop_event, skip_frames, num_of_skip_frames, confidence_threshold, warmup_span, worker_stats[worker_id], recorder, profile_dir, keyframes),
                 daemon=True  # It will automatically terminate threads when the program ends.
             )
             threads.append(thread)
             thread.start()
 
-        for thread in threads:
-            thread.join()
+        # Results are stitched and stored in chunk order while the workers continue with the next chunks
+        all_detections = collect_chunk_results(chunks, results_queue, threads, db_manager, video_id, TrackStitcher(warmup_span), checkpoints, detection_map, lease)
 
     except KeyboardInterrupt:
         print("\nDetection was interrupted. Terminating threads...")
@@ -50,70 +135,116 @@ def process_segments_parallel(video_path, segments, model_path, classes_to_detec
         for thread in threads:
             thread.join()
         raise DetectionInterruptedError("The detection was manually interrupted.")
+    except Exception:
+        # E.g. a chunk could not be stored, the chunks stored so far stay checkpointed
+        stop_event.set()
+        raise
     finally:
         print("All threads have been terminated.")
 
-    all_detections = []
-
-    # Get all results from treads to one all_detection list and return
-    while not results_queue.empty():
-        all_detections.append(results_queue.get())
-
+    report_worker_utilization(worker_stats, time.perf_counter() - start_time, recorder)
     return all_detections
 
-def process_segment_and_store_results(video_path, start_frame, end_frame, yolo_handler, results_queue, stop_event, db_manager, video_id, skip_frames = True, num_of_skip_frames = 5, confidence_threshold = 0.25):
-    try:
-        detections = process_segment(video_path, start_frame, end_frame, yolo_handler, stop_event, skip_frames, num_of_skip_frames, True, confidence_threshold)
-
-        # Get connection to db from connection_pool
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-
-        detection_map = {}  # track_id -> detection_id
-
-        for detection in detections:
-            if 'class_id' not in detection or 'confidence' not in detection or 'bbox' not in detection:
-                print(f"Detection with ID ${detection} is missing key. Skipping...")
-                continue 
-
-            # Check if detection for this track_id exists
-            track_id = detection.get('track_id')
-
-            # if not, add new detection for this track_id
-            if track_id not in detection_map:
-                start_frame = detection['frame_id']
-                end_frame = detection['frame_id']
-
-                detection_id = db_manager.insert_detection(
-                    video_id=video_id,
-                    start_frame=start_frame,
-                    end_frame=end_frame,
-                    class_id=detection['class_id'],
-                    confidence=detection['confidence'],
-                    track_id=track_id
-                )
-
-                detection_map[track_id] = detection_id
-            else:
-               # if exists, update end frame for this detecion
-                detection_id = detection_map[track_id]
-                current_end_frame = db_manager.fetch_detection_end_frame(detection_id)
+def collect_chunk_results(chunks, results_queue, threads, db_manager, video_id, stitcher, checkpoints=(), detection_map=None, lease=None):
+    pending = {}
+    # video-wide track_id -> detection_id, shared by all chunks (and with the chunks of a resumed run)
+    detection_map = detection_map if detection_map is not None else {}
+    all_detections = []
 
-                if detection['frame_id'] > current_end_frame:
-                    db_manager.update_detection_end_frame(detection_id, detection['frame_id'])
+    # A resumed run continues the track ids of the stored chunks, and the tracks of a chunk stored before
+    checkpoints_by_end = {checkpoint['end_frame']: checkpoint for checkpoint in checkpoints}
+    for checkpoint in checkpoints:
+        stitcher.next_track_id = max(stitcher.next_track_id, checkpoint['next_track_id'] or 1)
+
+    for index, (start_frame, end_frame) in enumerate(chunks):
+        while index not in pending:
+            try:
+                result_index, detections = results_queue.get(timeout=0.5)
+                pending[result_index] = detections
+            except Empty:
+                # Heartbeat while waiting for a slow chunk, storing a chunk renews the lease as well
+                if lease is not None:
+                    lease.renew()
+                if not any(thread.is_alive() for thread in threads) and results_queue.empty():
+                    # The workers were stopped, the remaining chunks will not come
+                    return all_detections
+
+        detections = pending.pop(index)
+        if detections is None:
+            stitcher.skip(end_frame)
+            continue
 
-            db_manager.insert_bounding_box(detection_id, detection['frame_id'], detection['bbox'])
+        if stitcher.tail_end != start_frame and start_frame in checkpoints_by_end:
+            stitcher.restore(checkpoints_by_end[start_frame])
 
-        db_manager.release_connection(conn)
+        detections = stitcher.stitch(start_frame, end_frame, detections)
+        store_detections(db_manager, video_id, detections, detection_map, stitcher.checkpoint(start_frame), lease)
+        all_detections.append(detections)
 
-        results_queue.put(detections)
-    except Exception as e:
-        print(f"Error processing segment {start_frame}-{end_frame}: {e}")
+    return all_detections
 
-def process_segment(video_path, start_frame, end_frame, yolo_handler, stop_event, skip_frames=True, num_of_skip_frames=5, tracking=True, confidence_threshold=0.25):
-    cap = cv2.VideoCapture(video_path)
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)  # Set on start of segment
+def detection_worker(worker_id, video_path, yolo_handler, chunk_queue, results_queue, stop_event, skip_frames, num_of_skip_frames, confidence_threshold, warmup_span, stats, recorder=None, profile_dir=None, keyframes=None):
+    with profile_block(profile_dir, f"worker_{worker_id}"):
+        while not stop_event.is_set():
+            try:
+                index, start_frame, end_frame = chunk_queue.get_nowait()
+            except Empty:
+                return
+
+            busy_start = time.perf_counter()
+            warmup_start = max(0, start_frame - warmup_span)
+            try:
+                yolo_handler.reset_tracker()
+                # Only one torch profiler can be active, the model calls of the first chunk are traced
+                with torch_trace(profile_dir if index == 0 else None, "yolo_chunk_0"):
+                    detections = process_segment(video_path, warmup_start, end_frame, yolo_handler, stop_event, skip_frames, num_of_skip_frames, True, confidence_threshold, recorder, keyframes)
+                results_queue.put((index, detections))
+            except Exception as e:
+                print(f"Error processing chunk {start_frame}-{end_frame}: {e}")
+                results_queue.put((index, None))
+
+            stats["chunks"] += 1
+            stats["frames"] += end_frame - warmup_start
+            stats["busy_seconds"] += time.perf_counter() - busy_start
+
+def report_worker_utilization(worker_stats, wall_seconds, recorder=None):
+    for stats in worker_stats:
+        stats["busy_seconds"] = round(stats["busy_seconds"], 3)
+        stats["utilization"] = round(stats["busy_seconds"] / wall_seconds, 3) if wall_seconds > 0 else None
+        print(f"Worker {stats['worker']}: {stats['chunks']} chunks, {stats['frames']} frames, "
+              f"busy {stats['busy_seconds']:.2f} s of {wall_seconds:.2f} s ({(stats['utilization'] or 0) * 100:.0f}%)")
+    if recorder is not None:
+        recorder.detail(workers=worker_stats)
+
+def store_detections(db_manager, video_id, detections, detection_map=None, checkpoint=None, lease=None):
+    # One detection row per track, extended to the last frame the track was seen in, plus one bounding box per frame.
+    # The detections of one call and the checkpoint are stored in a single transaction.
+    # track_id -> detection_id, passed in when the tracks continue in later calls
+    detection_map = detection_map if detection_map is not None else {}
+
+    valid_detections = []
+    for detection in detections:
+        if 'class_id' not in detection or 'confidence' not in detection or 'bbox' not in detection:
+            print(f"Detection with ID ${detection} is missing key. Skipping...")
+            continue
+        valid_detections.append(detection)
+
+    new_tracks = db_manager.store_detection_chunk(
+        video_id, valid_detections, detection_map, checkpoint, video_type=profile_extension(CROP_VIDEO_PROFILE),
+        lease_owner=lease.owner if lease is not None else None,
+        lease_seconds=lease.lease_seconds if lease is not None else None
+    )
+    if lease is not None:
+        lease.renewed()
+    # Updated only after the transaction succeeded, so it never points to rolled back rows
+    detection_map.update(new_tracks)
+    return detection_map
+
+def process_segment(video_path, start_frame, end_frame, yolo_handler, stop_event, skip_frames=True, num_of_skip_frames=5, tracking=True, confidence_threshold=0.25, recorder=None, keyframes=None):
+    cap = open_video_at(video_path, start_frame, keyframes)  # Positioned on the start of segment
     detections = []
+    frames_decoded = 0
+    model_invocations = 0
 
     for frame_idx in range(start_frame, end_frame):
         if stop_event.is_set():
@@ -123,11 +254,13 @@ def process_segment(video_path, start_frame, end_frame, yolo_handler, stop_event
         ret, frame = cap.read()
         if not ret:
             break
+        frames_decoded += 1
         
         # Process every nth frame
         if skip_frames == True and (frame_idx % num_of_skip_frames != 0): 
             continue
         
+        model_invocations += 1
         if tracking:
             frame_detections = yolo_handler.track(frame, confidence_threshold=confidence_threshold)
         else:
@@ -150,54 +283,106 @@ def process_segment(video_path, start_frame, end_frame, yolo_handler, stop_event
                   })
 
     cap.release()
+    if recorder is not None:
+        recorder.add(frames_decoded=frames_decoded, model_invocations=model_invocations)
     return detections
 
 
-def main(video_path, num_segments, processing_mode, model_path, classes_to_detect, name_of_analysis, skip_frames, num_of_skip_frames, confidence_threshold):
+def main(video_path, num_segments, processing_mode, model_path, classes_to_detect, name_of_analysis, skip_frames, num_of_skip_frames, confidence_threshold, profile=False, resume=True, video_filename=None):
     # Initialization of the database manager
     db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    
-    try:
-        db_manager.connect()
-        db_manager.create_tables()
-        video_id = db_manager.insert_video(video_path, name_of_analysis)
-
-        start_time = time.time()
+    video_id = None
 
-        segments = split_video(video_path, num_segments)
+    # The video id is known only after the video is inserted, the metrics are stored on exit
+    with StageRecorder("object_detection_processor") as recorder, StageProfiler(recorder, profile) as profiler:
+        recorder.track_db(db_manager)
+        recorder.detail(processing_mode=processing_mode, num_segments=num_segments, skip_frames=skip_frames, num_of_skip_frames=num_of_skip_frames)
 
         try:
-            print("\nThe detection has started.")
-            
-            if processing_mode == 'parallel':
-                all_detections = process_segments_parallel(
-                    video_path, segments, model_path, classes_to_detect, db_manager, video_id, skip_frames, num_of_skip_frames, confidence_threshold
-                )
-
-        except DetectionInterruptedError as e:
-            print("\nThe detection was manually interrupted. Shutting down the program.")
-        except KeyboardInterrupt:
-            print("\nThe detection was manually interrupted. Shutting down the program.")
+            db_manager.connect()
+            db_manager.create_tables()
+
+            # An unfinished run of the same video with the same settings is resumed (or discarded without resume)
+            run_key = detection_run_key(video_path, model_path, classes_to_detect, skip_frames, num_of_skip_frames, confidence_threshold)
+            # Runs held by a live process (e.g. the same video in another experiment worker) are never taken over
+            lease = DetectionLease(db_manager, f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}")
+            if resume:
+                video_id = db_manager.claim_incomplete_detection_run(run_key, lease.owner, lease.lease_seconds)
+            else:
+                discarded = db_manager.delete_incomplete_detection_runs(run_key)
+                if discarded:
+                    print(f"Discarded unfinished detection runs of videos {discarded}.")
+
+            if video_id is None:
+                video_id = db_manager.insert_video(video_path, name_of_analysis, detection_key=run_key,
+                                                   lease_owner=lease.owner, lease_seconds=lease.lease_seconds,
+                                                   video_filename=video_filename)
+            else:
+                print(f"Resuming the unfinished detection of video {video_id}.")
+            lease.video_id = video_id
+            lease.renewed()
+            recorder.video_id = video_id
+
+            start_time = time.time()
+            detection_status = 'failed'
+
+            # Keyframe index stored at insert_video, chunks start on keyframes and workers seek with it
+            keyframes = db_manager.fetch_video_keyframes(video_id)
+            chunks = split_video_into_chunks(video_path, DETECTION_CHUNK_SECONDS, keyframes)
+
+            # Only the chunks without a checkpoint are processed
+            checkpoints = db_manager.fetch_detection_checkpoints(video_id)
+            stored_chunks = {(checkpoint['start_frame'], checkpoint['end_frame']) for checkpoint in checkpoints}
+            missing_chunks = [chunk for chunk in chunks if chunk not in stored_chunks]
+            recorder.detail(chunks=len(chunks), resumed_chunks=len(chunks) - len(missing_chunks))
+
+            try:
+                print("\nThe detection has started.")
+                
+                if processing_mode == 'parallel':
+                    # num_segments is the number of workers, the chunks are distributed among them dynamically
+                    all_detections = process_chunks_parallel(
+                        video_path, missing_chunks, model_path, classes_to_detect, db_manager, video_id, skip_frames, num_of_skip_frames, confidence_threshold, num_segments, recorder, profiler.directory, keyframes,
+                        checkpoints, db_manager.fetch_detection_track_map(video_id), lease
+                    )
+                    recorder.detail(detections=sum(len(detections) for detections in all_detections))
+
+                # A chunk that failed has no checkpoint, the next run with the same settings retries it
+                checkpoints = db_manager.fetch_detection_checkpoints(video_id)
+                detection_status = 'completed' if len(checkpoints) >= len(chunks) else 'failed'
+
+            except DetectionInterruptedError as e:
+                detection_status = 'interrupted'
+                print("\nThe detection was manually interrupted. Shutting down the program.")
+            except KeyboardInterrupt:
+                detection_status = 'interrupted'
+                print("\nThe detection was manually interrupted. Shutting down the program.")
+            except DetectionLeaseLost as e:
+                print(f"{e} The detection was stopped, the process holding the run continues it.")
+            except Exception as e:
+                print(f"An unexpected error occurred: {e}")
+            finally:
+                # Not stored if another process took the run over meanwhile
+                db_manager.finish_detection_run(video_id, lease.owner, detection_status)
+                if detection_status != 'completed':
+                    print(f"The detection of video {video_id} is {detection_status}, run it again with the same settings to resume it.")
+                end_time = time.time()
+                elapsed_time = end_time - start_time
+                print(f"Program finished. It took {elapsed_time:.2f} seconds.")
+
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            print(f"Database error: {e}")
+        
         finally:
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            print(f"Program finished. It took {elapsed_time:.2f} seconds.")
-
-    except Exception as e:
-        print(f"Database error: {e}")
-    
-    finally:
-        db_manager.close()
-        return video_id
+            db_manager.close()
+            return video_id
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="YOLO video processing with segment-based detection.")
     parser.add_argument("--video_path", type=str, required=True, help="Path to the input video.")
     parser.add_argument("--model_path", type=str, required=True, help="Path to the YOLO model.")
-    parser.add_argument("--num_segments", type=int, default=8, help="Number of segments to split the video into.")
+    parser.add_argument("--num_segments", type=int, default=8, help="Number of detection workers (the video is split into short chunks they share).")
     parser.add_argument("--processing_mode", type=str, choices=["parallel", "sequential"], default="parallel",
                         help="Processing mode: parallel or sequential.")
     parser.add_argument("--classes_to_detect", type=int, nargs="+", default=[0],
@@ -210,6 +395,10 @@ if __name__ == "__main__":
                         help="Number of frames to skip if skipping is enabled.")
     parser.add_argument("--confidence_threshold", type=float, default=0.25,
                         help="Minimum confidence score to accept detections.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Store cProfile and torch profiler artifacts of the run.")
+    parser.add_argument("--no_resume", action="store_true",
+                        help="Discard an unfinished run of the same video and settings instead of resuming it.")
 
     args = parser.parse_args()
 
@@ -222,5 +411,7 @@ if __name__ == "__main__":
         args.name_of_analysis,
         args.skip_frames,
         args.num_of_skip_frames,
-        args.confidence_threshold
+        args.confidence_threshold,
+        args.profile,
+        not args.no_resume
     )
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+overlay_export.py
+
+Exports the detections and anomalies of a video as compact overlay data, so the frontend can draw
+them over the original video itself and server-side rendering is only needed for downloads.
+
+Output in data/output/{video_id}/overlay/:
+- anomalies.vtt: WebVTT metadata track, one cue per anomalous detection with its top label and score as JSON.
+- boxes.npz: the arrays of a `FrameBoxIndex` (bounding boxes of all frames, sorted by frame). `frame_ids` lists
+  the frames that have boxes, the boxes of `frame_ids[i]` are rows `offsets[i]:offsets[i + 1]` of `boxes`,
+  `detection_ids` and `track_ids`.
+- thumbnails.jpg + thumbnails.vtt: low-resolution sprite sheet of the video and the WebVTT track that maps
+  time ranges to its tiles (`thumbnails.jpg#xywh=x,y,w,h`), as used by video players for seek previews.
+
+Functions:
+- format_vtt_timestamp: formats seconds as a WebVTT timestamp.
+- write_anomaly_track: writes the WebVTT track of the anomalies.
+- write_box_index: writes the frame-sorted bounding boxes as a NumPy archive.
+- write_thumbnail_sprite: samples thumbnails from the video and writes the sprite and its WebVTT track.
+- export_overlay: loads the video data from the database and writes all of the above.
+"""
+
+import json
+import math
+import os
+
+import cv2
+import numpy as np
+
+from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.frame_box_index import FrameBoxIndex
+from backend.app.core.instrumentation import StageRecorder
+
+OVERLAY_FILES = ("anomalies.vtt", "boxes.npz", "thumbnails.jpg", "thumbnails.vtt")
+
+def format_vtt_timestamp(seconds: float) -> str:
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+def write_anomaly_track(anomalies, fps, output_path) -> int:
+    """Writes one cue per anomaly (end frame inclusive). Returns the number of cues."""
+    lines = ["WEBVTT", ""]
+    for anomaly in sorted(anomalies, key=lambda anomaly: (anomaly["start_frame"], anomaly["id"])):
+        lines.append(f"detection-{anomaly['id']}")
+        lines.append(f"{format_vtt_timestamp(anomaly['start_frame'] / fps)} --> {format_vtt_timestamp((anomaly['end_frame'] + 1) / fps)}")
+        lines.append(json.dumps({
+            "detection_id": anomaly["id"],
+            "start_frame": anomaly["start_frame"],
+            "end_frame": anomaly["end_frame"],
+            "label": anomaly["top_anomaly_label"],
+            "score": float(anomaly["top_anomaly_score"])
+        }))
+        lines.append("")
+
+    with open(output_path, "w") as file:
+        file.write("\n".join(lines))
+    return len(anomalies)
+
+def write_box_index(bounding_boxes, fps, width, height, output_path) -> int:
+    """Writes the boxes (rows of `fetch_bounding_boxes_by_video_id`) as a `FrameBoxIndex`. Returns their number."""
+    index = FrameBoxIndex.from_bounding_boxes(bounding_boxes)
+    np.savez_compressed(
+        output_path,
+        **index.to_arrays(),
+        fps=np.float32(fps),
+        frame_size=np.array([width, height], dtype=np.int32)
+    )
+    return len(index)
+
+def write_thumbnail_sprite(video_path, sprite_path, track_path, interval_seconds=5.0, thumbnail_width=160, columns=10) -> int:
+    """Writes a thumbnail every `interval_seconds` into the sprite and its WebVTT track. Returns the number of thumbnails."""
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    thumbnail_height = max(1, int(round(height * thumbnail_width / max(width, 1))))
+    step = max(1, int(round(interval_seconds * fps)))
+
+    thumbnails = []
+    frame_id = 0
+    # Frames between the samples are only grabbed, not converted to images
+    while cap.grab():
+        if frame_id % step == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            thumbnails.append(cv2.resize(frame, (thumbnail_width, thumbnail_height), interpolation=cv2.INTER_AREA))
+        frame_id += 1
+    cap.release()
+
+    if not thumbnails:
+        return 0
+
+    columns = min(columns, len(thumbnails))
+    rows = math.ceil(len(thumbnails) / columns)
+    sprite = np.zeros((rows * thumbnail_height, columns * thumbnail_width, 3), dtype=np.uint8)
+
+    sprite_name = os.path.basename(sprite_path)
+    lines = ["WEBVTT", ""]
+    for index, thumbnail in enumerate(thumbnails):
+        x = (index % columns) * thumbnail_width
+        y = (index // columns) * thumbnail_height
+        sprite[y:y + thumbnail_height, x:x + thumbnail_width] = thumbnail
+
+        start = index * step / fps
+        end = min((index + 1) * step, frame_id) / fps
+        lines.append(f"{format_vtt_timestamp(start)} --> {format_vtt_timestamp(end)}")
+        lines.append(f"{sprite_name}#xywh={x},{y},{thumbnail_width},{thumbnail_height}")
+        lines.append("")
+
+    cv2.imwrite(sprite_path, sprite, [cv2.IMWRITE_JPEG_QUALITY, 70])
+    with open(track_path, "w") as file:
+        file.write("\n".join(lines))
+    return len(thumbnails)
+
+def export_overlay(video_id: int, thumbnail_interval_seconds=5.0, thumbnail_width=160, sprite_columns=10) -> dict:
+    """Writes the overlay files of the video. Returns their paths relative to the project root."""
+    db = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
+
+    with StageRecorder("overlay_export", video_id) as recorder:
+        recorder.track_db(db)
+        db.connect()
+
+        video_path = db.fetch_video_path(video_id)
+        if not video_path or not os.path.exists(video_path):
+            db.close()
+            raise FileNotFoundError(f"Video not found: {video_path}")
+
+        anomalies = db.fetch_anomalies_by_video_id(video_id)
+        bounding_boxes = db.fetch_bounding_boxes_by_video_id(video_id)
+        db.close()
+
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+        output_dir = f"../data/output/{video_id}/overlay"
+        os.makedirs(output_dir, exist_ok=True)
+        paths = {name: os.path.join(output_dir, name) for name in OVERLAY_FILES}
+
+        cues = write_anomaly_track(anomalies, fps, paths["anomalies.vtt"])
+        boxes = write_box_index(bounding_boxes, fps, width, height, paths["boxes.npz"])
+        thumbnails = write_thumbnail_sprite(video_path, paths["thumbnails.jpg"], paths["thumbnails.vtt"],
+                                            thumbnail_interval_seconds, thumbnail_width, sprite_columns)
+
+        written = {name: path for name, path in paths.items() if os.path.exists(path)}
+        recorder.add(bytes_written=sum(os.path.getsize(path) for path in written.values()))
+        recorder.detail(anomaly_cues=cues, bounding_boxes=boxes, thumbnails=thumbnails)
+        print(f"✅ Overlay with {cues} anomaly cues, {boxes} boxes and {thumbnails} thumbnails saved to {output_dir}")
+
+    return {name: path.removeprefix("../") for name, path in written.items()}
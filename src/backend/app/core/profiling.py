@@ -0,0 +1,154 @@
+"""
+profiling.py
+
+Opt-in profiling of pipeline stages.
+
+A `StageProfiler` wraps one stage next to its `StageRecorder`. When enabled it runs cProfile in the
+calling thread, and the stage passes its directory to the code running elsewhere:
+- threads (detection segments) wrap their work in `profile_block`,
+- multiprocessing pool workers are started with `init_profiling_worker` and wrap every task in
+  `worker_profile_block`, so each task writes its own profile,
+- model calls are wrapped in `torch_trace`, which writes a torch profiler (Chrome) trace.
+
+On exit the profiles of all threads and processes are merged into a text summary sorted by
+cumulative time and every file is registered in the `profile_artifacts` table under the video
+and the run id of the stage. The files are stored in data/output/profiles/{run_id}/{stage}/.
+
+Functions:
+- StageProfiler: profiles one stage and registers its artifacts.
+- profile_block: cProfile of a block of code in the current thread.
+- torch_trace: torch profiler trace of a block of code.
+- init_profiling_worker / worker_profile_block: profiling inside multiprocessing pool workers.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from backend.app.core.database_manager import DatabaseManager
+
+# Base directory = root of the project (assuming this script is in diploma-thesis-prototype/src/backend/app/core/)
+BASE_DIR = Path(__file__).resolve().parents[4]
+
+SUMMARY_LINES = 60
+
+# Set in pool worker processes by `init_profiling_worker`, None in the API process
+_worker_profile_dir = None
+
+ARTIFACT_KINDS = {".prof": "cprofile", ".json": "torch_trace", ".txt": "summary"}
+
+def _profile_path(directory, name, extension):
+    return os.path.join(directory, f"{name}_{os.getpid()}_{threading.get_ident()}{extension}")
+
+@contextmanager
+def profile_block(directory, name):
+    """cProfile of the current thread, written to `directory`. No-op if `directory` is None."""
+    if directory is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows only one active cProfile per process, the block stays unprofiled
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(_profile_path(directory, name, ".prof"))
+
+@contextmanager
+def torch_trace(directory, name):
+    """Torch profiler trace of the model calls made in the block. No-op if `directory` is None."""
+    if directory is None:
+        yield
+        return
+
+    from torch.profiler import ProfilerActivity, profile
+
+    with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as trace:
+        yield
+    trace.export_chrome_trace(_profile_path(directory, name, ".json"))
+
+def init_profiling_worker(directory):
+    global _worker_profile_dir
+    _worker_profile_dir = directory
+
+def worker_profile_block(name):
+    # Tasks executed in the parent process (sequential mode) are covered by the stage profile
+    if _worker_profile_dir is None:
+        return nullcontext()
+    return profile_block(_worker_profile_dir, name)
+
+def worker_profile_dir():
+    return _worker_profile_dir
+
+
+class StageProfiler:
+    def __init__(self, recorder, enabled=False):
+        self.recorder = recorder
+        self.enabled = enabled
+        self.directory = None
+        self.artifacts = []
+        self._main_block = None
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+
+        relative_directory = Path("data/output/profiles") / self.recorder.run_id / self.recorder.stage
+        self.directory = str(BASE_DIR / relative_directory)
+        os.makedirs(self.directory, exist_ok=True)
+        print(f"🔬 Profiling stage '{self.recorder.stage}' into {relative_directory}")
+
+        self._main_block = profile_block(self.directory, "main")
+        self._main_block.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if not self.enabled:
+            return False
+
+        self._main_block.__exit__(None, None, None)
+        self._write_summary()
+
+        self.artifacts = [
+            (ARTIFACT_KINDS.get(path.suffix, "other"), os.path.relpath(path, BASE_DIR), path.stat().st_size)
+            for path in sorted(Path(self.directory).iterdir())
+        ]
+        self.recorder.detail(profile_dir=os.path.relpath(self.directory, BASE_DIR))
+
+        if self.recorder.video_id is not None:
+            self._save()
+        return False
+
+    def _write_summary(self):
+        profiles = sorted(str(path) for path in Path(self.directory).glob("*.prof"))
+        if not profiles:
+            return
+
+        # Threads and pool workers are merged into one view of the stage
+        stream = io.StringIO()
+        stats = pstats.Stats(*profiles, stream=stream)
+        stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        with open(os.path.join(self.directory, "summary.txt"), "w") as summary:
+            summary.write(f"Merged profiles: {len(profiles)}\n")
+            summary.write(stream.getvalue())
+
+    def _save(self):
+        db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
+        try:
+            db_manager.connect()
+            db_manager.insert_profile_artifacts(self.recorder.video_id, self.recorder.run_id, self.recorder.stage, self.artifacts)
+        except Exception as e:
+            print(f"Database error: {e}")
+        finally:
+            if db_manager.connection_pool is not None:
+                db_manager.close()
@@ -0,0 +1,121 @@
+"""
+prometheus_metrics.py
+
+Prometheus metrics of the backend, exposed by `GET /metrics` in `main.py`.
+
+Hot-path instrumentation is limited to counter increments and histogram observations; values that
+can be read from existing state (connection pool occupancy) are collected only when `/metrics` is
+scraped. Model inference in the multiprocessing pool workers is included when the backend is started
+with `PROMETHEUS_MULTIPROC_DIR` pointing to an empty, writable directory (prometheus_client
+multiprocess mode); otherwise only the metrics of the API process are reported.
+
+Metrics:
+- backend_request_duration_seconds{router, method, route, status}: HTTP request latency per router.
+- backend_pipeline_jobs_in_flight / backend_pipeline_jobs_queued: jobs running on / waiting for the pipeline executor.
+- backend_db_pool_connections{state}: size, idle and maximum connections of the async database pool.
+- backend_model_inference_seconds{model}: latency of a single YOLO or XCLIP forward pass.
+- backend_pipeline_stage_duration_seconds{stage}: wall time of a pipeline stage.
+- backend_frames_processed_total{stage}: decoded frames per stage, `rate()` of it gives frames/sec.
+
+Functions:
+- PrometheusMiddleware: ASGI middleware measuring the request latency.
+- register_router: assigns the routes of an API router to a router label.
+- render_metrics: returns the metrics in the Prometheus text format.
+"""
+
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+MULTIPROCESS_MODE = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUEST_LATENCY = Histogram(
+    "backend_request_duration_seconds", "HTTP request latency",
+    ["router", "method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+)
+PIPELINE_JOBS_IN_FLIGHT = Gauge(
+    "backend_pipeline_jobs_in_flight", "Jobs running on the pipeline executor", multiprocess_mode="livesum"
+)
+PIPELINE_JOBS_QUEUED = Gauge(
+    "backend_pipeline_jobs_queued", "Jobs waiting for a free pipeline executor worker", multiprocess_mode="livesum"
+)
+MODEL_INFERENCE_LATENCY = Histogram(
+    "backend_model_inference_seconds", "Latency of one model forward pass", ["model"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+STAGE_DURATION = Histogram(
+    "backend_pipeline_stage_duration_seconds", "Wall time of a pipeline stage", ["stage"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+FRAMES_PROCESSED = Counter(
+    "backend_frames_processed_total", "Frames decoded by the pipeline stages", ["stage"]
+)
+
+# Route endpoint -> router label, filled by `register_router` when the routers are included
+_router_names = {}
+
+def register_router(name, router):
+    for route in router.routes:
+        endpoint = getattr(route, "endpoint", None)
+        if endpoint is not None:
+            _router_names[endpoint] = name
+
+
+class PrometheusMiddleware:
+    """Plain ASGI middleware, cheaper than `BaseHTTPMiddleware` and safe for streamed responses."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The matched route is stored in the scope by the router, its path template keeps the label set small
+            route = scope.get("route")
+            router = _router_names.get(getattr(route, "endpoint", None), "other")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_LATENCY.labels(router, scope["method"], path, str(status["code"])).observe(time.perf_counter() - start_time)
+
+
+class DatabasePoolCollector:
+    """Reads the async connection pool only when the metrics are scraped."""
+    def describe(self):
+        # Registering must not call `collect`, see the import below
+        return [GaugeMetricFamily("backend_db_pool_connections", "Connections of the async database pool", labels=["state"])]
+
+    def collect(self):
+        # Imported here, so pipeline worker processes do not import asyncpg for their metrics
+        from backend.app.core.async_database_manager import get_async_db_pool_stats
+
+        family = GaugeMetricFamily("backend_db_pool_connections", "Connections of the async database pool", labels=["state"])
+        for state, value in get_async_db_pool_stats().items():
+            family.add_metric([state], value)
+        yield family
+
+if not MULTIPROCESS_MODE:
+    REGISTRY.register(DatabasePoolCollector())
+
+def render_metrics() -> bytes:
+    if MULTIPROCESS_MODE:
+        # Metrics of all processes are merged from the files in PROMETHEUS_MULTIPROC_DIR
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        registry.register(DatabasePoolCollector())
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,120 @@
+"""
+result_cache.py
+
+In-process read-through cache for per-video result payloads (video metadata, detections with anomalies).
+
+Once an analysis is finished these payloads do not change, so dashboard views can be served from
+memory instead of PostgreSQL. The cache is bounded by the number of entries (least recently used
+entries are evicted first) and entries can optionally expire after a TTL. Entries of a video are
+invalidated whenever its data is rewritten (detection, re-interpretation) or deleted. Every invalidation
+bumps the generation of the video, a load that started before it does not store its (stale) result.
+
+Configuration (environment variables):
+- RESULT_CACHE_MAX_ENTRIES: maximum number of cached payloads (default 256, 0 disables the cache).
+- RESULT_CACHE_TTL_SECONDS: optional time-to-live of a cached payload in seconds.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    def __init__(self, max_entries=256, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # (kind, video_id) -> (payload, stored_at)
+        self._lock = threading.Lock()
+        self._generations = {}  # video_id -> number of invalidations of the video
+        self._clears = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Returns (True, payload) on a hit and (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                payload, stored_at = entry
+                if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                    del self._entries[key]
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, payload
+            self.misses += 1
+            return False, None
+
+    def generation(self, video_id):
+        """Changes whenever the entries of the video are invalidated (or the cache is cleared)."""
+        with self._lock:
+            return self._clears, self._generations.get(video_id, 0)
+
+    def set(self, key, payload, generation=None):
+        """Stores the payload. With `generation` (see `generation`) it is skipped if the video was invalidated since."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != (self._clears, self._generations.get(key[1], 0)):
+                return
+            self._entries[key] = (payload, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def get_or_load(self, key, loader):
+        """Returns the cached payload for `key`, or awaits `loader()` and caches its (non-empty) result."""
+        found, payload = self.get(key)
+        if found:
+            return payload
+
+        # An invalidation while the load is in flight means the loaded payload may already be stale
+        generation = self.generation(key[1])
+        payload = await loader()
+        # Missing videos are not cached, they may be created later
+        if payload:
+            self.set(key, payload, generation)
+        return payload
+
+    def invalidate_video(self, video_id: int):
+        with self._lock:
+            self._generations[video_id] = self._generations.get(video_id, 0) + 1
+            keys = [key for key in self._entries if key[1] == video_id]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._clears += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+
+_ttl = os.environ.get("RESULT_CACHE_TTL_SECONDS")
+
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 256)),
+    ttl_seconds=float(_ttl) if _ttl else None
+)
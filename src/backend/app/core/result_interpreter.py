@@ -4,10 +4,15 @@ result_interpreter.py
 This script interprets anomaly recognition results by mapping logits to category labels and
 saving those exceeding a threshold to the database.
 
+All detections of a video (or of a batch of videos) are interpreted at once: their logits are
+stacked into one matrix, top-k and the threshold mask are computed in a single tensor operation
+and the resulting anomaly rows are written with one bulk insert.
+
 Functions:
-- get_logits_per_video: retrieves logits for each detection from the database.
+- get_logits_per_video: loads the logits matrices of the given videos and stacks them.
 - get_probs: converts logits to probabilities using softmax.
-- save_anomalies: saves top-k high-confidence anomalies to the database.
+- interpret_logits: computes the top-k anomalies above the threshold for every row of a logits matrix.
+- save_anomalies: replaces the anomalies of the videos with the interpreted ones.
 - main: orchestrates the result interpretation pipeline.
 """
 
@@ -16,56 +21,59 @@ import argparse
 import torch
 import numpy as np
 from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.logits_store import load_experiment_logits
+from backend.app.core.instrumentation import StageRecorder
 import json
 
-def get_logits_per_video(db_manager: DatabaseManager, video_id):
+def get_logits_per_video(db_manager: DatabaseManager, video_ids):
+    detection_ids = np.empty(0, dtype=np.int64)
+    logits_matrix = torch.empty((0, 0), dtype=torch.float32)
     try:
         db_manager.connect()
-        logits_per_video_binary_map = db_manager.get_anomaly_recognition_data_by_video_id(video_id)
-        logits_per_video_map = []
-        for data in logits_per_video_binary_map:
-            logits_tensor = torch.tensor(np.frombuffer(data['logits_per_video'], dtype=np.float32))
-            logits_per_video_map.append({
-                'detection_id': data['detection_id'],
-                'logits_per_video': logits_tensor
-            })
+        video_logits = load_experiment_logits(db_manager, video_ids)
+        if video_logits:
+            # One read per video, then a single matrix for all detections
+            detection_ids = np.concatenate([data['detection_ids'] for data in video_logits.values()])
+            logits_matrix = torch.from_numpy(np.concatenate(
+                [np.asarray(data['logits'], dtype=np.float32) for data in video_logits.values()]
+            ))
     except Exception as e:
         print(f"Database error: {e}")
+        # Signal the failure, so existing anomalies are not replaced by an empty result
+        logits_matrix = None
     finally:
         db_manager.close()
-        return logits_per_video_map
-    
-
-def get_probs(logits):
-    result = []
-    for data in logits:
-            result.append({
-                'detection_id': data['detection_id'],
-                'logits_per_video': data['logits_per_video'].softmax(dim=0) * 100
-            })
-    return result
-
-def save_anomalies(threshold, list_of_categories, db_manager: DatabaseManager, logits, topk_a):
-    try:
-        db_manager.connect()
-        for value in logits:
-            logits_tensor = value['logits_per_video']
-            detection_id = int(value['detection_id'])
+        return detection_ids, logits_matrix
+
 
-            topk = min(topk_a, logits_tensor.shape[0])
-            top_scores, top_indices = logits_tensor.topk(topk)
+def get_probs(logits_matrix):
+    return logits_matrix.softmax(dim=1) * 100
 
-            anomalies = []
-            for score, index in zip(top_scores, top_indices):
-                if score.item() >= threshold:
-                    anomalies.append({
-                        "label": list_of_categories[index.item()],
-                        "score": score.item()
-                    })
+def interpret_logits(logits_matrix, detection_ids, list_of_categories, threshold, topk_a):
+    """Returns (detection_id, label, score) rows, ordered by detection and descending score."""
+    if logits_matrix.shape[0] == 0:
+        return []
 
-            if anomalies:
-                db_manager.insert_detection_anomalies(detection_id, anomalies)
+    topk = min(topk_a, logits_matrix.shape[1])
+    top_scores, top_indices = logits_matrix.topk(topk, dim=1)
 
+    # Keep only the top-k scores that reach the threshold
+    rows, columns = (top_scores >= threshold).nonzero(as_tuple=True)
+    scores = top_scores[rows, columns].tolist()
+    indices = top_indices[rows, columns].tolist()
+    row_detection_ids = np.asarray(detection_ids)[rows.numpy()].tolist()
+
+    return [
+        (detection_id, list_of_categories[index], score)
+        for detection_id, index, score in zip(row_detection_ids, indices, scores)
+    ]
+
+def save_anomalies(threshold, list_of_categories, db_manager: DatabaseManager, video_ids, detection_ids, logits_matrix, topk_a):
+    try:
+        db_manager.connect()
+        anomalies = interpret_logits(logits_matrix, detection_ids, list_of_categories, threshold, topk_a)
+        # Re-interpretation replaces previous anomalies of the videos instead of appending to them
+        db_manager.replace_detection_anomalies_for_videos(video_ids, anomalies)
     except Exception as e:
         print(f"Database error: {e}")
     finally:
@@ -78,30 +86,40 @@ def main(video_id, threshold, categories_json, topk):
     db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
 
     list_of_categories = categories_json
+    # A single video or a batch of videos can be interpreted at once
+    video_ids = list(video_id) if isinstance(video_id, (list, tuple)) else [video_id]
+
+    # Metrics of a batch are only printed, they cannot be attributed to one video
+    with StageRecorder("result_interpreter", video_ids[0] if len(video_ids) == 1 else None) as recorder:
+        recorder.track_db(db_manager)
+        recorder.detail(threshold=threshold, top_k=topk, videos=len(video_ids))
+
+        start_time = time.time()
 
-    start_time = time.time()
-    
-    # Retrieve raw logits for each detection
-    logits_per_video = get_logits_per_video(db_manager, video_id)
-    # probs = get_probs(logits_per_video)
-    
-    # Save top-k anomalies that exceed the threshold
-    save_anomalies(threshold, list_of_categories, db_manager, logits_per_video, topk)
-    
-    end_time = time.time()
-    elapsed_time = end_time - start_time
+        # Retrieve raw logits of all detections as one matrix
+        detection_ids, logits_matrix = get_logits_per_video(db_manager, video_ids)
+        # probs = get_probs(logits_matrix)
 
-    # Print execution time summary
-    print(f"Program finished. It took {elapsed_time:.2f} seconds.")
+        # Save top-k anomalies that exceed the threshold
+        if logits_matrix is not None:
+            save_anomalies(threshold, list_of_categories, db_manager, video_ids, detection_ids, logits_matrix, topk)
+            recorder.detail(detections=len(detection_ids))
+
+        end_time = time.time()
+        elapsed_time = end_time - start_time
+
+        # Print execution time summary
+        print(f"Program finished. It took {elapsed_time:.2f} seconds.")
 
 
 if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Run Result Interpreter")
-    parser.add_argument('--video_id', required=True, type=int, help="ID of video source in database")
+    parser.add_argument('--video_id', required=True, type=int, nargs="+", help="ID(s) of video sources in database")
     parser.add_argument('--threshold', required=True, type=int, help="Threshold when anomaly is considered like detected")
     parser.add_argument('--categories_json', required=True, type=str, help="Path to the JSON file containing categories")
-    
+    parser.add_argument('--top_k', type=int, default=5, help="Number of top categories considered per detection")
+
     args = parser.parse_args()
 
-    main(args.video_id, args.threshold, args.categories_json)
\ No newline at end of file
+    main(args.video_id, args.threshold, args.categories_json, args.top_k)
@@ -0,0 +1,275 @@
+"""
+stage_cache.py
+
+Content-addressed cache of the stages of the full analysis pipeline.
+
+Every stage gets a key derived from the key of the previous stage and its own parameters:
+- detection: sha256 of the video file, sha256 of the YOLO model and the detection parameters,
+- crops: detection key + preprocessing parameters,
+- logits: crops key + categories, batch size, frame sample rate and the XCLIP model,
+- interpretation: logits key + threshold and top_k.
+
+Detection and crops live in the database and in `data/output/{video_id}`, so their entries only point
+to the video that holds them (and are validated on lookup). Logits matrices and interpreted anomaly
+rows are copied into the cache directory, so switching back to previously used categories or thresholds
+does not require re-running XCLIP. The files owned by the cache are bounded by size, least recently
+used entries are evicted first.
+
+The cache directory may be shared by several processes (backend, experiment workers). Every operation holds an
+`flock` of `index.lock` and reads the index from disk, the index itself is replaced atomically. Lookups only touch
+the files of the entry (their modification time is the recency used by the eviction) instead of rewriting the index.
+A file evicted by another process between a lookup and its load is a cache miss.
+
+Configuration (environment variables):
+- STAGE_CACHE_ENABLED: set to 0 to disable the cache (default 1).
+- STAGE_CACHE_DIR: directory of the cache (default data/cache in the project root).
+- STAGE_CACHE_MAX_BYTES: maximum size of the cached files (default 5 GiB).
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# Base directory = root of the project (assuming this script is in diploma-thesis-prototype/src/backend/app/core/)
+BASE_DIR = Path(__file__).resolve().parents[4]
+
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = "index.lock"
+
+
+def _hash_parts(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    def __init__(self, cache_dir, max_bytes, enabled=True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    # Index
+
+    def _index_path(self):
+        return self.cache_dir / INDEX_FILENAME
+
+    def _read_index(self):
+        try:
+            with open(self._index_path(), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"entries": {}, "file_hashes": {}}
+
+    def _save_index(self, index):
+        temporary_path = self._index_path().with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "w") as f:
+            json.dump(index, f)
+        os.replace(temporary_path, self._index_path())
+
+    @contextmanager
+    def _locked_index(self, shared=False):
+        """Yields the index read from disk while holding the lock of the cache directory (exclusive unless `shared`)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock, open(self.cache_dir / LOCK_FILENAME, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield self._read_index()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Keys
+
+    def file_hash(self, path) -> str:
+        """sha256 of a file, memoized by (path, size, mtime) so unchanged files are read only once."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._locked_index(shared=True) as index:
+            known = index["file_hashes"].get(path)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+
+        with self._locked_index() as index:
+            index["file_hashes"][path] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": digest.hexdigest()
+            }
+            self._save_index(index)
+        return digest.hexdigest()
+
+    def detection_key(self, video_path, model_path, classes_to_detect, skip_frames, num_of_skip_frames, confidence_threshold):
+        # The number of detection workers does not change the results and is not part of the key
+        return _hash_parts(
+            "detection", self.file_hash(video_path), self.file_hash(model_path),
+            sorted(classes_to_detect), skip_frames, num_of_skip_frames, confidence_threshold
+        )
+
+    @staticmethod
+    def crops_key(detection_key, max_frames, target_width, target_height):
+        return _hash_parts("crops", detection_key, max_frames, target_width, target_height)
+
+    @staticmethod
+    def logits_key(crops_key, categories, batch_size, frame_sample_rate, model_name):
+        return _hash_parts("logits", crops_key, list(categories), batch_size, frame_sample_rate, model_name)
+
+    @staticmethod
+    def interpretation_key(logits_key, threshold, top_k):
+        return _hash_parts("interpretation", logits_key, threshold, top_k)
+
+    # Entries
+
+    def get(self, key):
+        """Returns the entry stored under `key` (and marks it as recently used), or None."""
+        if not self.enabled:
+            return None
+        with self._locked_index(shared=True) as index:
+            entry = index["entries"].get(key)
+        if entry is not None:
+            self._touch(entry)
+        return entry
+
+    def put(self, key, stage, payload, files=()):
+        """Stores an entry. `files` are paths (relative to the cache directory) owned by the entry."""
+        if not self.enabled:
+            return
+        with self._locked_index() as index:
+            size = sum((self.cache_dir / f).stat().st_size for f in files if (self.cache_dir / f).exists())
+            index["entries"][key] = {
+                "stage": stage,
+                "payload": payload,
+                "files": list(files),
+                "bytes": size,
+                "last_used": time.time()
+            }
+            self._evict(index, keep=key)
+            self._save_index(index)
+
+    def discard(self, key):
+        with self._locked_index() as index:
+            entry = index["entries"].pop(key, None)
+            if entry is not None:
+                self._remove_files(entry)
+                self._save_index(index)
+
+    def _touch(self, entry):
+        for f in entry["files"]:
+            try:
+                os.utime(self.cache_dir / f)
+            except FileNotFoundError:
+                pass
+
+    def _last_used(self, entry):
+        # Lookups touch the files instead of updating the index
+        last_used = entry["last_used"]
+        for f in entry["files"]:
+            try:
+                last_used = max(last_used, os.stat(self.cache_dir / f).st_mtime)
+            except FileNotFoundError:
+                pass
+        return last_used
+
+    def _remove_files(self, entry):
+        for f in entry["files"]:
+            try:
+                os.remove(self.cache_dir / f)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, index, keep=None):
+        entries = index["entries"]
+        total = sum(entry["bytes"] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: self._last_used(entries[k])):
+            if total <= self.max_bytes:
+                break
+            if key == keep or entries[key]["bytes"] == 0:
+                continue
+            total -= entries[key]["bytes"]
+            self._remove_files(entries.pop(key))
+
+    def discard_video(self, video_id: int):
+        """Drops all entries that point to a (deleted) video."""
+        with self._locked_index() as index:
+            entries = index["entries"]
+            keys = [key for key, entry in entries.items() if entry["payload"].get("video_id") == video_id]
+            for key in keys:
+                self._remove_files(entries.pop(key))
+            if keys:
+                self._save_index(index)
+
+    # Stored stage outputs
+
+    def put_logits(self, key, video_id, logits_path, detection_ids, categories):
+        if not self.enabled or not os.path.exists(logits_path):
+            return
+        relative_path = f"logits/{key}.npy"
+        os.makedirs(self.cache_dir / "logits", exist_ok=True)
+        # Copied under a temporary name, so a concurrent lookup never loads a partial file
+        temporary_path = self.cache_dir / f"{relative_path}.{os.getpid()}.tmp"
+        shutil.copyfile(logits_path, temporary_path)
+        os.replace(temporary_path, self.cache_dir / relative_path)
+        self.put(key, "logits", {
+            "video_id": video_id,
+            "detection_ids": [int(detection_id) for detection_id in detection_ids],
+            "categories": list(categories)
+        }, files=[relative_path])
+
+    def load_logits(self, entry):
+        """Returns (detection_ids, logits_rows, categories) of a cached logits entry, or None if its file was evicted."""
+        try:
+            matrix = np.load(self.cache_dir / entry["files"][0])
+        except FileNotFoundError:
+            return None
+        return entry["payload"]["detection_ids"], list(matrix), entry["payload"]["categories"]
+
+    def put_interpretation(self, key, video_id, anomaly_rows):
+        if not self.enabled:
+            return
+        relative_path = f"interpretations/{key}.json"
+        os.makedirs(self.cache_dir / "interpretations", exist_ok=True)
+        temporary_path = self.cache_dir / f"{relative_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump([list(row) for row in anomaly_rows], f)
+        os.replace(temporary_path, self.cache_dir / relative_path)
+        self.put(key, "interpretation", {"video_id": video_id}, files=[relative_path])
+
+    def load_interpretation(self, entry):
+        """Returns the anomaly rows of a cached interpretation entry, or None if its file was evicted."""
+        try:
+            with open(self.cache_dir / entry["files"][0], "r") as f:
+                return [tuple(row) for row in json.load(f)]
+        except FileNotFoundError:
+            return None
+
+    def stats(self) -> dict:
+        with self._locked_index(shared=True) as index:
+            entries = index["entries"]
+            per_stage = {}
+            for entry in entries.values():
+                per_stage[entry["stage"]] = per_stage.get(entry["stage"], 0) + 1
+            return {
+                "enabled": self.enabled,
+                "entries": len(entries),
+                "entries_per_stage": per_stage,
+                "bytes": sum(entry["bytes"] for entry in entries.values()),
+                "max_bytes": self.max_bytes
+            }
+
+
+stage_cache = StageCache(
+    cache_dir=os.environ.get("STAGE_CACHE_DIR", str(BASE_DIR / "data" / "cache")),
+    max_bytes=int(os.environ.get("STAGE_CACHE_MAX_BYTES", 5 * 1024 ** 3)),
+    enabled=os.environ.get("STAGE_CACHE_ENABLED", "1") != "0"
+)
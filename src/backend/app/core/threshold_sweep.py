@@ -0,0 +1,257 @@
+"""
+threshold_sweep.py
+
+Re-interprets stored anomaly recognition results over a grid of (threshold, top_k, confidence_threshold)
+without running detection or XCLIP again.
+
+The logits matrices of all analyzed videos, the confidences of their detections and the UBnormal ground
+truth are loaded once into arrays. Every logit gets its rank within its detection row, so for each
+(top_k, confidence_threshold) pair the best qualifying score per (video, category) is computed with one
+scatter-max, and all thresholds are then compared against it at once. The decisions follow
+`evaluate_results` of the UBnormal experiment: a category is detected in a video if any of its detections
+reports it, and it is expected if the video annotations contain it.
+
+Only videos of annotated files are evaluated, one analysis per file (the latest one of the selection), so
+repeated analyses of a file and other uploads do not skew the counts. Analyzed videos without any detection
+are evaluated as well, their expected categories count as false negatives.
+
+Functions:
+- select_sweep_videos: picks the latest analysis of every annotated file.
+- load_sweep_data: loads logits, confidences and ground truth of the analyzed videos into arrays.
+- sweep: computes TP/FP/FN/TN, precision, recall and F1 for every grid point.
+- main: runs a sweep over the stored results of the default database.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.logits_store import load_experiment_logits
+from backend.app.services.ubnormal_experiment_service import (
+    load_analyzed_filenames_with_objects_and_anomalies_from_annotations,
+    get_activities_for_scene
+)
+
+def _normalize(label: str) -> str:
+    return label.strip().lower()
+
+def _ground_truth_by_filename(scenes):
+    # Videos are matched by file name, stored paths differ between the API and the evaluation scripts
+    ground_truth = {}
+    for scene_data in scenes.values():
+        for label_type in ["normal", "abnormal"]:
+            for video_entry in scene_data[label_type]:
+                activities = set()
+                for obj in video_entry["objects"].values():
+                    for anomaly in obj.get("anomalies", []):
+                        if "activity" in anomaly:
+                            activities.add(_normalize(anomaly["activity"]))
+                ground_truth[os.path.basename(video_entry["path"])] = activities
+    return ground_truth
+
+def _video_filename(video):
+    # Uploaded videos are stored under their hash, their original name is matched with the annotations
+    return video.get('video_filename') or os.path.basename(video['video_path'])
+
+def select_sweep_videos(videos, ground_truth):
+    """Keeps the latest analysis (highest video id) of every file that has annotations."""
+    latest = {}
+    for video in videos:
+        filename = _video_filename(video)
+        if filename not in ground_truth:
+            continue
+        if filename not in latest or video['video_id'] > latest[filename]['video_id']:
+            latest[filename] = video
+
+    skipped = len(videos) - len(latest)
+    if skipped:
+        print(f"⚠️ {skipped} of {len(videos)} videos are not evaluated (no annotations, or an older analysis of the same file).")
+    return sorted(latest.values(), key=lambda video: video['video_id'])
+
+def load_sweep_data(db_manager: DatabaseManager, dataset_path: str, categories, video_ids=None):
+    """Loads everything the sweep needs into flat arrays with one entry per (detection, category) logit.
+
+    The database connection must already be open.
+    """
+    scenes = load_analyzed_filenames_with_objects_and_anomalies_from_annotations(dataset_path)
+    ground_truth = _ground_truth_by_filename(scenes)
+    categories_for_scenes = get_activities_for_scene(scenes, categories)
+
+    evaluated_categories = sorted(set(_normalize(c) for c in categories))
+    category_index = {category: index for index, category in enumerate(evaluated_categories)}
+
+    videos = select_sweep_videos(db_manager.fetch_analyzed_videos(video_ids), ground_truth)
+    video_ids = [video['video_id'] for video in videos]
+    confidences = db_manager.fetch_detection_confidences(video_ids)
+    video_logits = load_experiment_logits(db_manager, video_ids)
+
+    # Expected categories per video, shape (videos, categories)
+    expected = np.zeros((len(videos), len(evaluated_categories)), dtype=bool)
+
+    entry_scores, entry_ranks, entry_confidences, entry_cells = [], [], [], []
+    for video_index, video in enumerate(videos):
+        filename = _video_filename(video)
+        for activity in ground_truth.get(filename, ()):
+            if activity in category_index:
+                expected[video_index, category_index[activity]] = True
+
+        data = video_logits.get(video['video_id'])
+        if data is None or len(data['detection_ids']) == 0:
+            continue
+
+        video_categories = data['categories']
+        if video_categories is None:
+            # Legacy results do not store their categories, the experiment used the activities of the scene
+            scene_match = re.search(r"_scene_(\d+)_", filename)
+            video_categories = categories_for_scenes.get(f"scene_{scene_match.group(1)}", []) if scene_match else []
+
+        logits = np.asarray(data['logits'], dtype=np.float32)
+        if logits.shape[1] != len(video_categories):
+            print(f"⚠️ Skipping video {video['video_id']}: {logits.shape[1]} logits per detection but {len(video_categories)} categories.")
+            continue
+
+        # Column of every logit in the evaluated categories (-1 = not evaluated)
+        columns = np.array([category_index.get(_normalize(c), -1) for c in video_categories], dtype=np.int64)
+
+        # Rank of every logit within its row, 0 = highest score (same order as topk)
+        order = np.argsort(-logits, axis=1, kind="stable")
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(logits.shape[1])[None, :], axis=1)
+
+        detection_confidences = np.array(
+            [confidences.get(int(detection_id)) or 0.0 for detection_id in data['detection_ids']],
+            dtype=np.float32
+        )
+
+        evaluated = np.broadcast_to(columns >= 0, logits.shape)
+        entry_scores.append(logits[evaluated])
+        entry_ranks.append(ranks[evaluated])
+        entry_confidences.append(np.broadcast_to(detection_confidences[:, None], logits.shape)[evaluated])
+        entry_cells.append(video_index * len(evaluated_categories) + np.broadcast_to(columns, logits.shape)[evaluated])
+
+    def concat(parts, dtype):
+        return np.concatenate(parts).astype(dtype) if parts else np.empty(0, dtype=dtype)
+
+    return {
+        'video_ids': video_ids,
+        'categories': evaluated_categories,
+        'expected': expected,
+        'scores': concat(entry_scores, np.float32),
+        'ranks': concat(entry_ranks, np.int64),
+        'confidences': concat(entry_confidences, np.float32),
+        'cells': concat(entry_cells, np.int64)
+    }
+
+def _metrics(tp, fp, fn, tn):
+    precision = tp / (tp + fp) if (tp + fp) > 0 else 0
+    recall = tp / (tp + fn) if (tp + fn) > 0 else 0
+    f1_score = (2 * precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+    return {
+        "true_positives": tp,
+        "false_positives": fp,
+        "false_negatives": fn,
+        "true_negatives": tn,
+        "precision": precision,
+        "recall": recall,
+        "f1_score": f1_score
+    }
+
+def sweep(data, thresholds, top_ks, confidence_thresholds):
+    """Returns one result per (threshold, top_k, confidence_threshold) grid point."""
+    expected = data['expected']
+    num_cells = expected.size
+    thresholds_array = np.asarray(thresholds, dtype=np.float32)
+
+    total_expected = int(expected.sum())
+    results = []
+    for top_k in top_ks:
+        in_top_k = data['ranks'] < top_k
+        for confidence_threshold in confidence_thresholds:
+            selected = in_top_k & (data['confidences'] >= confidence_threshold)
+
+            # Best qualifying score per (video, category)
+            best = np.full(num_cells, -np.inf, dtype=np.float32)
+            np.maximum.at(best, data['cells'][selected], data['scores'][selected])
+            best = best.reshape(expected.shape)
+
+            # All thresholds at once, shape (thresholds, videos, categories)
+            detected = best[None, :, :] >= thresholds_array[:, None, None]
+            true_positives = (detected & expected[None]).sum(axis=(1, 2))
+            detected_counts = detected.sum(axis=(1, 2))
+
+            for threshold, tp, detected_count in zip(thresholds, true_positives.tolist(), detected_counts.tolist()):
+                fp = detected_count - tp
+                fn = total_expected - tp
+                tn = num_cells - tp - fp - fn
+                results.append({
+                    "threshold": threshold,
+                    "top_k": top_k,
+                    "confidence_threshold": confidence_threshold,
+                    "statistics": _metrics(tp, fp, fn, tn)
+                })
+
+    return results
+
+def run_sweep(dataset_path, categories, thresholds, top_ks, confidence_thresholds, video_ids=None):
+    start_time = time.time()
+
+    db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
+    db_manager.connect()
+    try:
+        data = load_sweep_data(db_manager, dataset_path, categories, video_ids)
+    finally:
+        db_manager.close()
+
+    load_time = time.time()
+    results = sweep(data, thresholds, top_ks, confidence_thresholds)
+    end_time = time.time()
+
+    best = max(results, key=lambda result: result["statistics"]["f1_score"]) if results else None
+
+    return {
+        "total_videos_analyzed": len(data['video_ids']),
+        "grid_points": len(results),
+        "load_duration_seconds": round(load_time - start_time, 2),
+        "sweep_duration_seconds": round(end_time - load_time, 2),
+        "best": best,
+        "results": results
+    }
+
+def main(dataset_path, categories_json, thresholds, top_ks, confidence_thresholds, output_path=None):
+    print(f"The threshold sweep program has started.")
+
+    with open(categories_json, "r") as f:
+        categories = json.load(f)
+
+    result = run_sweep(dataset_path, categories, thresholds, top_ks, confidence_thresholds)
+
+    print(f"Program finished. Evaluated {result['grid_points']} grid points over {result['total_videos_analyzed']} videos "
+          f"in {result['sweep_duration_seconds']:.2f} seconds (loading took {result['load_duration_seconds']:.2f} seconds).")
+    if result["best"] is not None:
+        print(f"Best F1: {json.dumps(result['best'])}")
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(result, f, indent=2)
+
+    return result
+
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description="Run threshold / top-k / confidence sweep over stored results")
+    parser.add_argument('--dataset_path', required=True, type=str, help="Path to the UBnormal dataset (annotations)")
+    parser.add_argument('--categories_json', required=True, type=str, help="Path to the JSON file containing evaluated categories")
+    parser.add_argument('--thresholds', type=float, nargs="+", default=list(range(16, 28)), help="Thresholds to evaluate")
+    parser.add_argument('--top_ks', type=int, nargs="+", default=[1, 2, 3, 4, 5], help="top_k values to evaluate")
+    parser.add_argument('--confidence_thresholds', type=float, nargs="+", default=[0.3, 0.45, 0.6, 0.75], help="Confidence thresholds to evaluate")
+    parser.add_argument('--output', type=str, default=None, help="Optional path of the JSON file with all results")
+
+    args = parser.parse_args()
+
+    main(args.dataset_path, args.categories_json, args.thresholds, args.top_ks, args.confidence_thresholds, args.output)
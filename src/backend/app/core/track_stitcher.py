@@ -0,0 +1,95 @@
+"""
+track_stitcher.py
+
+Joins the tracks of consecutive detection chunks into video-wide tracks.
+
+The detection workers track every chunk with a reset tracker that first sees a few warmup frames before the
+chunk, which the previous chunk tracked as well. In those frames a chunk-local track is matched to the
+video-wide track it overlaps best (greedily by mean IoU), the remaining local tracks get new ids.
+
+Functions:
+- box_iou: intersection over union of two [x1, y1, x2, y2] boxes.
+
+Classes:
+- TrackStitcher: stitches the chunks in order, its state is checkpointed with every stored chunk.
+"""
+
+# Minimum mean IoU of two tracks in the overlap of two chunks to be joined into one
+STITCH_IOU_THRESHOLD = 0.5
+
+def box_iou(box_a, box_b):
+    x1, y1 = max(box_a[0], box_b[0]), max(box_a[1], box_b[1])
+    x2, y2 = min(box_a[2], box_b[2]), min(box_a[3], box_b[3])
+    intersection = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1]) + (box_b[2] - box_b[0]) * (box_b[3] - box_b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class TrackStitcher:
+    """Turns the chunk-local track ids into video-wide ones, chunk by chunk in order.
+
+    Every chunk is tracked from a reset tracker that first sees the warmup frames before the chunk, which the
+    previous chunk tracked as well. A local track continues the video-wide track it overlaps best in those frames.
+    """
+    def __init__(self, warmup_span, iou_threshold=STITCH_IOU_THRESHOLD):
+        self.warmup_span = warmup_span
+        self.iou_threshold = iou_threshold
+        self.next_track_id = 1
+        self.tail = {}  # frame_id -> [(track_id, bbox)] of the last frames of the previous chunk
+        self.tail_end = None  # end frame of the previous chunk
+
+    def stitch(self, start_frame, end_frame, detections):
+        """Returns the detections of [start_frame, end_frame) with video-wide track ids (warmup frames are dropped)."""
+        mapping = {}
+        if self.tail_end == start_frame:
+            overlaps = {}
+            for detection in detections:
+                if detection['frame_id'] >= start_frame or detection['track_id'] is None:
+                    continue
+                for track_id, bbox in self.tail.get(detection['frame_id'], []):
+                    overlaps.setdefault((detection['track_id'], track_id), []).append(box_iou(detection['bbox'], bbox))
+
+            # Greedily, the best overlapping pairs first
+            pairs = sorted(((sum(ious) / len(ious), local_id, track_id) for (local_id, track_id), ious in overlaps.items()), reverse=True)
+            for score, local_id, track_id in pairs:
+                if score < self.iou_threshold:
+                    break
+                if local_id not in mapping and track_id not in mapping.values():
+                    mapping[local_id] = track_id
+
+        stitched = []
+        for detection in detections:
+            if detection['frame_id'] < start_frame:
+                continue
+            local_id = detection['track_id']
+            if local_id is not None and local_id not in mapping:
+                mapping[local_id] = self.next_track_id
+                self.next_track_id += 1
+            stitched.append({**detection, 'track_id': mapping.get(local_id) if local_id is not None else None})
+
+        self.tail = {}
+        for detection in stitched:
+            if detection['frame_id'] >= end_frame - self.warmup_span and detection['track_id'] is not None:
+                self.tail.setdefault(detection['frame_id'], []).append((detection['track_id'], detection['bbox']))
+        self.tail_end = end_frame
+        return stitched
+
+    def skip(self, end_frame):
+        # A failed chunk, the tracks of the next chunk start new video-wide tracks
+        self.tail = {}
+        self.tail_end = end_frame
+
+    def checkpoint(self, start_frame):
+        """State after the chunk ending at `tail_end`, stored with the chunk so a resumed run can continue from it."""
+        return {
+            'start_frame': start_frame,
+            'end_frame': self.tail_end,
+            'next_track_id': self.next_track_id,
+            'tracker_tail': {str(frame_id): [[track_id, bbox] for track_id, bbox in boxes] for frame_id, boxes in self.tail.items()}
+        }
+
+    def restore(self, checkpoint):
+        # Track ids are never reused, so the counter only moves forward
+        self.next_track_id = max(self.next_track_id, checkpoint['next_track_id'] or 1)
+        self.tail = {int(frame_id): [(track_id, bbox) for track_id, bbox in boxes] for frame_id, boxes in (checkpoint['tracker_tail'] or {}).items()}
+        self.tail_end = checkpoint['end_frame']
@@ -0,0 +1,271 @@
+"""
+upload_store.py
+
+Content-addressed storage of uploaded videos with chunked, resumable uploads.
+
+An upload is started with `create_session`, its bytes are appended in order with `append_chunk`
+(the client sends the offset it continues from, a mismatch tells it where to resume) and it is
+finished with `complete_session`. The SHA-256 of the content is computed while the chunks are
+streamed, so completing an upload does not read the file again. The finished file is stored once per
+content as data/input/blobs/{sha256}{ext}; uploading the same video again only returns the stored path.
+
+Container metadata of every stored video (fps, frame count, resolution, duration, keyframe indices)
+is probed once and cached in a sidecar JSON next to the blob.
+
+Sessions are kept in data/input/uploads/{upload_id}/ (the partial file and session.json), so an upload
+can be resumed after a restart of the backend; the hash is then recomputed from the partial file once.
+
+Configuration (environment variables):
+- UPLOAD_CHUNK_BUFFER_BYTES: bytes buffered in memory before they are written to disk (default 1 MiB).
+
+Classes:
+- UploadOffsetMismatch: raised when a chunk does not continue at the received offset of the session.
+- UploadStore: the store; `upload_store` is the instance used by the backend.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+import cv2
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.core.video_processor import read_keyframes
+
+INPUT_PATH = "../data/input"
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+class UploadOffsetMismatch(Exception):
+    def __init__(self, expected_offset):
+        super().__init__(f"The upload continues at offset {expected_offset}.")
+        self.expected_offset = expected_offset
+
+
+def probe_video_metadata(video_path) -> dict:
+    """Reads the container metadata and the keyframe indices of the video."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("The uploaded file is not a readable video.")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    metadata = {
+        "fps": fps,
+        "frame_count": frame_count,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "duration": frame_count / fps if fps else None
+    }
+    cap.release()
+
+    # Stored with the video record at ingestion (see DatabaseManager.insert_video)
+    metadata["keyframes"] = read_keyframes(video_path)
+    return metadata
+
+
+class UploadStore:
+    def __init__(self, input_path=INPUT_PATH, buffer_bytes=1024 * 1024):
+        self.blobs_path = os.path.join(input_path, "blobs")
+        self.sessions_path = os.path.join(input_path, "uploads")
+        self.buffer_bytes = buffer_bytes
+        self._hashers = {}  # upload_id -> (sha256, number of bytes it covers)
+        self._locks = {}  # upload_id -> asyncio.Lock, chunks of one upload are appended one at a time
+
+    # Sessions
+
+    def _session_dir(self, upload_id):
+        # The id comes from the URL, only ids made by `create_session` are accepted
+        return os.path.join(self.sessions_path, str(uuid.UUID(upload_id)))
+
+    def _load_session(self, upload_id):
+        try:
+            with open(os.path.join(self._session_dir(upload_id), "session.json")) as file:
+                return json.load(file)
+        except (ValueError, FileNotFoundError):
+            raise KeyError(upload_id)
+
+    def _save_session(self, session):
+        path = os.path.join(self._session_dir(session["upload_id"]), "session.json")
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(session, file)
+        os.replace(f"{path}.tmp", path)
+
+    def _lock(self, upload_id):
+        # Locks are only made for existing sessions, so requests with bogus ids do not accumulate them
+        if not os.path.isdir(self._session_dir(upload_id)):
+            raise KeyError(upload_id)
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    def _hasher(self, session):
+        hasher, hashed_bytes = self._hashers.get(session["upload_id"], (None, None))
+        if hasher is None or hashed_bytes != session["received"]:
+            # The backend was restarted (or another process received chunks) during the upload, hash what was received
+            hasher = hashlib.sha256()
+            remaining = session["received"]
+            with open(os.path.join(self._session_dir(session["upload_id"]), "data.part"), "rb") as file:
+                while remaining > 0 and (block := file.read(min(HASH_BLOCK_BYTES, remaining))):
+                    hasher.update(block)
+                    remaining -= len(block)
+            self._hashers[session["upload_id"]] = (hasher, session["received"])
+        return hasher
+
+    def create_session(self, filename, size=None, sha256=None) -> dict:
+        upload_id = str(uuid.uuid4())
+        session = {
+            "upload_id": upload_id,
+            "filename": os.path.basename(filename),
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "received": 0
+        }
+        os.makedirs(self._session_dir(upload_id))
+        open(os.path.join(self._session_dir(upload_id), "data.part"), "wb").close()
+        self._save_session(session)
+        self._hashers[upload_id] = (hashlib.sha256(), 0)
+        return session
+
+    def status(self, upload_id) -> dict:
+        return self._load_session(upload_id)
+
+    async def append_chunk(self, upload_id, offset, stream) -> dict:
+        """Appends the bytes of the async iterator `stream` at `offset`. Returns the updated session."""
+        try:
+            lock = self._lock(upload_id)
+        except ValueError:
+            raise KeyError(upload_id)
+        async with lock:
+            session = await run_in_threadpool(self._load_session, upload_id)
+            if offset != session["received"]:
+                raise UploadOffsetMismatch(session["received"])
+            hasher = await run_in_threadpool(self._hasher, session)
+
+            part_path = os.path.join(self._session_dir(upload_id), "data.part")
+            file = await run_in_threadpool(open, part_path, "r+b")
+            try:
+                # Bytes of an interrupted chunk after the last saved offset are overwritten
+                await run_in_threadpool(file.seek, session["received"])
+                buffer = bytearray()
+                oversized = False
+                async for data in stream:
+                    # Nothing past the declared size is written, the session stays at the last valid offset
+                    if session["size"] is not None and session["received"] + len(buffer) + len(data) > session["size"]:
+                        oversized = True
+                        break
+                    buffer += data
+                    if len(buffer) >= self.buffer_bytes:
+                        await run_in_threadpool(file.write, bytes(buffer))
+                        hasher.update(buffer)
+                        session["received"] += len(buffer)
+                        buffer.clear()
+                if buffer and not oversized:
+                    await run_in_threadpool(file.write, bytes(buffer))
+                    hasher.update(buffer)
+                    session["received"] += len(buffer)
+                await run_in_threadpool(file.truncate)
+                self._hashers[upload_id] = (hasher, session["received"])
+            except BaseException:
+                # The bytes written so far are in the file, but the hash is only trusted for a saved offset
+                self._hashers.pop(upload_id, None)
+                raise
+            finally:
+                await run_in_threadpool(file.close)
+                await run_in_threadpool(self._save_session, session)
+
+            if oversized:
+                raise ValueError(f"The upload is larger than the declared {session['size']} bytes.")
+            return session
+
+    async def complete_session(self, upload_id) -> dict:
+        """Verifies the upload, stores it as a blob and removes the session."""
+        try:
+            lock = self._lock(upload_id)
+        except ValueError:
+            raise KeyError(upload_id)
+        # A chunk that is being appended is finished first, a later one finds no session
+        async with lock:
+            # Probing the stored video reads its index, keep it off the event loop
+            result = await run_in_threadpool(self._complete_session, upload_id)
+        self._locks.pop(upload_id, None)
+        return result
+
+    def _complete_session(self, upload_id) -> dict:
+        session = self._load_session(upload_id)
+        if session["size"] is not None and session["received"] != session["size"]:
+            raise ValueError(f"The upload has {session['received']} of {session['size']} bytes.")
+
+        sha256 = self._hasher(session).hexdigest()
+        if session["sha256"] and session["sha256"] != sha256:
+            raise ValueError("The SHA-256 of the upload does not match the declared one.")
+
+        part_path = os.path.join(self._session_dir(upload_id), "data.part")
+        result = self.store_file(part_path, sha256, session["filename"])
+
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+        self._hashers.pop(upload_id, None)
+        return result
+
+    # Blobs
+
+    def blob_path(self, sha256, filename):
+        extension = os.path.splitext(filename)[1].lower() or ".mp4"
+        return os.path.join(self.blobs_path, f"{sha256}{extension}")
+
+    def store_file(self, path, sha256, filename) -> dict:
+        """Moves the file with the given content hash into the store, unless the same content is stored already."""
+        os.makedirs(self.blobs_path, exist_ok=True)
+        blob_path = self.blob_path(sha256, filename)
+        deduplicated = os.path.exists(blob_path)
+        if deduplicated:
+            os.remove(path)
+            metadata = self.metadata(blob_path)
+        else:
+            # Probed before it is stored, files that are not videos never get into the store
+            try:
+                metadata = probe_video_metadata(path)
+            except ValueError:
+                os.remove(path)
+                raise
+            os.replace(path, blob_path)
+            self._save_metadata(blob_path, metadata)
+
+        return {
+            "video_path": blob_path,
+            "video_filename": filename,
+            "sha256": sha256,
+            "deduplicated": deduplicated,
+            "metadata": metadata
+        }
+
+    def store_stream(self, file, filename) -> dict:
+        """Copies a file object into the store, hashing it while it is copied."""
+        os.makedirs(self.blobs_path, exist_ok=True)
+        hasher = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.blobs_path, suffix=".part", delete=False) as temporary:
+            while block := file.read(HASH_BLOCK_BYTES):
+                hasher.update(block)
+                temporary.write(block)
+        return self.store_file(temporary.name, hasher.hexdigest(), os.path.basename(filename))
+
+    def metadata(self, blob_path) -> dict:
+        """Probed metadata of a stored video, cached in {blob}.json."""
+        sidecar_path = f"{blob_path}.json"
+        if os.path.exists(sidecar_path):
+            with open(sidecar_path) as file:
+                return json.load(file)
+
+        metadata = probe_video_metadata(blob_path)
+        self._save_metadata(blob_path, metadata)
+        return metadata
+
+    def _save_metadata(self, blob_path, metadata):
+        sidecar_path = f"{blob_path}.json"
+        with open(f"{sidecar_path}.tmp", "w") as file:
+            json.dump(metadata, file)
+        os.replace(f"{sidecar_path}.tmp", sidecar_path)
+
+
+upload_store = UploadStore(buffer_bytes=int(os.environ.get("UPLOAD_CHUNK_BUFFER_BYTES", 1024 * 1024)))
@@ -1,11 +1,69 @@
 # This script contains a helper functions for interaction with video.
 
+import bisect
+import json
+import os
+
 import cv2
-from moviepy.video.io.VideoFileClip import VideoFileClip
+from backend.app.core.video_writer import transcode_video
+
+# The `read_keyframes` function returns the indices of the keyframes of the video from its packet index
+# (no frame is decoded), or None if they cannot be read.
+def read_keyframes(video_path):
+    try:
+        from decord import VideoReader, cpu
+        return [int(index) for index in VideoReader(video_path, num_threads=1, ctx=cpu(0)).get_key_indices()]
+    except Exception as e:
+        print(f"⚠️  Keyframes of {video_path} could not be read: {e}")
+        return None
+
+# The `load_keyframe_index` function returns the keyframes of the video, from the metadata probed by the
+# upload store ({video}.json) if it exists, otherwise read from the video.
+def load_keyframe_index(video_path):
+    sidecar_path = f"{video_path}.json"
+    if os.path.exists(sidecar_path):
+        with open(sidecar_path) as file:
+            keyframes = json.load(file).get("keyframes")
+        if keyframes is not None:
+            return keyframes
+    return read_keyframes(video_path)
+
+# The `open_video_at` function opens the video so that the next `read()` returns `start_frame`. With a keyframe
+# index it seeks to the nearest preceding keyframe (an exact and cheap seek) and grabs the frames up to `start_frame`
+# without converting them; without one it falls back to seeking to the frame itself.
+def open_video_at(video_path, start_frame, keyframes=None):
+    cap = cv2.VideoCapture(video_path)
+    if start_frame <= 0:
+        return cap
+
+    if not keyframes:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        return cap
+
+    keyframe = keyframes[max(0, bisect.bisect_right(keyframes, start_frame) - 1)]
+    if keyframe > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+    for _ in range(start_frame - keyframe):
+        if not cap.grab():
+            break
+    return cap
+
+# The `align_to_keyframes` function moves every boundary to the nearest keyframe, so a segment starts
+# where decoding can start. Boundaries that end up equal are merged.
+def align_to_keyframes(boundaries, keyframes):
+    aligned = []
+    for boundary in boundaries:
+        position = bisect.bisect_left(keyframes, boundary)
+        candidates = keyframes[max(0, position - 1):position + 1]
+        keyframe = min(candidates, key=lambda candidate: abs(candidate - boundary)) if candidates else boundary
+        if not aligned or keyframe > aligned[-1]:
+            aligned.append(keyframe)
+    return aligned
 
 # The `split_video` function divides the video into `num_segments` parts for parallel processing,
 # based on the total number of frames, to enable more efficient processing.
-def split_video(video_path, num_segments):
+# With a keyframe index the segment boundaries are aligned to keyframes.
+def split_video(video_path, num_segments, keyframes=None):
     cap = cv2.VideoCapture(video_path)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     cap.release()
@@ -16,15 +74,39 @@ def split_video(video_path, num_segments):
         segment_length = total_frames
         num_segments = 1
 
+    boundaries = [i * segment_length for i in range(num_segments)]
+    if keyframes:
+        boundaries = align_to_keyframes(boundaries, keyframes)
+        # The first segment always starts at the beginning of the video
+        boundaries[0] = 0
+
     segments = []
 
-    for i in range(num_segments):
-        start_frame = i * segment_length
-        end_frame = (i + 1) * segment_length if i < num_segments - 1 else total_frames
+    for i, start_frame in enumerate(boundaries):
+        end_frame = boundaries[i + 1] if i < len(boundaries) - 1 else total_frames
         segments.append((start_frame, end_frame))
 
     return segments
 
+# The `split_video_into_chunks` function divides the video into many short chunks of about `chunk_seconds`,
+# which the detection workers pull from a shared queue. With a keyframe index the chunks start on keyframes.
+def split_video_into_chunks(video_path, chunk_seconds, keyframes=None):
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    cap.release()
+
+    chunk_frames = max(1, int(round(chunk_seconds * fps)))
+    boundaries = list(range(0, total_frames, chunk_frames))
+    if keyframes and boundaries:
+        boundaries = align_to_keyframes(boundaries, keyframes)
+        boundaries[0] = 0
+
+    return [
+        (start_frame, boundaries[i + 1] if i < len(boundaries) - 1 else total_frames)
+        for i, start_frame in enumerate(boundaries)
+    ]
+
+# The `compress_video` function re-encodes the video to H.264 with the given bitrate (see video_writer.py).
 def compress_video(input_path, output_path, bitrate="500k", preset="ultrafast"):
-    input_video = VideoFileClip(input_path)
-    input_video.write_videofile(output_path, preset=preset, bitrate=bitrate)
\ No newline at end of file
+    transcode_video(input_path, output_path, profile="browser", bitrate=bitrate, preset=preset)
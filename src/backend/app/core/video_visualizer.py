@@ -3,38 +3,78 @@ video_visualizer.py
 
 Generates a new video with visualized anomaly detections.
 
-Function:
-- show_anomalies_in_video: loads anomaly frame ranges from the database and draws red rectangles
-  around frames with detected anomalies in the input video. The output is saved to a new video file.
+Functions:
+- build_anomaly_mask: builds a per-frame boolean mask of the anomaly frame ranges from their boundary events.
+- mask_to_ranges: turns the mask back into sorted, non-overlapping (start, end) frame ranges.
+- draw_anomaly_border: draws the red rectangle on a frame inside the anomaly mask.
+- render_anomaly_video: draws red rectangles around the frames inside the given anomaly frame ranges
+  and saves the result to a new video file, optionally in parallel chunks (see chunked_renderer.py).
+- write_anomaly_timeline: writes the anomaly frame ranges as a JSON timeline the frontend draws
+  over the original video itself, without decoding or encoding any frame.
+- show_anomalies_in_video: loads anomaly frame ranges of a video from the database and renders them
+  with `render_anomaly_video` (mode "full") or `write_anomaly_timeline` (mode "timeline").
 """
 
 import cv2
+import json
 import os
+import numpy as np
 from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.chunked_renderer import render_video_in_chunks
+from backend.app.core.video_writer import open_video_writer
+from backend.app.core.instrumentation import StageRecorder
 
-def show_anomalies_in_video(video_id: int):
-    db = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    db.connect()
+VISUALIZATION_MODES = ("full", "timeline")
+
+def build_anomaly_mask(anomaly_frame_ranges, num_frames) -> np.ndarray:
+    """Returns a boolean array with True for every frame inside any of the inclusive (start, end) ranges."""
+    if num_frames <= 0 or not anomaly_frame_ranges:
+        return np.zeros(max(num_frames, 0), dtype=bool)
+
+    ranges = np.asarray(anomaly_frame_ranges, dtype=np.int64).reshape(-1, 2)
+    starts = np.clip(ranges[:, 0], 0, num_frames)
+    ends = np.clip(ranges[:, 1] + 1, 0, num_frames)
+    valid = starts < ends
+
+    # +1 where a range opens, -1 after it closes; the running sum counts the ranges covering a frame
+    events = np.zeros(num_frames + 1, dtype=np.int32)
+    np.add.at(events, starts[valid], 1)
+    np.add.at(events, ends[valid], -1)
+    return np.cumsum(events[:-1]) > 0
 
-    video_path = db.fetch_video_path(video_id)
-    if not os.path.exists(video_path):
-        raise FileNotFoundError(f"Video not found: {video_path}")
+def mask_to_ranges(mask) -> list:
+    """Returns the merged inclusive (start, end) ranges of consecutive True frames in the mask."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return [(int(start), int(end)) for start, end in zip(starts, ends)]
 
-    anomalies = db.fetch_anomalies_by_video_id(video_id)
+def draw_anomaly_border(frame, frame_id, mask):
+    """Draws a red rectangle around the entire frame (thickness 6) if the frame is anomalous."""
+    if frame_id < len(mask) and mask[frame_id]:
+        height, width = frame.shape[:2]
+        cv2.rectangle(frame, (0, 0), (width-1, height-1), (0, 0, 255), 6)
 
-    # List of frame ranges where anomalies occurred (highlight with red box)
-    anomaly_frame_ranges = []
-    for anomaly in anomalies:
-        anomaly_frame_ranges.append((anomaly["start_frame"], anomaly["end_frame"]))
+def render_anomaly_video(video_path, anomaly_frame_ranges, output_path, num_processes=1) -> int:
+    """Writes the video with a red border on frames inside any of the (start, end) ranges. Returns the number of frames.
 
+    With `num_processes` other than 1 the video is rendered in chunks by a process pool (None = all cores).
+    """
     cap = cv2.VideoCapture(video_path)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = cap.get(cv2.CAP_PROP_FPS)
 
-    output_path = f"../data/output/{video_id}/final_output.mp4"
+    # The frame count in the container can be off, frames past the mask are never anomalous
+    mask = build_anomaly_mask(anomaly_frame_ranges, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if num_processes != 1:
+        cap.release()
+        return render_video_in_chunks(video_path, output_path, draw_anomaly_border, (mask,), num_processes)
+
+    # Played in the frontend, H.264 instead of mp4v
+    out = open_video_writer(output_path, fps, (width, height), "browser")
 
     current_frame = 0
     while cap.isOpened():
@@ -42,18 +82,86 @@ def show_anomalies_in_video(video_id: int):
         if not ret:
             break
 
-        # Check if the current frame falls within any anomaly range
-        for start, end in anomaly_frame_ranges:
-            if start <= current_frame <= end:
-                # Draw a red rectangle around the entire frame (thickness 6)
-                cv2.rectangle(frame, (0, 0), (width-1, height-1), (0, 0, 255), 6)
-                # Once matched, no need to check other ranges
-                break
+        draw_anomaly_border(frame, current_frame, mask)
 
         out.write(frame)
         current_frame += 1
 
     cap.release()
     out.release()
-    db.close()
-    print(f"✅ Saved to {output_path}")
+    return current_frame
+
+def write_anomaly_timeline(video_id, video_path, anomalies, output_path) -> dict:
+    """Writes the JSON timeline of the anomalies of the video and returns it."""
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    mask = build_anomaly_mask([(anomaly["start_frame"], anomaly["end_frame"]) for anomaly in anomalies], num_frames)
+
+    def seconds(frame):
+        return round(frame / fps, 3) if fps else None
+
+    timeline = {
+        "video_id": video_id,
+        "fps": fps,
+        "num_frames": num_frames,
+        # Merged ranges for the highlighted border, one entry per continuous anomalous interval
+        "ranges": [
+            {"start_frame": start, "end_frame": end, "start_time": seconds(start), "end_time": seconds(end + 1)}
+            for start, end in mask_to_ranges(mask)
+        ],
+        # Individual detections with their top label, e.g. for tooltips
+        "anomalies": [
+            {
+                "detection_id": anomaly["id"],
+                "start_frame": anomaly["start_frame"],
+                "end_frame": anomaly["end_frame"],
+                "label": anomaly["top_anomaly_label"],
+                "score": float(anomaly["top_anomaly_score"])
+            }
+            for anomaly in sorted(anomalies, key=lambda anomaly: (anomaly["start_frame"], anomaly["id"]))
+        ]
+    }
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w") as file:
+        json.dump(timeline, file)
+    return timeline
+
+def show_anomalies_in_video(video_id: int, mode: str = "full", num_processes=None) -> str:
+    """Visualizes the anomalies of the video and returns the path of the output relative to the project root."""
+    if mode not in VISUALIZATION_MODES:
+        raise ValueError(f"Unknown visualization mode '{mode}', expected one of {VISUALIZATION_MODES}.")
+
+    db = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
+
+    with StageRecorder("video_visualizer", video_id) as recorder:
+        recorder.track_db(db)
+        db.connect()
+
+        video_path = db.fetch_video_path(video_id)
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video not found: {video_path}")
+
+        anomalies = db.fetch_anomalies_by_video_id(video_id)
+        db.close()
+
+        recorder.detail(anomaly_ranges=len(anomalies), mode=mode)
+
+        if mode == "timeline":
+            output_path = f"../data/output/{video_id}/anomaly_timeline.json"
+            write_anomaly_timeline(video_id, video_path, anomalies, output_path)
+        else:
+            # List of frame ranges where anomalies occurred (highlight with red box)
+            anomaly_frame_ranges = [(anomaly["start_frame"], anomaly["end_frame"]) for anomaly in anomalies]
+
+            output_path = f"../data/output/{video_id}/final_output.mp4"
+            frames = render_anomaly_video(video_path, anomaly_frame_ranges, output_path, num_processes)
+            recorder.add(frames_decoded=frames)
+
+        recorder.add(bytes_written=os.path.getsize(output_path))
+        print(f"✅ Saved to {output_path}")
+
+    return output_path.removeprefix("../")
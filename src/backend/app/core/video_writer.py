@@ -0,0 +1,160 @@
+"""
+video_writer.py
+
+Central place where the pipeline chooses how videos are encoded. Every writer is picked by a profile
+that matches what the output is used for:
+
+- "temporary": Motion JPEG in .avi through OpenCV. Intra-only and cheap to encode and to seek in, for
+  intermediate files that are read again by the pipeline (e.g. the per-detection crops).
+- "browser": H.264 (yuv420p, faststart) in .mp4 through an ffmpeg pipe (the ffmpeg binary of imageio-ffmpeg),
+  for outputs played in the frontend. Falls back to "mp4v" if ffmpeg is not available.
+- "mp4v": MPEG-4 Part 2 in .mp4 through OpenCV, the encoder the pipeline used everywhere before.
+- "npy": raw RGB frames saved as one (frames, height, width, 3) uint8 array, for outputs only read by a model.
+
+All writers have the interface of `cv2.VideoWriter` used in the pipeline: `write(frame)` with a BGR frame
+and `release()`.
+
+Functions:
+- profile_extension: returns the file extension of a profile.
+- open_video_writer: opens a writer of the given profile.
+- transcode_video: re-encodes a video file with ffmpeg in the given profile (with audio).
+- extract_clip: copies a time range of a video file into a new file without re-encoding.
+"""
+
+import os
+import subprocess
+import uuid
+
+import cv2
+import numpy as np
+
+VIDEO_PROFILES = {
+    "temporary": {"extension": "avi", "fourcc": "MJPG"},
+    # yuv420p needs even dimensions, odd ones are padded by a pixel
+    "browser": {"extension": "mp4", "codec_args": ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p", "-movflags", "+faststart"]},
+    "mp4v": {"extension": "mp4", "fourcc": "mp4v"},
+    "npy": {"extension": "npy"}
+}
+
+# Format of the per-detection crops made by the preprocessor, the detection paths in the database use its extension
+CROP_VIDEO_PROFILE = "temporary"
+
+def profile_extension(profile: str) -> str:
+    return VIDEO_PROFILES[profile]["extension"]
+
+def _ffmpeg_exe():
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return None
+
+
+class OpenCVVideoWriter:
+    def __init__(self, path, fps, size, fourcc):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+
+class FFmpegVideoWriter:
+    """Pipes raw BGR frames into an ffmpeg process."""
+    def __init__(self, path, fps, size, codec_args, threads=0, ffmpeg_exe=None):
+        width, height = size
+        command = [
+            ffmpeg_exe or _ffmpeg_exe(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+            "-an", *codec_args, "-threads", str(threads), path
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    def release(self):
+        self.process.stdin.close()
+        stderr = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+
+class NpyVideoWriter:
+    """Collects the frames in RGB (the order the models get from decord) and saves them on release."""
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def release(self):
+        width, height = self.size
+        frames = np.stack(self.frames) if self.frames else np.zeros((0, height, width, 3), dtype=np.uint8)
+        with open(self.path, "wb") as file:
+            np.save(file, frames)
+        self.frames = []
+
+def open_video_writer(path, fps, size, profile="temporary", threads=0):
+    """Opens a writer of `profile` for frames of `size` (width, height). `threads` = 0 lets ffmpeg decide."""
+    if profile not in VIDEO_PROFILES:
+        raise ValueError(f"Unknown video profile '{profile}', expected one of {tuple(VIDEO_PROFILES)}.")
+
+    if profile == "npy":
+        return NpyVideoWriter(path, size)
+
+    if profile == "browser":
+        ffmpeg_exe = _ffmpeg_exe()
+        if ffmpeg_exe is not None:
+            return FFmpegVideoWriter(path, fps, size, VIDEO_PROFILES["browser"]["codec_args"], threads, ffmpeg_exe)
+        print("⚠️  ffmpeg is not available, writing mp4v instead of H.264.")
+        profile = "mp4v"
+
+    return OpenCVVideoWriter(path, fps, size, VIDEO_PROFILES[profile]["fourcc"])
+
+def transcode_video(input_path, output_path, profile="browser", bitrate=None, preset=None, threads=0):
+    """Re-encodes the video file with ffmpeg, keeping its audio. `bitrate`/`preset` override the profile (H.264 only)."""
+    if profile == "temporary":
+        codec_args = ["-c:v", "mjpeg", "-q:v", "3"]
+    elif profile == "mp4v":
+        codec_args = ["-c:v", "mpeg4", "-q:v", "5"]
+    elif profile == "browser":
+        codec_args = list(VIDEO_PROFILES["browser"]["codec_args"])
+        if preset:
+            codec_args[codec_args.index("-preset") + 1] = preset
+        if bitrate:
+            # A target bitrate replaces the constant quality
+            index = codec_args.index("-crf")
+            codec_args[index:index + 2] = ["-b:v", bitrate]
+    else:
+        raise ValueError(f"Profile '{profile}' cannot be used to transcode a video file.")
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    subprocess.run(
+        [_ffmpeg_exe(), "-y", "-loglevel", "error", "-i", input_path, *codec_args, "-c:a", "aac", "-threads", str(threads), output_path],
+        check=True
+    )
+
+def extract_clip(input_path, output_path, start_seconds, end_seconds):
+    """Copies the video stream between the times into `output_path` (mp4, faststart) without re-encoding.
+
+    The stream is copied, so the clip starts at the keyframe before `start_seconds`.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    # Written next to the target and renamed, a concurrent request never reads a half-written clip
+    temporary_path = f"{output_path}.{uuid.uuid4().hex}.tmp.mp4"
+    try:
+        subprocess.run(
+            [_ffmpeg_exe(), "-y", "-loglevel", "error", "-ss", f"{start_seconds:.3f}", "-i", input_path,
+             "-t", f"{max(end_seconds - start_seconds, 0.001):.3f}", "-map", "0:v:0", "-c", "copy",
+             "-avoid_negative_ts", "make_zero", "-movflags", "+faststart", temporary_path],
+            check=True
+        )
+        os.replace(temporary_path, output_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
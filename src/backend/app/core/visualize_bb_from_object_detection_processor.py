@@ -1,24 +1,44 @@
 # This script processes a video and assigns bounding boxes for all detections within the video.
 # The `assign_bounding_boxes_to_video` function:
-# - Loads the video and its detections from the database.
-# - Loops through each frame and assigns bounding boxes for detected objects.
+# - Loads the video and all its bounding boxes from the database (one query) into a `FrameBoxIndex`.
+# - Loops through each frame and draws only the bounding boxes present in that frame.
 # - Displays the bounding boxes along with relevant information (e.g., track ID, detection ID, frame ID) on each frame.
 # - Outputs the processed video with the bounding boxes and additional details to a specified file path.
-# The function supports skipping frames during processing, improving performance for long videos.
+# The function supports skipping frames during processing, improving performance for long videos. Skipped frames are
+# only grabbed (not converted, drawn or encoded) and the output is written at a proportionally lower fps, so it keeps
+# the duration of the input. With `num_processes` other than 1 the video is rendered in parallel chunks
+# (see chunked_renderer.py).
 
 import cv2
 import argparse
 from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.frame_box_index import FrameBoxIndex
+from backend.app.core.chunked_renderer import render_video_in_chunks
+from backend.app.core.video_writer import open_video_writer
+
+def draw_boxes(frame, frame_id, box_index):
+    boxes, detection_ids, track_ids = box_index.boxes_in_frame(frame_id)
+    for bbox, detection_id, track_id in zip(boxes, detection_ids, track_ids):
+        # Create bb for frame
+        x1, y1, x2, y2 = map(int, bbox)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
+        label = f"Track ID: {track_id}, Frame: {frame_id}, Detection ID: {detection_id}"
+        cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+    # Adding the frame_id number to the corner of the video
+    cv2.putText(frame, f"Frame: {frame_id}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
 
 """It assigns bounding boxes for all detections in the given video and saves the entire video."""
-def assign_bounding_boxes_to_video(video_id, video_path, output_video_path, skip_frames, num_of_skip_frames):
+def assign_bounding_boxes_to_video(video_id, video_path, output_video_path, skip_frames, num_of_skip_frames, num_processes=1):
     # Initialize connection to the database and call the function
     db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
     db_manager.connect()
     
-    detections = db_manager.fetch_detections_by_video_id(video_id)
+    box_index = FrameBoxIndex.from_bounding_boxes(db_manager.fetch_bounding_boxes_by_video_id(video_id))
+    db_manager.close()
     
-    if not detections:
+    if len(box_index) == 0:
         print(f"No detections for the video with ID {video_id}.")
         return
     
@@ -29,51 +49,39 @@ def assign_bounding_boxes_to_video(video_id, video_path, output_video_path, skip
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     fps = cap.get(cv2.CAP_PROP_FPS)
 
+    # Check if video was loaded correctly
+    if total_frames <= 0:
+        print(f"Error: The video with ID {video_id} has no frames.")
+        cap.release()
+        return
+
     # set parameter for output video
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))  
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))  
+    step = num_of_skip_frames if skip_frames and num_of_skip_frames > 1 else 1
 
-    # Setting up VideoWriter to save the video
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
-
-    # Check if video was loaded correctly
-    if total_frames <= 0:
-        print(f"Error: The video with ID ${video_id} has no frames.")
+    if num_processes != 1:
+        cap.release()
+        render_video_in_chunks(video_path, output_video_path, draw_boxes, (box_index,), num_processes, step)
+        print(f"The video has been saved to: {output_video_path}")
         return
 
-    # Assign bounding boxes to the correct detections.
-    all_bounding_boxes = {}
-    for detection in detections:
-        detection_id = detection['id']
-        bounding_boxes = db_manager.fetch_bounding_boxes_by_detection_id(detection_id)
-        all_bounding_boxes[detection_id] = {bbox['frame_id']: bbox['bbox'] for bbox in bounding_boxes}
+    # Setting up VideoWriter to save the video; every `step`-th frame is written, so the fps drops accordingly
+    out = open_video_writer(output_video_path, fps / step, (width, height), "browser")
 
     # Assign the bounding box to each frame in the video if it contains any detection.
     for frame_id in range(total_frames):
+        # Process every nth frame, the others are not decoded into images
+        if frame_id % step != 0:
+            if not cap.grab():
+                break
+            continue
+
         ret, frame = cap.read()
-        
         if not ret:
             break
-        
-        # Process every nth frame
-        if skip_frames == True and (frame_id % num_of_skip_frames != 0):
-            continue
-        
-        for detection in detections:
-            detection_id = detection['id']
-            bbox = all_bounding_boxes.get(detection_id, {}).get(frame_id)
-
-            # Create bb for frame
-            if bbox:
-                x1, y1, x2, y2 = map(int, bbox)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
-                label = f"Track ID: {detection['track_id']}, Frame: {frame_id}, Detection ID: {detection['id']}"
-                cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-        # Adding the frame_id number to the corner of the video
-        cv2.putText(frame, f"Frame: {frame_id}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
+        draw_boxes(frame, frame_id, box_index)
 
         out.write(frame)
 
@@ -81,7 +89,6 @@ def assign_bounding_boxes_to_video(video_id, video_path, output_video_path, skip
     out.release()
     cv2.destroyAllWindows()
     print(f"The video has been saved to: {output_video_path}")
-    db_manager.close()
 
 if __name__ == "__main__":
     # Parse command line arguments
@@ -91,6 +98,7 @@ if __name__ == "__main__":
     parser.add_argument('--output_video_path', required=True, type=str, help="The path where the output video will be saved.")
     parser.add_argument('--skip_frames', type=bool, default=True, help="Whether to skip frames.")
     parser.add_argument('--num_of_skip_frames', type=int, default=5, help="The number of frames to skip.")
+    parser.add_argument('--num_processes', type=int, default=1, help="Rendering processes (0 = all cores).")
 
     args = parser.parse_args()
 
@@ -99,5 +107,6 @@ if __name__ == "__main__":
         args.video_path,
         args.output_video_path,
         args.skip_frames,
-        args.num_of_skip_frames
+        args.num_of_skip_frames,
+        args.num_processes or None
     )
\ No newline at end of file
@@ -3,6 +3,11 @@ import torch
 import numpy as np
 from transformers import XCLIPProcessor, XCLIPModel
 from PIL import Image
+import time
+
+from backend.app.core.prometheus_metrics import MODEL_INFERENCE_LATENCY
+
+XCLIP_MODEL_NAME = "microsoft/xclip-base-patch16-zero-shot"
 
 # This class, `XCLIPHandler`, is designed to handle video processing and zero-shot classification using the XCLIP model.
 # It includes methods for:
@@ -15,11 +20,13 @@ from PIL import Image
 # The class uses a pre-trained XCLIP model to analyze videos and classify them based on textual descriptions in a zero-shot manner.
 class XCLIPHandler:
     def __init__(self, list_of_categories=None):
-        self.model_name = "microsoft/xclip-base-patch16-zero-shot"
+        self.model_name = XCLIP_MODEL_NAME
         self.processor = XCLIPProcessor.from_pretrained(self.model_name)
         self.model = XCLIPModel.from_pretrained(self.model_name)
         
         self.list_of_categories = list_of_categories
+        # Frames decoded by this handler, reported by the stage instrumentation
+        self.frames_decoded = 0
 
     def sample_frame_indices(self, clip_len, frame_sample_rate, seg_len):
         converted_len = int(clip_len * frame_sample_rate)
@@ -40,11 +47,18 @@ class XCLIPHandler:
         Processes the video and returns batches of frames in the format required by the XCLIP model.
         """
         np.random.seed(0)
-        videoreader = VideoReader(video_path, num_threads=1, ctx=cpu(0))
-        videoreader.seek(0)
-        seg_len = len(videoreader)
-        indices = self.sample_frame_indices(clip_len, frame_sample_rate, seg_len)
-        frames = videoreader.get_batch(indices).asnumpy()
+        if video_path.endswith(".npy"):
+            # Raw RGB frames (the "npy" profile of video_writer.py), only the sampled frames are read
+            video_frames = np.load(video_path, mmap_mode="r")
+            indices = self.sample_frame_indices(clip_len, frame_sample_rate, len(video_frames))
+            frames = np.asarray(video_frames[indices])
+        else:
+            videoreader = VideoReader(video_path, num_threads=1, ctx=cpu(0))
+            videoreader.seek(0)
+            seg_len = len(videoreader)
+            indices = self.sample_frame_indices(clip_len, frame_sample_rate, seg_len)
+            frames = videoreader.get_batch(indices).asnumpy()
+        self.frames_decoded += len(frames)
         
         return frames
 
@@ -57,8 +71,10 @@ class XCLIPHandler:
         inputs = self.processor(text=descriptions, videos=list(frames), return_tensors="pt", padding=True, truncation=True)
 
         # Prediction
+        start_time = time.perf_counter()
         with torch.no_grad():
             outputs = self.model(**inputs)
+        MODEL_INFERENCE_LATENCY.labels("xclip").observe(time.perf_counter() - start_time)
         
         # Calculating similarity between images and text
         logits_per_video = outputs.logits_per_video  # Similarity score between images and text
@@ -1,10 +1,19 @@
+import time
+
+import ultralytics
 from ultralytics import YOLO
 
+from backend.app.core.prometheus_metrics import MODEL_INFERENCE_LATENCY
+
+# Internal state of the ultralytics BYTETracker cleared by `reset_tracker`
+TRACKER_STATE_ATTRIBUTES = ("tracked_stracks", "lost_stracks", "removed_stracks", "frame_id", "kalman_filter", "get_kalmanfilter")
+
 # This class, `YOLOHandler`, is designed to handle object detection and tracking using the YOLO model from the `ultralytics` library.
 # It includes methods for:
 # - Initializing the YOLO model with a specified path and setting the classes to detect.
 # - Detecting objects in a given frame, filtering results by a confidence threshold, and returning the bounding boxes and associated class IDs.
 # - Tracking objects across frames, leveraging the YOLO model's tracking capabilities with the "bytetrack" tracker.
+# - Resetting the tracker state between unrelated parts of a video.
 # The class allows customization of the detection process by specifying which object classes to detect and setting a confidence threshold for filtering low-confidence detections.
 class YOLOHandler:
     def __init__(self, model_path: str, classes_to_detect=None, verbose=False):
@@ -14,7 +23,9 @@ class YOLOHandler:
 
     def detect(self, frame, confidence_threshold=0.5):
         # you can add save=True to save model
+        start_time = time.perf_counter()
         results = self.model(frame, classes=self.classes_to_detect, verbose=self.verbose) 
+        MODEL_INFERENCE_LATENCY.labels("yolo").observe(time.perf_counter() - start_time)
         filtered_results = []
 
         for result in results[0].boxes:
@@ -30,9 +41,37 @@ class YOLOHandler:
 
         return filtered_results
     
+    def reset_tracker(self):
+        """Forgets all tracks, e.g. before the handler continues with a frame that does not follow the previous one.
+
+        The trackers exist only after the first `track` call. Raises RuntimeError if they do not, or if they are not
+        the BYTETracker this reset is written for (the internals used here are pinned with ultralytics 8.3.40).
+        """
+        trackers = getattr(getattr(self.model, "predictor", None), "trackers", None)
+        if not trackers:
+            raise RuntimeError("The tracker is not initialized yet, call track() before reset_tracker().")
+        for tracker in trackers:
+            missing = [attribute for attribute in TRACKER_STATE_ATTRIBUTES if not hasattr(tracker, attribute)]
+            if missing:
+                raise RuntimeError(
+                    f"Unsupported tracker {type(tracker).__name__} of ultralytics {ultralytics.__version__} "
+                    f"(missing {', '.join(missing)}), reset_tracker() expects the BYTETracker of ultralytics 8.3.40."
+                )
+
+        # BYTETracker.reset() would also reset the track id counter shared by all trackers of the process,
+        # so tracks of other handlers running at the same time could get ids that are already in use
+        for tracker in trackers:
+            tracker.tracked_stracks = []
+            tracker.lost_stracks = []
+            tracker.removed_stracks = []
+            tracker.frame_id = 0
+            tracker.kalman_filter = tracker.get_kalmanfilter()
+
     # https://docs.ultralytics.com/modes/track/#persisting-tracks-loop
     def track(self, frame, confidence_threshold=0.5):
+      start_time = time.perf_counter()
       results = self.model.track(source=frame, classes=self.classes_to_detect, verbose=self.verbose, tracker="bytetrack.yaml", persist=True)
+      MODEL_INFERENCE_LATENCY.labels("yolo").observe(time.perf_counter() - start_time)
 
       filtered_results = []
       if results and results[0].boxes: 
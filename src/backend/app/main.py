@@ -1,9 +1,33 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.api import detection, anomaly, result, video, configuration, experiment, metrics
+from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.async_database_manager import close_async_db
+from backend.app.utils.executor_utils import shutdown_pipeline_executor
+from backend.app.core.prometheus_metrics import CONTENT_TYPE_LATEST, PrometheusMiddleware, register_router, render_metrics
+
+def prepare_database():
+    # Make sure the database and its tables exist before the async pool is used by the read endpoints
+    db_manager = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
+    db_manager.connect()
+    db_manager.create_tables()
+    db_manager.close()
 
-from backend.app.api import detection, anomaly, result, video, configuration, experiment
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await run_in_threadpool(prepare_database)
+    except Exception as e:
+        print(f"Database initialization error: {e}")
+    yield
+    await close_async_db()
+    shutdown_pipeline_executor()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,18 +40,30 @@ app.add_middleware(
     allow_headers=["*"], 
 )
 
+# Added last, so the latency includes the other middlewares
+app.add_middleware(PrometheusMiddleware)
+
 app_version = "Prototype 1.0.0"
 
 @app.get("/ping")
 async def return_version():
     return {"message": app_version}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 app.include_router(detection.router, prefix="/api")
 app.include_router(anomaly.router, prefix="/api")
 app.include_router(result.router, prefix="/api")
 app.include_router(video.router, prefix="/api")
 app.include_router(configuration.router, prefix="/api")
 app.include_router(experiment.router, prefix="/api")
+app.include_router(metrics.router, prefix="/api")
+
+for router_name, router_module in [("detection", detection), ("anomaly", anomaly), ("result", result), ("video", video),
+                                   ("configuration", configuration), ("experiment", experiment), ("metrics", metrics)]:
+    register_router(router_name, router_module.router)
 
 
 # if __name__ == "__main__":
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class AnomalyPreprocessRequest(BaseModel):
     video_id: int
@@ -9,10 +9,14 @@ class AnomalyPreprocessRequest(BaseModel):
     target_height: int = 200
     max_frames: int = 50
     processing_mode: str = "parallel"
+    num_processes: Optional[int] = None  # None = all cores
+    profile: bool = False  # store cProfile artifacts of the run, including the pool workers
 
 class AnomalyRecognitionRequest(BaseModel):
     video_id: int
     categories: List[str]
     batch_size: int = 32
     frame_sample_rate: int = 4
-    processing_mode: str = "parallel"
\ No newline at end of file
+    processing_mode: str = "parallel"
+    num_processes: Optional[int] = None  # None = all cores
+    profile: bool = False  # store cProfile/torch profiler artifacts of the run, including the pool workers
\ No newline at end of file
@@ -1,8 +1,9 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class DetectionRequest(BaseModel):
     video_path: str
+    video_filename: Optional[str] = None  # original name of an uploaded video, None = the name of video_path
     model_path: str
     num_segments: int = 8
     processing_mode: str = "parallel"
@@ -11,6 +12,8 @@ class DetectionRequest(BaseModel):
     skip_frames: bool = True
     num_of_skip_frames: int = 5
     confidence_threshold: float = 0.25
+    profile: bool = False  # store cProfile/torch profiler artifacts of the run
+    resume: bool = True  # continue an unfinished run of the same video and settings instead of starting over
 
 class DetectionResponse(BaseModel):
     video_id: int
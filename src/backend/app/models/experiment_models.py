@@ -0,0 +1,47 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+UBNORMAL_CATEGORIES = [
+    "a person wearing a helmet and an orange vest is walking",
+    "a person wearing a helmet and an orange vest is dancing",
+    "a person wearing a helmet and an orange vest is standing in place",
+    "a person wearing a helmet and an orange vest is jumping",
+    "a person wearing a helmet and an orange vest is running",
+    "a person wearing a helmet and an orange vest is fighting",
+    "a person wearing a helmet and an orange vest have something in hand",
+    "a person wearing a helmet and an orange vest is lying in the ground",
+    "a person wearing a helmet and an orange vest is limping",
+    "a person wearing a helmet and an orange vest fell to the ground",
+    "a person wearing a helmet and an orange vest is sitting",
+    "a person wearing a helmet and an orange vest is riding motocycle"
+]
+
+class UBnormalExperimentRequest(BaseModel):
+    dataset_path: str = "experiments/UBnormal"
+    model_path: str = "data/models/yolo11n.pt"
+    num_segments: int = 8
+    categories: List[str] = UBNORMAL_CATEGORIES
+    threshold: int = 21
+    skip_frames: bool = True
+    num_of_skip_frames: int = 5
+    confidence_threshold: float = 0.25
+    top_k: int = 5
+    batch_size: int = 32
+    frame_sample_rate: int = 4
+    processing_mode: str = "sequential"
+    max_concurrent_videos: int = 2  # videos analyzed at the same time
+    cpu_budget: Optional[int] = None  # processes shared by all concurrent videos, None = all cores
+    resume: bool = True  # skip videos already stored in the checkpoint of this configuration
+
+class UBnormalSweepRequest(BaseModel):
+    dataset_path: str = "experiments/UBnormal"
+    categories: List[str] = UBNORMAL_CATEGORIES
+    thresholds: List[float] = list(range(16, 28))
+    top_ks: List[int] = [1, 2, 3, 4, 5]
+    confidence_thresholds: List[float] = [0.3, 0.45, 0.6, 0.75]
+    video_ids: Optional[List[int]] = None  # None = all analyzed videos (the latest analysis of every annotated file)
+
+class DistributedExperimentRequest(BaseModel):
+    payloads: List[UBnormalExperimentRequest]
+    name: Optional[str] = None
+    max_attempts: int = 3  # attempts per video before the task is marked as failed
@@ -1,4 +1,18 @@
 from pydantic import BaseModel
+from typing import Literal, Optional
 
 class VideoVisualizationRequest(BaseModel):
     video_id: int
+    mode: Literal["full", "timeline"] = "full"  # "timeline" writes only a JSON timeline for the frontend
+    num_processes: Optional[int] = None  # rendering processes of the "full" mode, None = all cores
+
+class VideoOverlayRequest(BaseModel):
+    video_id: int
+    thumbnail_interval_seconds: float = 5.0
+    thumbnail_width: int = 160
+    sprite_columns: int = 10
+
+class VideoUploadInitRequest(BaseModel):
+    filename: str
+    size: Optional[int] = None  # total bytes, checked when the upload is completed
+    sha256: Optional[str] = None  # checked against the hash computed while streaming
@@ -23,7 +23,9 @@ def run_anomaly_preprocessing(request: AnomalyPreprocessRequest):
         request.max_frames,
         request.target_width,
         request.target_height,
-        request.processing_mode
+        request.processing_mode,
+        request.num_processes,
+        request.profile
     )
     return {"message": "Anomaly preprocessing completed."}
 
@@ -34,6 +36,8 @@ def run_anomaly_recognition(request: AnomalyRecognitionRequest):
         categories_json=request.categories,
         batch_size=request.batch_size,
         frame_sample_rate=request.frame_sample_rate,
-        processing_mode=request.processing_mode
+        processing_mode=request.processing_mode,
+        num_processes=request.num_processes,
+        profile=request.profile
     )
     return {"message": "Anomaly recognition completed."}
@@ -15,6 +15,7 @@ Functions:
 from typing import List, Optional
 from backend.app.models.configuration_models import AnalysisConfigIn, LinkIn
 from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.async_database_manager import get_async_db
 
 # Save a new configuration to the database
 def save_analysis_config(config: AnalysisConfigIn) -> int:
@@ -23,16 +24,14 @@ def save_analysis_config(config: AnalysisConfigIn) -> int:
     return db.insert_analysis_configuration(config.name, config.categories, config.settings)
 
 # Retrieve all configurations from the database
-def get_all_analysis_configs() -> List[dict]:
-    db = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    db.connect()
-    return db.fetch_all_analysis_configurations()
+async def get_all_analysis_configs() -> List[dict]:
+    db = await get_async_db()
+    return await db.fetch_all_analysis_configurations()
 
 # Get configuration details by ID
-def get_analysis_config_by_id(config_id: int) -> Optional[dict]:
-    db = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    db.connect()
-    return db.fetch_analysis_configuration_by_id(config_id)
+async def get_analysis_config_by_id(config_id: int) -> Optional[dict]:
+    db = await get_async_db()
+    return await db.fetch_analysis_configuration_by_id(config_id)
 
 # Delete a configuration by ID
 def delete_configuration_by_id(config_id: int) -> Optional[dict]:
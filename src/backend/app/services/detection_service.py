@@ -6,11 +6,14 @@ Provides service-layer logic for handling object detection operations.
 Functions:
 - run_object_detection: runs the object detection pipeline and returns the resulting video ID.
 - get_detections_by_video_id: fetches detection records for a given video ID from the database.
+- stream_detections_page: streams one keyset-paginated, filtered page of detections of a video.
 """
 from typing import Dict, List
 from backend.app.models.detection_models import DetectionRequest, DetectionResponse
 from backend.app.core.object_detection_processor import main as object_detection_main
-from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.async_database_manager import get_async_db
+from backend.app.core.result_cache import result_cache
+from backend.app.utils.pagination_utils import encode_cursor, decode_cursor, stream_json_page
 
 def run_object_detection(request: DetectionRequest) -> DetectionResponse:
     # Execute the object detection process and obtain video ID
@@ -23,17 +26,40 @@ def run_object_detection(request: DetectionRequest) -> DetectionResponse:
         classes_to_detect=request.classes_to_detect,
         skip_frames=request.skip_frames,
         num_of_skip_frames=request.num_of_skip_frames,
-        confidence_threshold=request.confidence_threshold
+        confidence_threshold=request.confidence_threshold,
+        profile=request.profile,
+        resume=request.resume,
+        video_filename=request.video_filename
     )
+    # Detections of this video were (re)written, drop any cached payloads
+    result_cache.invalidate_video(video_id)
     # Return the response with the detected video ID and message
     return DetectionResponse(
         video_id=video_id,
         message="Object detection completed successfully."
     )
 
-def get_detections_by_video_id(video_id: int):
-    # Connect to the database and fetch detections for the given video
-    db = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    db.connect()
-    
-    return db.fetch_detections_by_video_id(video_id)
\ No newline at end of file
+async def get_detections_by_video_id(video_id: int):
+    # Fetch detections for the given video through the shared async connection pool (read-through cached)
+    async def load():
+        db = await get_async_db()
+        return await db.fetch_detections_by_video_id(video_id)
+
+    return await result_cache.get_or_load(("detections", video_id), load)
+
+def stream_detections_page(video_id: int, limit: int, cursor=None, min_confidence=None, label=None, has_anomalies=None):
+    # Decode the cursor eagerly, so an invalid one is reported before the response starts streaming
+    after_id = None
+    if cursor:
+        try:
+            (after_id,) = decode_cursor(cursor)
+            after_id = int(after_id)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid pagination cursor.")
+
+    async def detections():
+        db = await get_async_db()
+        async for detection in db.iter_detections_page(video_id, limit, after_id, min_confidence, label, has_anomalies):
+            yield detection
+
+    return stream_json_page(detections(), limit, lambda detection: encode_cursor([detection['id']]))
@@ -0,0 +1,209 @@
+"""
+distributed_experiment_service.py
+
+Coordinator/worker execution of UBnormal experiments through a shared task table in PostgreSQL.
+
+Every experiment payload is stored in the `experiments` table and split into one task per video
+in `experiment_tasks`. Any number of worker processes, on one or several hosts sharing the database,
+the dataset and the models, claim tasks with `FOR UPDATE SKIP LOCKED` and hold them under a lease
+that is renewed by a heartbeat. A task whose worker died is claimed again once its lease expires,
+failed tasks are retried up to `max_attempts` times. The worker finishing the last task of an
+experiment aggregates the per-video results into TP/FP/FN/TN and precision/recall/F1.
+
+Paths stored in the tasks are relative to the project root, so workers on other hosts resolve them
+against their own checkout.
+
+Workers on one host share the stage cache (`data/cache`, its index is locked with `flock`, so it must not
+be shared over a network file system) and may analyze the same video at the same time: detection runs
+are leased, so a worker never resumes or deletes a detection that another worker is still running, and
+a worker reusing a cached detection run analyzes a copy of it, so the later stages of two workers never
+write to (or read the results from) the same video row.
+With `num_processes` a worker uses that many detection workers with one torch thread each, and
+process pools of that size, so several workers on a host split its CPUs instead of oversubscribing them.
+
+Functions:
+- enqueue_experiment: stores an experiment payload and its per-video tasks.
+- get_experiment_status: returns the progress (and the result, once finished) of an experiment.
+- aggregate_experiment: evaluates a finished experiment and stores its result.
+- run_worker: claims and runs tasks until stopped (or until the queue is empty).
+"""
+
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import torch
+
+from backend.app.core.database_manager import DatabaseManager
+from backend.app.services.experiment_scheduler_service import build_experiment_tasks
+from backend.app.services.ubnormal_experiment_service import (
+    load_analyzed_filenames_with_objects_and_anomalies_from_annotations,
+    evaluate_results
+)
+
+# Base directory = root of the project (assuming this script is in diploma-thesis-prototype/src/backend/app/services/)
+BASE_DIR = Path(__file__).resolve().parents[4]
+
+def _db():
+    return DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
+
+def enqueue_experiment(request, name=None, max_attempts=3) -> int:
+    scenes = load_analyzed_filenames_with_objects_and_anomalies_from_annotations(str(BASE_DIR / request.dataset_path))
+    tasks = build_experiment_tasks(request, scenes, request.model_path)
+    for task in tasks:
+        relative_path = os.path.relpath(task["video_path"], BASE_DIR)
+        task["video_path"] = relative_path
+        task["kwargs"]["video_path"] = relative_path
+        task["max_attempts"] = max_attempts
+
+    db = _db()
+    db.connect()
+    try:
+        db.create_tables()
+        experiment_id = db.insert_experiment(name, request.model_dump(), tasks)
+    finally:
+        db.close()
+
+    print(f"🗂️ Experiment {experiment_id} enqueued with {len(tasks)} tasks.")
+    return experiment_id
+
+def get_experiment_status(experiment_id: int):
+    db = _db()
+    db.connect()
+    try:
+        # Tasks given up after an expired lease are not followed by any worker, aggregate them here
+        aggregate_experiment(db, experiment_id)
+        return db.fetch_experiment(experiment_id)
+    finally:
+        db.close()
+
+def _statistics(tp, fp, fn, tn):
+    precision = tp / (tp + fp) if (tp + fp) > 0 else 0
+    recall = tp / (tp + fn) if (tp + fn) > 0 else 0
+    f1_score = (2 * precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+    return {
+        "true_positives": tp,
+        "false_positives": fp,
+        "false_negatives": fn,
+        "true_negatives": tn,
+        "precision": precision,
+        "recall": recall,
+        "f1_score": f1_score
+    }
+
+def aggregate_experiment(db: DatabaseManager, experiment_id: int) -> bool:
+    """Evaluates the experiment if none of its tasks is pending or running. Returns True if it was finished now."""
+    # Without a worker claiming tasks, the expired leases of tasks after their last attempt are given up only here
+    db.expire_experiment_tasks(experiment_id)
+    experiment = db.fetch_experiment(experiment_id)
+    if experiment is None or experiment['status'] == 'completed':
+        return False
+    if experiment['tasks'].get('pending', 0) or experiment['tasks'].get('running', 0):
+        return False
+
+    tasks = db.fetch_experiment_tasks(experiment_id)
+    all_results = {"normal_results": [], "abnormal_results": []}
+    cache_hits = {}
+    for task in tasks:
+        if task['status'] != 'done':
+            continue
+        response = task['result']
+        # Results are compared with the annotations by path, resolve it on this host
+        response["result"]["path"] = str(BASE_DIR / task['video_path'])
+        all_results[f"{task['label']}_results"].append(response)
+        for stage, hit in response.get("cache_hits", {}).items():
+            cache_hits[stage] = cache_hits.get(stage, 0) + int(hit)
+
+    request = experiment['request']
+    scenes = load_analyzed_filenames_with_objects_and_anomalies_from_annotations(str(BASE_DIR / request["dataset_path"]))
+    tp, fp, fn, tn = evaluate_results(all_results, scenes, request["categories"])
+
+    result = {
+        "total_videos_analyzed": len(all_results["normal_results"]) + len(all_results["abnormal_results"]),
+        "failed_videos": [{"video_path": task['video_path'], "error": task['error']} for task in tasks if task['status'] == 'failed'],
+        "sum_of_video_durations_seconds": round(sum(task['duration_seconds'] or 0 for task in tasks), 2),
+        "cache_hits": cache_hits,
+        "statistics": _statistics(tp, fp, fn, tn)
+    }
+
+    finished = db.finish_experiment(experiment_id, result)
+    if finished:
+        print(f"🏁 Experiment {experiment_id} finished: {result['statistics']}")
+    return finished
+
+def _heartbeat(task_id, worker_id, lease_seconds, stop_event):
+    # Own connection pool, the pool of the worker loop is not shared between threads
+    db = _db()
+    db.connect()
+    try:
+        while not stop_event.wait(lease_seconds / 3):
+            if not db.renew_experiment_task_lease(task_id, worker_id, lease_seconds):
+                print(f"⚠️ Lease of task {task_id} was lost.")
+                break
+    except Exception as e:
+        print(f"Heartbeat error: {e}")
+    finally:
+        db.close()
+
+def run_worker(worker_id=None, lease_seconds=600, poll_seconds=5, exit_when_idle=False, num_processes=None, max_tasks=None):
+    # Imported here, so enqueueing and status queries do not load the models
+    from backend.app.services.experiment_service import run_full_analysis
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    print(f"👷 Worker {worker_id} started.")
+
+    db = _db()
+    db.connect()
+    db.create_tables()
+
+    if num_processes:
+        # Detection threads run with one intra-op thread each, see the capped num_segments below
+        torch.set_num_threads(1)
+
+    processed = 0
+    try:
+        while max_tasks is None or processed < max_tasks:
+            task = db.claim_experiment_task(worker_id, lease_seconds)
+            if task is None:
+                if exit_when_idle:
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            print(f"▶️ Task {task['id']} (experiment {task['experiment_id']}, attempt {task['attempts']}): {task['video_path']}")
+            kwargs = dict(task['kwargs'])
+            kwargs["video_path"] = str(BASE_DIR / kwargs["video_path"])
+            kwargs["model_path"] = str(BASE_DIR / kwargs["model_path"])
+            if num_processes:
+                kwargs["num_segments"] = max(1, min(kwargs["num_segments"], num_processes))
+
+            stop_event = threading.Event()
+            heartbeat = threading.Thread(target=_heartbeat, args=(task['id'], worker_id, lease_seconds, stop_event), daemon=True)
+            heartbeat.start()
+
+            start_time = time.time()
+            try:
+                response = run_full_analysis(**kwargs, num_processes=num_processes)
+                stop_event.set()
+                heartbeat.join()
+                if not db.complete_experiment_task(task['id'], worker_id, response, round(time.time() - start_time, 2)):
+                    print(f"⚠️ Task {task['id']} was taken over by another worker, result discarded.")
+            except Exception as e:
+                stop_event.set()
+                heartbeat.join()
+                print(f"❌ Error in task {task['id']}: {e}")
+                db.fail_experiment_task(task['id'], worker_id, str(e))
+
+            processed += 1
+            aggregate_experiment(db, task['experiment_id'])
+    except KeyboardInterrupt:
+        # The lease of the current task expires and another worker takes it over
+        print(f"\nWorker {worker_id} was interrupted.")
+    finally:
+        db.close()
+
+    print(f"👷 Worker {worker_id} finished after {processed} task(s).")
+    return processed
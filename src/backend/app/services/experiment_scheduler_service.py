@@ -0,0 +1,180 @@
+"""
+experiment_scheduler_service.py
+
+Runs the videos of an experiment concurrently under a global CPU budget and checkpoints every
+finished video, so an interrupted experiment resumes where it stopped.
+
+At most `max_concurrent_videos` videos are analyzed at the same time, each in its own worker process,
+so detection of one video overlaps recognition of another. Every video gets an equal share of the CPU
+budget instead of one process or thread per core in every stage, so the host is not oversubscribed: the
+share is the size of the preprocessing and recognition process pools and the maximum number of detection
+workers. The worker processes run torch (and the OpenMP/MKL pools of their children) with one intra-op
+thread per detection worker; the calling process, e.g. the API server, keeps its own settings.
+Results are appended to a JSONL checkpoint named after a hash of the experiment parameters; videos
+already present in it are not analyzed again.
+
+Functions:
+- build_experiment_tasks: creates one `run_full_analysis` task per normal and abnormal video of every scene.
+- experiment_checkpoint_path: returns the checkpoint file of an experiment configuration.
+- load_checkpoint: loads the finished videos of a checkpoint.
+- run_videos_concurrently: analyzes the videos of an experiment and reports how much the videos overlapped.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import torch
+
+from backend.app.core.result_cache import result_cache
+from backend.app.services.ubnormal_experiment_service import get_activities_for_scene
+
+# Base directory = root of the project (assuming this script is in diploma-thesis-prototype/src/backend/app/services/)
+BASE_DIR = Path(__file__).resolve().parents[4]
+
+CHECKPOINT_DIR = BASE_DIR / "experiments" / "results" / "checkpoints"
+
+def build_experiment_tasks(request, scenes, model_path):
+    categories_for_scenes = get_activities_for_scene(scenes, request.categories)
+
+    tasks = []
+    for scene_name, scene_data in scenes.items():
+        for label in ["normal", "abnormal"]:
+            for entry in scene_data[label]:
+                tasks.append({
+                    "video_path": entry["path"],
+                    "label": label,
+                    "kwargs": dict(
+                        video_path=entry["path"],
+                        model_path=model_path,
+                        num_segments=request.num_segments,
+                        processing_mode=request.processing_mode,
+                        classes_to_detect=[0],
+                        name_of_analysis=f"{entry['path']}_analysis",
+                        categories=categories_for_scenes[scene_name],
+                        threshold=request.threshold,
+                        skip_frames=request.skip_frames,
+                        num_of_skip_frames=request.num_of_skip_frames,
+                        confidence_threshold=request.confidence_threshold,
+                        top_k=request.top_k,
+                        batch_size=request.batch_size,
+                        frame_sample_rate=request.frame_sample_rate
+                    )
+                })
+    return tasks
+
+def experiment_checkpoint_path(parameters: dict) -> Path:
+    # Only parameters that change the results belong to the hash, not the scheduling ones
+    digest = hashlib.sha256(json.dumps(parameters, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+    return CHECKPOINT_DIR / f"experiment_{digest}.jsonl"
+
+def load_checkpoint(checkpoint_path) -> dict:
+    """Returns {video_path: record} of all videos finished in previous runs."""
+    finished = {}
+    if not os.path.exists(checkpoint_path):
+        return finished
+
+    with open(checkpoint_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line may be cut off if the previous run was killed while writing it
+                continue
+            finished[record["video_path"]] = record
+    return finished
+
+def init_video_worker():
+    # One intra-op thread per detection worker; the environment variables are inherited by the
+    # preprocessing and recognition pools this process starts
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = "1"
+    torch.set_num_threads(1)
+
+def analyze_video_task(analyze_video, kwargs):
+    # Runs in a worker process, `analyze_video` has to be a module-level function
+    task_start = time.time()
+    response = analyze_video(**kwargs)
+    return response, round(time.time() - task_start, 2)
+
+def run_videos_concurrently(tasks, analyze_video, max_concurrent_videos, cpu_budget=None, checkpoint_path=None):
+    """Analyzes `tasks` (dicts with `video_path`, `label` and `kwargs` for `analyze_video`).
+
+    `analyze_video(**kwargs, num_processes=...)` gets its share of the CPU budget, which also caps
+    `num_segments` (the detection workers) if the kwargs have it. Every video runs in a worker process
+    (see `init_video_worker`). Returns the per-video records (in task order) together with timing
+    information; `overlap_factor` is the summed per-video time divided by the wall-clock time, not a
+    speedup over a sequential run (the videos slow each other down while they overlap).
+    """
+    start_time = time.time()
+
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    max_concurrent_videos = max(1, min(max_concurrent_videos, cpu_budget))
+    processes_per_video = max(1, cpu_budget // max_concurrent_videos)
+
+    finished = load_checkpoint(checkpoint_path) if checkpoint_path else {}
+    pending = [task for task in tasks if task["video_path"] not in finished]
+    print(f"🗂️ {len(tasks) - len(pending)} of {len(tasks)} videos restored from checkpoint, "
+          f"analyzing {len(pending)} with {max_concurrent_videos} concurrent videos x {processes_per_video} processes.")
+
+    if checkpoint_path:
+        os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+    failed = []
+
+    def task_kwargs(task):
+        kwargs = dict(task["kwargs"], num_processes=processes_per_video)
+        if "num_segments" in kwargs:
+            kwargs["num_segments"] = max(1, min(kwargs["num_segments"], processes_per_video))
+        return kwargs
+
+    records = dict(finished)
+    with ProcessPoolExecutor(max_workers=max_concurrent_videos, initializer=init_video_worker) as executor:
+        futures = {executor.submit(analyze_video_task, analyze_video, task_kwargs(task)): task for task in pending}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                response, duration_seconds = future.result()
+            except Exception as e:
+                # A failed video is not checkpointed, so it is retried when the experiment is resumed
+                print(f"❌ Error in video {task['video_path']}: {e}")
+                failed.append(task["video_path"])
+                continue
+
+            # The results of the video were rewritten in the worker, not in the cache of this process
+            if isinstance(response, dict) and response.get("video_id") is not None:
+                result_cache.invalidate_video(response["video_id"])
+
+            record = {
+                "video_path": task["video_path"],
+                "label": task["label"],
+                "response": response,
+                "duration_seconds": duration_seconds
+            }
+            if checkpoint_path:
+                with open(checkpoint_path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            records[record["video_path"]] = record
+            print(f"✅ {len(records)}/{len(tasks)} {os.path.basename(task['video_path'])} ({duration_seconds} s)")
+
+    wall_clock_seconds = time.time() - start_time
+    analyzed = [records[task["video_path"]] for task in pending if task["video_path"] in records]
+    # Time the videos took while overlapping each other, not a measured sequential baseline
+    sum_video_seconds = sum(record["duration_seconds"] for record in analyzed)
+
+    return {
+        "records": [records[task["video_path"]] for task in tasks if task["video_path"] in records],
+        "failed_videos": failed,
+        "resumed_videos": len(tasks) - len(pending),
+        "analyzed_videos": len(analyzed),
+        "max_concurrent_videos": max_concurrent_videos,
+        "processes_per_video": processes_per_video,
+        "wall_clock_seconds": round(wall_clock_seconds, 2),
+        "sum_video_seconds": round(sum_video_seconds, 2),
+        "overlap_factor": round(sum_video_seconds / wall_clock_seconds, 2) if analyzed and wall_clock_seconds > 0 else None,
+        "checkpoint_path": str(checkpoint_path) if checkpoint_path else None
+    }
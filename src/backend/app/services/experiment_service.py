@@ -8,10 +8,22 @@ Orchestrates the full video analysis pipeline consisting of multiple stages:
 - Result interpretation
 - Result aggregation from the database
 
+Every stage is looked up in the content-addressed stage cache first (see `core/stage_cache.py`).
+Analyzing the same video file with the same detection settings copies the cached detection run into
+a new video row (sharing its crops if they exist), and only the stages whose parameters changed are
+run again. The later stages write only to the new row, so the results of earlier analyses never change
+and concurrent analyses of the same file do not interfere. Cached logits and anomalies are kept in the
+detection ids of the video that was detected, they are translated from/to the ids of the copy.
+
+The stages of one call are recorded in `stage_metrics` under a common run id, which is returned
+with the results (see `core/instrumentation.py`).
+
 Function:
 - run_full_analysis: runs all steps in sequence using the provided parameters and returns the results.
 """
 
+import os
+
 from backend.app.services.detection_service import run_object_detection
 from backend.app.models.detection_models import DetectionRequest
 
@@ -22,58 +34,186 @@ from backend.app.services.result_interpreter_service import run_result_interpret
 from backend.app.models.result_models import ResultInterpreterRequest
 
 from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.logits_store import BASE_DIR, logits_matrix_path, save_video_logits
+from backend.app.core.result_cache import result_cache
+from backend.app.core.stage_cache import stage_cache
+from backend.app.core.video_writer import CROP_VIDEO_PROFILE, profile_extension
+from backend.app.core.xclip_handler import XCLIP_MODEL_NAME
+from backend.app.core.instrumentation import analysis_run, current_run_id
+
+def _cached_for_video(key, video_id):
+  # Entries of stages stored in the database are only valid for the video they were computed on
+  entry = stage_cache.get(key)
+  if entry is not None and entry["payload"].get("video_id") == video_id:
+    return entry
+  return None
+
+def _map_ids(detection_ids, detection_map):
+  # Detection ids of the cached video in the ids of its copy (or back), None if one has no counterpart
+  if detection_map is None:
+    return list(detection_ids)
+  if any(detection_id not in detection_map for detection_id in detection_ids):
+    return None
+  return [detection_map[detection_id] for detection_id in detection_ids]
+
+def _map_rows(rows, detection_map):
+  # The same for (detection_id, label, score) anomaly rows
+  detection_ids = _map_ids([row[0] for row in rows], detection_map)
+  if detection_ids is None:
+    return None
+  return [(detection_id, *row[1:]) for detection_id, row in zip(detection_ids, rows)]
+
+def _crops_key(detection_key):
+  # The crop size and length of the preprocessing request are not configurable, its defaults are used
+  fields = AnomalyPreprocessRequest.model_fields
+  return stage_cache.crops_key(
+    detection_key, fields["max_frames"].default, fields["target_width"].default, fields["target_height"].default
+  )
+
+def _crops_exist(db, video_id):
+  detections = db.fetch_detections_by_video_id_and_duration(video_id, 50)
+  return all(os.path.exists(BASE_DIR / detection['video_object_detection_path']) for detection in detections)
+
+@analysis_run
+def run_full_analysis(video_path, model_path, num_segments, processing_mode, classes_to_detect, name_of_analysis, categories, threshold, skip_frames, num_of_skip_frames, confidence_threshold, top_k, batch_size, frame_sample_rate, num_processes=None, profile=False):
+  cache_hits = {"detection": False, "crops": False, "logits": False, "interpretation": False}
+
+  db = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
+  db.connect()
 
-def run_full_analysis(video_path, model_path, num_segments, processing_mode, classes_to_detect, name_of_analysis, categories, threshold, skip_frames, num_of_skip_frames, confidence_threshold, top_k, batch_size, frame_sample_rate):
   # Step 1: Run object detection on the input video
   # 1 Object Detection (video_path, name_of_analysis, settings)
-  detect_res = run_object_detection(DetectionRequest(
-        video_path=video_path,
-        model_path=model_path,
-        num_segments=num_segments,
-        processing_mode='parallel',
-        classes_to_detect=classes_to_detect,
-        name_of_analysis=name_of_analysis,
-        skip_frames=skip_frames,
-        num_of_skip_frames=num_of_skip_frames,
-        confidence_threshold=confidence_threshold
-    ))
-  
-  video_id = detect_res.video_id
+  detection_key = stage_cache.detection_key(
+    video_path, model_path, classes_to_detect, skip_frames, num_of_skip_frames, confidence_threshold
+  ) if stage_cache.enabled else None
+
+  # Stage cache entries refer to the video that was detected (`cached_video_id`). A detection cache hit is
+  # analyzed as a copy of that video, `to_copy` / `to_cached` map the detection ids between the two
+  cached_video_id, to_copy, to_cached = None, None, None
+  crops_key = _crops_key(detection_key) if detection_key else None
+  shared_crops = False
+
+  entry = stage_cache.get(detection_key) if detection_key else None
+  cached_video = db.fetch_video_by_id(entry["payload"]["video_id"]) if entry is not None else None
+  # Videos stored before the detection status existed have none, an unfinished run is resumed instead
+  if cached_video and cached_video['detection_status'] in (None, 'completed'):
+    # The copy points to the crops of the cached video if they exist, otherwise it is cropped again
+    shared_crops = bool(crops_key and _cached_for_video(crops_key, cached_video['id']) and _crops_exist(db, cached_video['id']))
+    copy_id, detection_map = db.copy_video_detections(
+      cached_video['id'], video_path, name_of_analysis, shared_crops, profile_extension(CROP_VIDEO_PROFILE)
+    )
+    # None if the cached video was deleted since the lookup
+    if copy_id is not None:
+      video_id, cached_video_id = copy_id, cached_video['id']
+      to_copy = detection_map
+      to_cached = {detection_id: cached_id for cached_id, detection_id in detection_map.items()}
+      cache_hits["detection"] = True
+
+  if not cache_hits["detection"]:
+    shared_crops = False
+    detect_res = run_object_detection(DetectionRequest(
+          video_path=video_path,
+          model_path=model_path,
+          num_segments=num_segments,
+          processing_mode='parallel',
+          classes_to_detect=classes_to_detect,
+          name_of_analysis=name_of_analysis,
+          skip_frames=skip_frames,
+          num_of_skip_frames=num_of_skip_frames,
+          confidence_threshold=confidence_threshold,
+          profile=profile
+      ))
+    video_id = detect_res.video_id
+    cached_video_id = video_id
+    detected_video = db.fetch_video_by_id(video_id) if video_id is not None else None
+    if detection_key and detected_video and detected_video['detection_status'] == 'completed':
+      stage_cache.put(detection_key, "detection", {"video_id": video_id})
 
   # Step 2: Run anomaly preprocessing to extract features
   # 2 Anomaly Preprocessing (video_path, video_id, output_path)
   output_path = f"../data/output/{video_id}/anomaly_recognition_preprocessor"
-  preproc_res = run_anomaly_preprocessing(AnomalyPreprocessRequest(
+  preprocess_request = AnomalyPreprocessRequest(
     video_id=video_id,
     video_path=video_path,
     output_path=output_path,
     processing_mode=processing_mode,
-  ))
+    num_processes=num_processes,
+    profile=profile,
+  )
+
+  if to_copy is not None:
+    crops_cached = shared_crops
+  else:
+    crops_cached = bool(crops_key and _cached_for_video(crops_key, video_id) and _crops_exist(db, video_id))
+  if crops_cached:
+    cache_hits["crops"] = True
+  else:
+    preproc_res = run_anomaly_preprocessing(preprocess_request)
+    # Crops of a copy are not shared, the entry keeps pointing to the crops of the detected video
+    if crops_key and to_copy is None:
+      stage_cache.put(crops_key, "crops", {"video_id": video_id})
 
   # Step 3: Perform anomaly recognition using the specified categories
   # 3 Anomaly Recognition (video_id, categories)
-  recog_res = run_anomaly_recognition(AnomalyRecognitionRequest(
-    video_id=video_id,
-    categories=categories,
-    batch_size=batch_size,
-    frame_sample_rate=frame_sample_rate,
-    processing_mode=processing_mode,
-  ))
+  logits_key = stage_cache.logits_key(
+    crops_key, categories, batch_size, frame_sample_rate, XCLIP_MODEL_NAME
+  ) if crops_key else None
+
+  entry = _cached_for_video(logits_key, cached_video_id) if logits_key else None
+  # None also when the file was evicted (by another process) since the lookup
+  cached_logits = stage_cache.load_logits(entry) if entry is not None else None
+  detection_ids = _map_ids(cached_logits[0], to_copy) if cached_logits is not None else None
+  if detection_ids is not None:
+    # Restore the logits matrix of these categories instead of running XCLIP again
+    _, logits_rows, cached_categories = cached_logits
+    save_video_logits(db, video_id, detection_ids, logits_rows, cached_categories)
+    cache_hits["logits"] = True
+  else:
+    recog_res = run_anomaly_recognition(AnomalyRecognitionRequest(
+      video_id=video_id,
+      categories=categories,
+      batch_size=batch_size,
+      frame_sample_rate=frame_sample_rate,
+      processing_mode=processing_mode,
+      num_processes=num_processes,
+      profile=profile,
+    ))
+    if logits_key:
+      header = db.fetch_anomaly_recognition_matrices([video_id]).get(video_id)
+      cached_ids = _map_ids(header['detection_ids'], to_cached) if header is not None else None
+      if cached_ids is not None:
+        stage_cache.put_logits(logits_key, cached_video_id, BASE_DIR / logits_matrix_path(video_id), cached_ids, header['categories'])
 
   # Step 4: Interpret recognized anomalies using the specified threshold
   # 4 Result Interpreter (video_id, threshold, categories)
-  res_int_res = run_result_interpreter(ResultInterpreterRequest(
-    video_id=video_id,
-    threshold=threshold,
-    categories=categories,
-    top_k=top_k
-  ))
+  interpretation_key = stage_cache.interpretation_key(logits_key, threshold, top_k) if logits_key else None
+
+  entry = _cached_for_video(interpretation_key, cached_video_id) if interpretation_key else None
+  cached_anomalies = stage_cache.load_interpretation(entry) if entry is not None else None
+  cached_anomalies = _map_rows(cached_anomalies, to_copy) if cached_anomalies is not None else None
+  if cached_anomalies is not None:
+    db.replace_detection_anomalies_for_videos([video_id], cached_anomalies)
+    result_cache.invalidate_video(video_id)
+    cache_hits["interpretation"] = True
+  else:
+    res_int_res = run_result_interpreter(ResultInterpreterRequest(
+      video_id=video_id,
+      threshold=threshold,
+      categories=categories,
+      top_k=top_k
+    ))
 
   # Step 5: Fetch detected anomalies from the database
   # 5 Load Results
-  db = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-  db.connect()
-  anomalies = db.fetch_all_anomalies_by_video_id(video_id) 
+  anomalies = db.fetch_all_anomalies_by_video_id(video_id)
+  db.close()
+
+  if interpretation_key and not cache_hits["interpretation"]:
+    anomaly_rows = _map_rows([
+      (anomaly["id"], a["label"], a["score"]) for anomaly in anomalies for a in anomaly["anomalies"]
+    ], to_cached)
+    if anomaly_rows is not None:
+      stage_cache.put_interpretation(interpretation_key, cached_video_id, anomaly_rows)
 
   result_dict = {
         "path": video_path,
@@ -86,13 +226,15 @@ def run_full_analysis(video_path, model_path, num_segments, processing_mode, cla
       result_dict["objects"][object_id] = {
           "name": "person",
           "anomalies": [{
-             "start": anomaly["start_frame"], 
+             "start": anomaly["start_frame"],
              "end": anomaly["end_frame"],
              "type_of_anomaly": [a["label"] for a in anomaly["anomalies"][:top_k]]
           }],
   }
 
   return {
-    "video_id": detect_res.video_id,
-    "result": result_dict
-  }
\ No newline at end of file
+    "video_id": video_id,
+    "result": result_dict,
+    "cache_hits": cache_hits,
+    "run_id": current_run_id()
+  }
@@ -7,29 +7,57 @@ stage of the video analysis pipeline.
 Functions:
 - run_result_interpreter: runs the result interpretation using configured parameters.
 - get_results_from_xclip_preprocessing: retrieves processed videos from the database.
+- stream_analyzed_videos_page: streams one keyset-paginated, filtered page of processed videos.
 - delete_video_analysis: deletes a video and its analysis from the database.
 """
 
 from backend.app.core.result_interpreter import main as result_interpreter_main
 from backend.app.models.result_models import ResultInterpreterRequest
 from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.async_database_manager import get_async_db
+from backend.app.core.result_cache import result_cache
+from backend.app.core.stage_cache import stage_cache
+from backend.app.utils.pagination_utils import encode_cursor, decode_cursor, stream_json_page
+from datetime import datetime
 
 # Trigger the result interpretation stage with given parameters
 def run_result_interpreter(request: ResultInterpreterRequest):
-    result_interpreter_main(
-        request.video_id,
-        request.threshold,
-        request.categories,
-        request.top_k
-    )
+    # Anomalies of the video are about to change, cached payloads must not outlive them
+    result_cache.invalidate_video(request.video_id)
+    try:
+        result_interpreter_main(
+            request.video_id,
+            request.threshold,
+            request.categories,
+            request.top_k
+        )
+    finally:
+        # Drop anything that was cached while the interpretation was running
+        result_cache.invalidate_video(request.video_id)
     return {"message": "Result interpretation completed."}
 
-def get_results_from_xclip_preprocessing():
-    # Connect to the database
-    db = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    db.connect()
+async def get_results_from_xclip_preprocessing():
+    # Use the shared async connection pool
+    db = await get_async_db()
     # Retrieve all processed video entries
-    return db.fetch_videos()
+    return await db.fetch_videos()
+
+def stream_analyzed_videos_page(limit: int, cursor=None, date_from=None, date_to=None, config_id=None, has_anomalies=None, label=None):
+    # Decode the cursor eagerly, so an invalid one is reported before the response starts streaming
+    after = None
+    if cursor:
+        try:
+            date_processed, video_id = decode_cursor(cursor)
+            after = (datetime.fromisoformat(date_processed), int(video_id))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid pagination cursor.")
+
+    async def videos():
+        db = await get_async_db()
+        async for video in db.iter_videos_page(limit, after, date_from, date_to, config_id, has_anomalies, label):
+            yield video
+
+    return stream_json_page(videos(), limit, lambda video: encode_cursor([video['date_processed'], video['id']]))
 
 def delete_video_analysis(video_id: int) -> dict:
     # Connect to the database
@@ -37,6 +65,8 @@ def delete_video_analysis(video_id: int) -> dict:
     db.connect()
     # Attempt to delete video entry by ID
     success = db.delete_video_by_id(video_id)
+    result_cache.invalidate_video(video_id)
+    stage_cache.discard_video(video_id)
     if not success:
         raise ValueError(f"Video with ID {video_id} not found.")
     return {"message": f"Video {video_id} deleted."}
\ No newline at end of file
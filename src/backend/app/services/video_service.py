@@ -5,47 +5,117 @@ This module provides high-level functions for handling video-related operations
 in the anomaly detection pipeline.
 
 Functions:
-- run_video_visualization: triggers anomaly overlay rendering for a given video.
-- save_uploaded_video: stores uploaded video files on disk.
+- run_video_visualization: triggers anomaly overlay rendering (or timeline export) for a given video.
+- run_overlay_export: exports boxes, anomalies and thumbnails of a video for client-side rendering.
+- get_overlay_file_path: resolves a file of an exported overlay.
+- save_uploaded_video: stores an uploaded video file in the content-addressed upload store.
+- start_chunked_upload, upload_chunk, get_upload_status, complete_chunked_upload: resumable chunked uploads
+  (see core/upload_store.py).
 - get_video_data: retrieves metadata for a video by ID from the database.
+- get_video_stream_path: resolves the original video or its visualization for streaming.
+- get_detection_crop_path: resolves the crop file of a detection for streaming.
+- get_detection_clip_path: cuts (once) the frames of a detection from the original video without re-encoding.
 """
 
 from backend.app.core.video_visualizer import show_anomalies_in_video
-from backend.app.models.video_models import VideoVisualizationRequest
-from backend.app.core.database_manager import DatabaseManager
+from backend.app.core.overlay_export import OVERLAY_FILES, export_overlay
+from backend.app.core.upload_store import upload_store
+from backend.app.core.video_writer import extract_clip
+from backend.app.models.video_models import VideoVisualizationRequest, VideoOverlayRequest, VideoUploadInitRequest
+from backend.app.core.async_database_manager import get_async_db
+from backend.app.core.result_cache import result_cache
 
 import os
-import shutil
+from pathlib import Path
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+# Base directory = root of the project, detection paths in the database are relative to it
+BASE_DIR = Path(__file__).resolve().parents[4]
 
 def run_video_visualization(request: VideoVisualizationRequest):
-    # Generate a video with anomalies visualized based on detection results
-    show_anomalies_in_video(request.video_id)
-    output_path = f"data/output/{request.video_id}/final_output.mp4"
+    # Generate a video (or a JSON timeline) with anomalies visualized based on detection results
+    output_path = show_anomalies_in_video(request.video_id, request.mode, request.num_processes)
     return {
         "message": "Anomalies visualized.",
         "output_path": output_path
     }
 
-VIDEO_STORAGE_PATH = "../data/input"
+def run_overlay_export(request: VideoOverlayRequest):
+    # Write the overlay data the frontend draws over the original video
+    files = export_overlay(
+        request.video_id,
+        thumbnail_interval_seconds=request.thumbnail_interval_seconds,
+        thumbnail_width=request.thumbnail_width,
+        sprite_columns=request.sprite_columns
+    )
+    return {
+        "message": "Overlay exported.",
+        "files": files
+    }
+
+def get_overlay_file_path(video_id: int, file_name: str):
+    """Returns the path of the overlay file, or None if it is not an overlay file or was not exported yet."""
+    if file_name not in OVERLAY_FILES:
+        return None
+    path = f"../data/output/{video_id}/overlay/{file_name}"
+    return path if os.path.exists(path) else None
+
+def save_uploaded_video(video: UploadFile) -> dict:
+    """Store the uploaded video (once per content) and return its path, filename, hash and metadata."""
+    return upload_store.store_stream(video.file, video.filename)
+
+def start_chunked_upload(request: VideoUploadInitRequest) -> dict:
+    return upload_store.create_session(request.filename, request.size, request.sha256)
+
+async def upload_chunk(upload_id: str, offset: int, stream) -> dict:
+    # Streamed to disk chunk by chunk, the file is hashed on the way
+    return await upload_store.append_chunk(upload_id, offset, stream)
+
+def get_upload_status(upload_id: str) -> dict:
+    return upload_store.status(upload_id)
+
+async def complete_chunked_upload(upload_id: str) -> dict:
+    return await upload_store.complete_session(upload_id)
+
+async def get_video_data(video_id: int):
+    # Fetch video metadata through the shared async connection pool (read-through cached)
+    async def load():
+        db = await get_async_db()
+        return await db.fetch_video_by_id(video_id)
 
-def save_uploaded_video(video: UploadFile) -> tuple[str, str]:
-    """Save uploaded video to disk and return its path and filename."""
-    # Ensure the upload directory exists
-    if not os.path.exists(VIDEO_STORAGE_PATH):
-        os.makedirs(VIDEO_STORAGE_PATH)
+    return await result_cache.get_or_load(("video", video_id), load)
 
-    video_path = os.path.join(VIDEO_STORAGE_PATH, video.filename)
+async def get_video_stream_path(video_id: int, source: str):
+    """Path of the original video ("original") or of its rendered visualization ("visualization"), None if missing."""
+    if source == "visualization":
+        path = f"../data/output/{video_id}/final_output.mp4"
+    else:
+        video = await get_video_data(video_id)
+        path = video["video_path"] if video else None
+    return path if path and os.path.exists(path) else None
 
-    # Save the video file to the specified path
-    with open(video_path, "wb") as buffer:
-        shutil.copyfileobj(video.file, buffer)
+async def get_detection_crop_path(detection_id: int):
+    db = await get_async_db()
+    detection = await db.fetch_detection_media(detection_id)
+    if not detection or not detection["video_object_detection_path"]:
+        return None
+    path = BASE_DIR / detection["video_object_detection_path"]
+    return path if os.path.exists(path) else None
 
-    return video_path, video.filename
+async def get_detection_clip_path(detection_id: int):
+    """Clip of the detection's frames from the original video, cut on the first request and kept for the next ones."""
+    db = await get_async_db()
+    detection = await db.fetch_detection_media(detection_id)
+    if not detection or not detection["video_path"] or not os.path.exists(detection["video_path"]):
+        return None
 
-def get_video_data(video_id: int):
-    # Connect to the database and fetch video metadata
-    db = DatabaseManager(db_name="diploma_thesis_prototype_db", user="postgres", password="postgres")
-    db.connect()
+    clip_path = f"../data/output/{detection['video_id']}/clips/{detection_id}.mp4"
+    if not os.path.exists(clip_path) or os.path.getmtime(clip_path) < os.path.getmtime(detection["video_path"]):
+        fps = detection["fps"] or 25.0
+        await run_in_threadpool(
+            extract_clip, detection["video_path"], clip_path,
+            detection["start_frame"] / fps, (detection["end_frame"] + 1) / fps
+        )
+    return clip_path
 
-    return db.fetch_video_by_id(video_id)
\ No newline at end of file
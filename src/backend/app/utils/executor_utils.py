@@ -0,0 +1,42 @@
+"""
+executor_utils.py
+
+Dedicated executor for the blocking stages of the analysis pipeline (detection, preprocessing,
+recognition, interpretation, visualization, experiments).
+
+The stages are long-running and spawn their own threads and processes, so they are kept off
+both the event loop and the shared AnyIO thread pool that FastAPI uses for short `def` endpoints.
+
+Functions:
+- run_in_pipeline_executor: awaits a blocking callable on the pipeline executor.
+- shutdown_pipeline_executor: stops the executor (called on application shutdown).
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from backend.app.core.prometheus_metrics import PIPELINE_JOBS_IN_FLIGHT, PIPELINE_JOBS_QUEUED
+
+# Number of pipeline jobs allowed to run at the same time; every job already uses all cores internally
+PIPELINE_MAX_WORKERS = int(os.environ.get("PIPELINE_MAX_WORKERS", 2))
+
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix="pipeline")
+
+def _run_job(func):
+    PIPELINE_JOBS_QUEUED.dec()
+    PIPELINE_JOBS_IN_FLIGHT.inc()
+    try:
+        return func()
+    finally:
+        PIPELINE_JOBS_IN_FLIGHT.dec()
+
+async def run_in_pipeline_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Queued until a worker picks the job up, see `_run_job`
+    PIPELINE_JOBS_QUEUED.inc()
+    return await loop.run_in_executor(pipeline_executor, partial(_run_job, partial(func, *args, **kwargs)))
+
+def shutdown_pipeline_executor():
+    pipeline_executor.shutdown(wait=False, cancel_futures=True)
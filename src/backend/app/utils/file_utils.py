@@ -0,0 +1,104 @@
+"""
+file_utils.py
+
+Helpers for serving files over HTTP.
+
+Functions:
+- parse_range_header: parses a single-range `Range: bytes=...` header (raises ValueError if unsatisfiable).
+- file_stream_response: serves a file with Range support (206/416), conditional requests
+  (ETag, Last-Modified, 304) and Cache-Control, reading the file off the event loop chunk by chunk.
+"""
+
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+# Bytes read from disk and sent to the client at once
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+def parse_range_header(header: str, size: int):
+    """Returns the inclusive (start, end) of the range, or None if the header is not a single byte range."""
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        # Multipart ranges are not supported, the whole file is sent instead
+        return None
+    start_text, _, end_text = ranges.strip().partition("-")
+    try:
+        if not start_text:
+            # Suffix range, the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError("Empty suffix range.")
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        raise ValueError(f"Invalid range '{header}'.")
+    if start >= size or start > end:
+        raise ValueError(f"Range '{header}' is outside of the {size} bytes of the file.")
+    return start, min(end, size - 1)
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+async def _read_file(path, start, length):
+    file = await run_in_threadpool(open, path, "rb")
+    try:
+        await run_in_threadpool(file.seek, start)
+        while length > 0:
+            data = await run_in_threadpool(file.read, min(STREAM_CHUNK_BYTES, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        await run_in_threadpool(file.close)
+
+async def file_stream_response(request: Request, path, cache_control="no-cache", media_type=None) -> Response:
+    stat = await run_in_threadpool(os.stat, path)
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": cache_control
+    }
+    media_type = media_type or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    start, end = 0, size - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A range of an older version of the file must not be mixed with the current one
+    if range_header and size > 0 and (if_range is None or if_range.strip() in (etag, headers["Last-Modified"])):
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = max(0, end - start + 1)
+    headers["Content-Length"] = str(length)
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(_read_file(path, start, length), status_code=status_code, headers=headers, media_type=media_type)
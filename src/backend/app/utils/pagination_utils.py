@@ -0,0 +1,57 @@
+"""
+pagination_utils.py
+
+Helpers for keyset-paginated, streamed JSON listings.
+
+Functions:
+- encode_cursor: turns the sort key of the last returned row into an opaque cursor string.
+- decode_cursor: parses a cursor produced by `encode_cursor` (raises ValueError if it is malformed).
+- stream_json_page: serializes an async iterator of rows as `{"items": [...], "next_cursor": ...}`
+  chunk by chunk, so a large page is never materialized as one JSON document in memory.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+# Number of serialized items sent to the client in one chunk
+STREAM_FLUSH_ITEMS = 100
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, default=_json_default).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid pagination cursor.")
+    if not isinstance(values, list):
+        raise ValueError("Invalid pagination cursor.")
+    return values
+
+async def stream_json_page(items, limit: int, cursor_for):
+    buffer = ['{"items":[']
+    count = 0
+    last_item = None
+
+    async for item in items:
+        if count:
+            buffer.append(",")
+        buffer.append(json.dumps(item, default=_json_default))
+        count += 1
+        last_item = item
+
+        if count % STREAM_FLUSH_ITEMS == 0:
+            yield "".join(buffer)
+            buffer = []
+
+    # A full page means there may be more rows after the last one
+    next_cursor = cursor_for(last_item) if last_item is not None and count >= limit else None
+    buffer.append(f'],"next_cursor":{json.dumps(next_cursor)}}}')
+    yield "".join(buffer)
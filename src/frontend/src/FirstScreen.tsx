@@ -114,6 +114,7 @@ const FirstScreen: React.FC<FirstScreenProps> = ({
         },
         body: JSON.stringify({
           video_path,
+          video_filename,
           name_of_analysis,
           ...settingsFirstScreen,
         }),
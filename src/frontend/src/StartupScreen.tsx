@@ -30,6 +30,7 @@ interface ConfigItem {
 interface AnalyzedVideo {
   id: number;
   video_path: string;
+  video_filename: string | null;
   duration: number;
   fps: number;
   date_processed: string;
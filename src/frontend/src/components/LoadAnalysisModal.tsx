@@ -29,12 +29,16 @@ interface ConfigItem {
 interface AnalyzedVideo {
   id: number;
   video_path: string;
+  video_filename: string | null;
   duration: number;
   fps: number;
   date_processed: string;
   name_of_analysis: string;
   config: ConfigItem;
 }
+// Uploaded videos are stored under their hash, show the original file name
+const videoName = (video: AnalyzedVideo) => video.video_filename ?? video.video_path;
+
 interface LoadAnalysisModalProps {
   isOpen: boolean;
   onClose: () => void;
@@ -93,9 +97,9 @@ const LoadAnalysisModal: React.FC<LoadAnalysisModalProps> = ({ isOpen, onClose,
                   </strong>
                   <p title={video.video_path}>
                     <span>📁</span>{" "}
-                    {video.video_path.length > 40
-                      ? `${video.video_path.slice(0, 40)}...`
-                      : video.video_path}
+                    {videoName(video).length > 40
+                      ? `${videoName(video).slice(0, 40)}...`
+                      : videoName(video)}
                   </p>
                   <p><span>⏱️</span> {video.duration}s | {video.fps}fps</p>
                   <p><span>📅</span> {new Date(video.date_processed).toLocaleString()}</p>
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend is imported as `backend.app...` with src/ on the path, as when it is run from src/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
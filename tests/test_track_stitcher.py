@@ -0,0 +1,82 @@
+from backend.app.core.track_stitcher import TrackStitcher, box_iou
+
+WARMUP_SPAN = 10
+
+def detection(frame_id, track_id, bbox):
+    return {'frame_id': frame_id, 'track_id': track_id, 'bbox': bbox, 'class_id': 0, 'confidence': 0.9}
+
+def first_chunk(stitcher):
+    # Two tracks, both seen in the last frames of the chunk [0, 100)
+    detections = [detection(frame_id, 11, [0, 0, 10, 10]) for frame_id in range(0, 100, 5)]
+    detections += [detection(frame_id, 12, [50, 50, 60, 60]) for frame_id in range(0, 100, 5)]
+    return stitcher.stitch(0, 100, detections)
+
+def test_box_iou():
+    assert box_iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+    assert box_iou([0, 0, 10, 10], [5, 0, 15, 10]) == 50 / 150
+    assert box_iou([0, 0, 10, 10], [20, 20, 30, 30]) == 0.0
+
+def test_first_chunk_gets_new_ids():
+    stitched = first_chunk(TrackStitcher(WARMUP_SPAN))
+    assert {d['track_id'] for d in stitched if d['bbox'][0] == 0} == {1}
+    assert {d['track_id'] for d in stitched if d['bbox'][0] == 50} == {2}
+
+def test_tracks_overlapping_in_warmup_frames_continue():
+    stitcher = TrackStitcher(WARMUP_SPAN)
+    first_chunk(stitcher)
+
+    # Local ids of the reset tracker differ, warmup frames 90 and 95 overlap the tail of the first chunk
+    detections = [detection(frame_id, 3, [51, 50, 61, 60]) for frame_id in range(90, 200, 5)]
+    detections += [detection(frame_id, 4, [1, 0, 11, 10]) for frame_id in range(90, 200, 5)]
+    stitched = stitcher.stitch(100, 200, detections)
+
+    assert min(d['frame_id'] for d in stitched) == 100  # warmup frames are dropped
+    assert {d['track_id'] for d in stitched if d['bbox'][0] == 51} == {2}
+    assert {d['track_id'] for d in stitched if d['bbox'][0] == 1} == {1}
+    assert stitcher.next_track_id == 3
+
+def test_overlap_below_threshold_starts_new_track():
+    stitcher = TrackStitcher(WARMUP_SPAN, iou_threshold=0.5)
+    first_chunk(stitcher)
+
+    # IoU with the tail box [0, 0, 10, 10] is 1/3
+    detections = [detection(frame_id, 3, [5, 0, 15, 10]) for frame_id in range(90, 200, 5)]
+    stitched = stitcher.stitch(100, 200, detections)
+
+    assert {d['track_id'] for d in stitched} == {3}
+    assert stitcher.next_track_id == 4
+
+def test_each_video_track_is_continued_once():
+    stitcher = TrackStitcher(WARMUP_SPAN)
+    first_chunk(stitcher)
+
+    # Two local tracks overlap the same track, the better overlapping one continues it
+    detections = [detection(frame_id, 3, [0, 0, 10, 10]) for frame_id in range(90, 200, 5)]
+    detections += [detection(frame_id, 4, [1, 0, 11, 10]) for frame_id in range(90, 200, 5)]
+    stitched = stitcher.stitch(100, 200, detections)
+
+    assert {d['track_id'] for d in stitched if d['bbox'][0] == 0} == {1}
+    assert {d['track_id'] for d in stitched if d['bbox'][0] == 1} == {3}
+
+def test_chunk_after_skipped_chunk_starts_new_tracks():
+    stitcher = TrackStitcher(WARMUP_SPAN)
+    first_chunk(stitcher)
+    stitcher.skip(200)
+
+    detections = [detection(frame_id, 3, [0, 0, 10, 10]) for frame_id in range(190, 300, 5)]
+    stitched = stitcher.stitch(200, 300, detections)
+
+    assert {d['track_id'] for d in stitched} == {3}
+
+def test_restored_checkpoint_continues_tracks():
+    stitcher = TrackStitcher(WARMUP_SPAN)
+    first_chunk(stitcher)
+    checkpoint = stitcher.checkpoint(0)
+
+    resumed = TrackStitcher(WARMUP_SPAN)
+    resumed.restore(checkpoint)
+    detections = [detection(frame_id, 7, [50, 50, 60, 60]) for frame_id in range(90, 200, 5)]
+    stitched = resumed.stitch(100, 200, detections)
+
+    assert {d['track_id'] for d in stitched} == {2}
+    assert resumed.next_track_id == 3